@@ -0,0 +1,262 @@
+"""
+Benchmarks for state I/O and distributed matrix multiplication, run against the
+in-process local backend. Results are written as JSON so that runs from
+different releases can be compared, e.g.:
+
+    python3 benchmark.py --output results.json
+    python3 benchmark.py --quick
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from contextlib import redirect_stdout
+from statistics import median
+from time import perf_counter
+
+import numpy as np
+
+from pyfaasm import core
+from pyfaasm.backend import LocalBackend
+from pyfaasm.config import MatrixConf, SUBMATRICES_KEY_A, SUBMATRICES_KEY_B
+from pyfaasm.core import set_backend, set_local_chaining, get_state, get_state_offset, set_state, \
+    set_state_offset
+from pyfaasm.matrix import random_matrix, subdivide_matrix_into_state, write_matrix_params_to_state, \
+    divide_and_conquer
+from pyfaasm.matrix_data import do_subdivide_matrix, do_reconstruct_matrix
+
+STATE_VALUE_SIZES = [1024, 64 * 1024, 1024 * 1024, 16 * 1024 * 1024]
+STATE_OFFSET_CHUNK = 4096
+
+MATRIX_SIZES = [256, 512, 1024]
+MATRIX_SPLITS = [0, 1, 2, 3]
+
+QUICK_STATE_VALUE_SIZES = [1024, 64 * 1024]
+QUICK_MATRIX_SIZES = [128]
+QUICK_MATRIX_SPLITS = [0, 1, 2]
+
+# Cold start snippets, each run in a fresh interpreter
+IMPORT_SNIPPETS = {
+    "import_pyfaasm": "import pyfaasm",
+    "minimal_function": "from pyfaasm.core import get_input, set_output\nset_output(get_input())",
+}
+
+IMPORT_HARNESS = """
+import sys
+from time import perf_counter
+
+n_modules = len(sys.modules)
+start = perf_counter()
+exec(sys.argv[1])
+elapsed = perf_counter() - start
+
+import json
+print(json.dumps({
+    "time": elapsed,
+    "new_modules": len(sys.modules) - n_modules,
+    "numpy_loaded": any(m.startswith("numpy.") for m in sys.modules),
+}))
+"""
+
+
+def _time(func, repeats):
+    times = list()
+    for _ in range(repeats):
+        start = perf_counter()
+        func()
+        times.append(perf_counter() - start)
+
+    return times
+
+
+def _result(name, params, times, n_bytes=None):
+    result = {
+        "benchmark": name,
+        "params": params,
+        "times": times,
+        "min": min(times),
+        "median": median(times),
+    }
+
+    if n_bytes is not None:
+        result["bytes"] = n_bytes
+        result["bytes_per_second"] = n_bytes / result["median"] if result["median"] > 0 else None
+
+    return result
+
+
+def _reset_backend():
+    set_backend(LocalBackend())
+
+
+def bench_imports(repeats, budget=None):
+    # Run with the local backend so the snippets don't need the native libraries,
+    # and with this repo on the path so they import it wherever we're run from
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    python_path = os.pathsep.join(p for p in [repo_dir, os.environ.get("PYTHONPATH")] if p)
+    env = dict(os.environ, PYTHON_LOCAL_STATE="1", PYTHONPATH=python_path)
+
+    results = list()
+    for name, snippet in IMPORT_SNIPPETS.items():
+        runs = list()
+        for _ in range(repeats):
+            output = subprocess.check_output([sys.executable, "-c", IMPORT_HARNESS, snippet], env=env)
+            runs.append(json.loads(output.decode("utf-8").splitlines()[-1]))
+
+        result = _result(name, {}, [r["time"] for r in runs])
+        result["new_modules"] = runs[-1]["new_modules"]
+        result["numpy_loaded"] = runs[-1]["numpy_loaded"]
+
+        if budget is not None:
+            result["budget"] = budget
+            result["over_budget"] = result["median"] > budget
+
+        results.append(result)
+
+    return results
+
+
+def bench_state(value_sizes, repeats):
+    results = list()
+    for value_size in value_sizes:
+        _reset_backend()
+        key = "bench_state_{}".format(value_size)
+        value = np.random.bytes(value_size)
+        n_chunks = value_size // STATE_OFFSET_CHUNK
+
+        set_state(key, value)
+        params = {"value_size": value_size}
+
+        times = _time(lambda: set_state(key, value), repeats)
+        results.append(_result("set_state", params, times, value_size))
+
+        times = _time(lambda: get_state(key, value_size), repeats)
+        results.append(_result("get_state", params, times, value_size))
+
+        if n_chunks == 0:
+            continue
+
+        chunk = value[:STATE_OFFSET_CHUNK]
+        offset_params = {"value_size": value_size, "chunk_size": STATE_OFFSET_CHUNK}
+
+        def _write_chunks():
+            for i in range(n_chunks):
+                set_state_offset(key, value_size, i * STATE_OFFSET_CHUNK, chunk)
+
+        def _read_chunks():
+            for i in range(n_chunks):
+                get_state_offset(key, value_size, i * STATE_OFFSET_CHUNK, STATE_OFFSET_CHUNK)
+
+        times = _time(_write_chunks, repeats)
+        results.append(_result("set_state_offset", offset_params, times, n_chunks * STATE_OFFSET_CHUNK))
+
+        times = _time(_read_chunks, repeats)
+        results.append(_result("get_state_offset", offset_params, times, n_chunks * STATE_OFFSET_CHUNK))
+
+    return results
+
+
+def bench_subdivide_reconstruct(matrix_sizes, matrix_splits, repeats):
+    results = list()
+    for matrix_size in matrix_sizes:
+        mat = random_matrix(matrix_size)
+
+        for n_splits in matrix_splits:
+            conf = MatrixConf(matrix_size, n_splits)
+            params = {"matrix_size": matrix_size, "n_splits": n_splits}
+
+            submatrices = dict()
+
+            def _write_submatrix(sub_mat, row_idx, col_idx):
+                submatrices[(row_idx, col_idx)] = sub_mat.tobytes()
+
+            def _read_submatrix(row_idx, col_idx):
+                return submatrices[(row_idx, col_idx)]
+
+            times = _time(lambda: do_subdivide_matrix(conf, mat, _write_submatrix), repeats)
+            results.append(_result("do_subdivide_matrix", params, times, conf.bytes_per_matrix))
+
+            out = np.empty((matrix_size, matrix_size), dtype=np.float32)
+            times = _time(lambda: do_reconstruct_matrix(conf, _read_submatrix, out=out), repeats)
+            results.append(_result("do_reconstruct_matrix", params, times, conf.bytes_per_matrix))
+
+    return results
+
+
+def bench_divide_and_conquer(matrix_sizes, matrix_splits, repeats):
+    results = list()
+    for matrix_size in matrix_sizes:
+        mat_a = random_matrix(matrix_size)
+        mat_b = random_matrix(matrix_size)
+
+        for n_splits in matrix_splits:
+            _reset_backend()
+            write_matrix_params_to_state(matrix_size, n_splits)
+            conf = MatrixConf(matrix_size, n_splits)
+
+            subdivide_matrix_into_state(conf, mat_a, SUBMATRICES_KEY_A)
+            subdivide_matrix_into_state(conf, mat_b, SUBMATRICES_KEY_B)
+
+            params = {"matrix_size": matrix_size, "n_splits": n_splits}
+            times = _time(divide_and_conquer, repeats)
+            results.append(_result("divide_and_conquer", params, times))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run pyfaasm benchmarks against the local backend")
+    parser.add_argument("--output", help="File to write JSON results to (default stdout)")
+    parser.add_argument("--repeats", type=int, default=5, help="Number of times to run each benchmark")
+    parser.add_argument("--quick", action="store_true", help="Run a small subset of sizes")
+    parser.add_argument("--matrix-sizes", type=int, nargs="+", help="Matrix sizes to benchmark")
+    parser.add_argument("--splits", type=int, nargs="+", help="Values of n_splits to benchmark")
+    parser.add_argument("--import-budget-ms", type=float, help="Fail if cold start imports take longer than this")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for random inputs")
+    args = parser.parse_args()
+
+    value_sizes = QUICK_STATE_VALUE_SIZES if args.quick else STATE_VALUE_SIZES
+    matrix_sizes = args.matrix_sizes or (QUICK_MATRIX_SIZES if args.quick else MATRIX_SIZES)
+    matrix_splits = args.splits or (QUICK_MATRIX_SPLITS if args.quick else MATRIX_SPLITS)
+
+    np.random.seed(args.seed)
+
+    original_backend = core.backend
+    original_local_chaining = core.PYTHON_LOCAL_CHAINING
+    set_local_chaining(True)
+
+    # Keep progress messages from the functions themselves out of the results
+    try:
+        with redirect_stdout(sys.stderr):
+            import_budget = args.import_budget_ms / 1000 if args.import_budget_ms else None
+            results = bench_imports(args.repeats, import_budget)
+            results += bench_state(value_sizes, args.repeats)
+            results += bench_subdivide_reconstruct(matrix_sizes, matrix_splits, args.repeats)
+            results += bench_divide_and_conquer(matrix_sizes, matrix_splits, args.repeats)
+    finally:
+        set_backend(original_backend)
+        set_local_chaining(original_local_chaining)
+
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "repeats": args.repeats,
+        "results": results,
+    }
+
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(report_json)
+    else:
+        print(report_json)
+
+    if any(r.get("over_budget") for r in results):
+        sys.exit("Cold start imports over budget")
+
+
+if __name__ == "__main__":
+    main()
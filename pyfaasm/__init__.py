@@ -1,4 +1,33 @@
-# Note - we need to avoid unnecessarily importing numpy here
-from . import core
-from . import config
-from . import objects
+# Note - we need to avoid unnecessarily importing numpy here. Submodules are
+# only imported when first accessed, to keep cold starts fast.
+import importlib
+
+_SUBMODULES = (
+    "aio",
+    "backend",
+    "buffering",
+    "cache",
+    "compression",
+    "config",
+    "core",
+    "executor",
+    "lazy",
+    "matrix",
+    "matrix_data",
+    "memo",
+    "objects",
+    "state_array",
+    "streams",
+    "stats",
+)
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module("." + name, __name__)
+
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_SUBMODULES))
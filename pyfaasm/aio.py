@@ -0,0 +1,141 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Thread
+
+from pyfaasm import core
+
+# Calls are chained from a single thread, and awaited on the host from a single
+# completion thread, however many are in flight. The completion thread takes
+# all the awaits pending at once and makes them in one batch, then hands each
+# result back to the event loop waiting on it.
+chain_pool = None
+completion_thread = None
+
+
+class CompletionThread(object):
+    """
+    Awaits batches of calls on a background thread, resolving the asyncio
+    futures waiting on them
+    """
+
+    def __init__(self):
+        self.pending = list()
+        self.condition = Condition()
+        self.thread = Thread(target=self._run, name="pyfaasm-await", daemon=True)
+        self.thread.start()
+
+    def submit(self, call_ids):
+        """
+        Returns a future for the return codes of the given calls, to be
+        awaited from the running event loop
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self.condition:
+            self.pending.append((call_ids, loop, future))
+            self.condition.notify()
+
+        return future
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+
+                batch, self.pending = self.pending, list()
+
+            all_ids = [call_id for call_ids, _, _ in batch for call_id in call_ids]
+            try:
+                results = core.await_all(all_ids)
+            except Exception as e:
+                for _, loop, future in batch:
+                    _resolve(loop, _set_exception, future, e)
+                continue
+
+            start = 0
+            for call_ids, loop, future in batch:
+                end = start + len(call_ids)
+                _resolve(loop, _set_result, future, results[start:end])
+                start = end
+
+
+def _resolve(loop, callback, future, value):
+    try:
+        loop.call_soon_threadsafe(callback, future, value)
+    except RuntimeError:
+        # The loop has been closed, so nothing is waiting on the result
+        pass
+
+
+def _set_result(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future, e):
+    if not future.done():
+        future.set_exception(e)
+
+
+def _get_chain_pool():
+    global chain_pool
+    if chain_pool is None:
+        chain_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pyfaasm-chain")
+
+    return chain_pool
+
+
+def _get_completion_thread():
+    global completion_thread
+    if completion_thread is None:
+        completion_thread = CompletionThread()
+
+    return completion_thread
+
+
+async def chain_async(func, input_data):
+    """
+    Chains a call to the given function without blocking the event loop,
+    returning its call ID
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_chain_pool(), core.chain_this_with_input, func, input_data)
+
+
+async def await_call_async(call_id):
+    """
+    Waits for the given call to finish without blocking the event loop,
+    returning its return code
+    """
+    if not core.PYTHON_LOCAL_CHAINING:
+        results = await _get_completion_thread().submit([call_id])
+        return results[0]
+
+    # Calls short-circuited by memoisation have already finished
+    status = core._pop_memoised(call_id)
+    if status is not None:
+        return status
+
+    executor = core.get_local_executor()
+    if executor is None or call_id <= 0:
+        # Calls are run immediately
+        return 0
+
+    # Local pool calls already have a future we can wait on directly
+    future = executor.pop_future(call_id)
+    result = await asyncio.wrap_future(future)
+    core._complete_memoised(call_id, result)
+    return result
+
+
+async def gather_calls(call_ids):
+    """
+    Waits for all the given calls to finish, returning their return codes in
+    the same order
+    """
+    if not core.PYTHON_LOCAL_CHAINING:
+        # Calls on the host are awaited together in one batch
+        return await _get_completion_thread().submit(list(call_ids))
+
+    return list(await asyncio.gather(*[await_call_async(call_id) for call_id in call_ids]))
@@ -0,0 +1,312 @@
+import importlib
+from itertools import count
+
+
+class StateBackend(object):
+    """
+    Interface between pyfaasm.core and whatever provides state and chaining.
+    The native backend goes through the C extension to the Faasm host
+    interface, the local backend keeps everything in memory in this process.
+    """
+
+    def get_input(self):
+        raise NotImplementedError()
+
+    def set_output(self, output):
+        raise NotImplementedError()
+
+    def get_input_size(self):
+        return len(self.get_input())
+
+    def read_input_into(self, buffer):
+        input_data = self.get_input()
+        view = memoryview(buffer).cast("B")
+        if len(view) < len(input_data):
+            raise ValueError("Buffer of {} bytes too small for input of {} bytes".format(len(view), len(input_data)))
+
+        view[:len(input_data)] = input_data
+        return len(input_data)
+
+    def get_state_size(self, key):
+        raise NotImplementedError()
+
+    def get_state(self, key, state_len):
+        raise NotImplementedError()
+
+    def get_state_offset(self, key, total_len, offset, offset_len):
+        raise NotImplementedError()
+
+    def get_state_view(self, key, state_len):
+        raise NotImplementedError()
+
+    def get_state_offset_view(self, key, total_len, offset, offset_len):
+        raise NotImplementedError()
+
+    def set_state(self, key, value):
+        raise NotImplementedError()
+
+    def set_state_offset(self, key, total_len, offset, value):
+        raise NotImplementedError()
+
+    def push_state(self, key):
+        raise NotImplementedError()
+
+    def push_state_partial(self, key):
+        raise NotImplementedError()
+
+    def pull_state(self, key, state_len):
+        raise NotImplementedError()
+
+    def pull_state_offset(self, key, total_len, offset, offset_len):
+        raise NotImplementedError()
+
+    # The batched functions default to one call per key, backends that can do
+    # better should override them
+    def get_state_many(self, key_lens):
+        return [self.get_state(key, state_len) for key, state_len in key_lens]
+
+    def get_state_offset_many(self, key, total_len, ranges):
+        return [self.get_state_offset(key, total_len, offset, offset_len) for offset, offset_len in ranges]
+
+    def set_state_many(self, items):
+        for key, value in items:
+            self.set_state(key, value)
+
+    def set_state_offset_many(self, key, total_len, writes):
+        for offset, value in writes:
+            self.set_state_offset(key, total_len, offset, value)
+
+    def push_state_many(self, keys):
+        for key in keys:
+            self.push_state(key)
+
+    def pull_state_many(self, key_lens):
+        for key, state_len in key_lens:
+            self.pull_state(key, state_len)
+
+    def pull_state_offset_many(self, key, total_len, ranges):
+        for offset, offset_len in ranges:
+            self.pull_state_offset(key, total_len, offset, offset_len)
+
+    def chain_call(self, func, input_data):
+        raise NotImplementedError()
+
+    def await_call(self, call_id):
+        raise NotImplementedError()
+
+    def chain_call_many(self, func, inputs):
+        return [self.chain_call(func, input_data) for input_data in inputs]
+
+    def await_call_many(self, call_ids):
+        return [self.await_call(call_id) for call_id in call_ids]
+
+    def set_emulator_message(self, message_json):
+        raise NotImplementedError()
+
+    def set_emulator_status(self, success):
+        raise NotImplementedError()
+
+    def get_emulator_async_response(self):
+        raise NotImplementedError()
+
+
+class NativeBackend(StateBackend):
+    def __init__(self):
+        # Only load the C extension when the native backend is actually used
+        self.cf = importlib.import_module("pyfaasm.cfaasm")
+
+    def get_input(self):
+        return self.cf.faasm_get_input()
+
+    def set_output(self, output):
+        self.cf.faasm_set_output(output)
+
+    def get_input_size(self):
+        return self.cf.faasm_get_input_size()
+
+    def read_input_into(self, buffer):
+        return self.cf.faasm_read_input_into(buffer)
+
+    def get_state_size(self, key):
+        return self.cf.faasm_get_state_size(key)
+
+    def get_state(self, key, state_len):
+        return self.cf.faasm_get_state(key, state_len)
+
+    def get_state_offset(self, key, total_len, offset, offset_len):
+        return self.cf.faasm_get_state_offset(key, total_len, offset, offset_len)
+
+    def get_state_view(self, key, state_len):
+        return self.cf.faasm_get_state_view(key, state_len)
+
+    def get_state_offset_view(self, key, total_len, offset, offset_len):
+        return self.cf.faasm_get_state_offset_view(key, total_len, offset, offset_len)
+
+    def set_state(self, key, value):
+        self.cf.faasm_set_state(key, value)
+
+    def set_state_offset(self, key, total_len, offset, value):
+        self.cf.faasm_set_state_offset(key, total_len, offset, value)
+
+    def push_state(self, key):
+        self.cf.faasm_push_state(key)
+
+    def push_state_partial(self, key):
+        self.cf.faasm_push_state_partial(key)
+
+    def pull_state(self, key, state_len):
+        self.cf.faasm_pull_state(key, state_len)
+
+    def pull_state_offset(self, key, total_len, offset, offset_len):
+        self.cf.faasm_pull_state_offset(key, total_len, offset, offset_len)
+
+    def get_state_many(self, key_lens):
+        return self.cf.faasm_get_state_many(key_lens)
+
+    def get_state_offset_many(self, key, total_len, ranges):
+        return self.cf.faasm_get_state_offset_many(key, total_len, ranges)
+
+    def set_state_many(self, items):
+        self.cf.faasm_set_state_many(items)
+
+    def set_state_offset_many(self, key, total_len, writes):
+        self.cf.faasm_set_state_offset_many(key, total_len, writes)
+
+    def push_state_many(self, keys):
+        self.cf.faasm_push_state_many(keys)
+
+    def pull_state_many(self, key_lens):
+        self.cf.faasm_pull_state_many(key_lens)
+
+    def pull_state_offset_many(self, key, total_len, ranges):
+        self.cf.faasm_pull_state_offset_many(key, total_len, ranges)
+
+    def chain_call(self, func, input_data):
+        return self.cf.faasm_chain_py(func.__name__, input_data)
+
+    def await_call(self, call_id):
+        return self.cf.faasm_await_call(call_id)
+
+    def chain_call_many(self, func, inputs):
+        return self.cf.faasm_chain_py_many(func.__name__, inputs)
+
+    def await_call_many(self, call_ids):
+        return self.cf.faasm_await_call_many(call_ids)
+
+    def set_emulator_message(self, message_json):
+        return self.cf.set_emulator_message(message_json)
+
+    def set_emulator_status(self, success):
+        self.cf.set_emulator_status(success)
+
+    def get_emulator_async_response(self):
+        return self.cf.get_emulator_async_response()
+
+
+def _as_byte_view(value):
+    # Turns any buffer into a flat byte view, only copying if the buffer is
+    # not contiguous
+    view = memoryview(value)
+    if not view.c_contiguous:
+        view = memoryview(view.tobytes())
+
+    return view.cast("B")
+
+
+class LocalBackend(StateBackend):
+    """
+    Keeps state in memory in this process and runs chained calls directly.
+    There is only one copy of each value, so push and pull are no-ops.
+    """
+
+    def __init__(self, input_data=b""):
+        self.input_data = input_data
+        self.output_data = None
+        self.state = dict()
+        self.call_results = dict()
+
+        self._call_ids = count(1)
+        self._message_ids = count(1)
+
+    def _get_value(self, key, total_len):
+        value = self.state.get(key)
+        if value is None:
+            # Like the host, reading a key that doesn't exist creates it. Note
+            # that chained calls may be running concurrently in threads.
+            value = self.state.setdefault(key, bytearray(total_len))
+
+        if len(value) < total_len:
+            raise ValueError("State {} is {} bytes, not {}".format(key, len(value), total_len))
+
+        return value
+
+    def get_input(self):
+        return self.input_data
+
+    def set_output(self, output):
+        self.output_data = bytes(output)
+
+    def get_state_size(self, key):
+        value = self.state.get(key)
+        return 0 if value is None else len(value)
+
+    def get_state(self, key, state_len):
+        return bytes(memoryview(self._get_value(key, state_len))[:state_len])
+
+    def get_state_offset(self, key, total_len, offset, offset_len):
+        value = self._get_value(key, total_len)
+        return bytes(memoryview(value)[offset:offset + offset_len])
+
+    def get_state_view(self, key, state_len):
+        return memoryview(self._get_value(key, state_len))[:state_len]
+
+    def get_state_offset_view(self, key, total_len, offset, offset_len):
+        value = self._get_value(key, total_len)
+        return memoryview(value)[offset:offset + offset_len]
+
+    def set_state(self, key, value):
+        value = _as_byte_view(value)
+        existing = self.state.get(key)
+
+        # Write in place where possible so that existing views stay valid
+        if existing is not None and len(existing) == len(value):
+            existing[:] = value
+        else:
+            self.state[key] = bytearray(value)
+
+    def set_state_offset(self, key, total_len, offset, value):
+        value = _as_byte_view(value)
+        existing = self._get_value(key, total_len)
+        existing[offset:offset + len(value)] = value
+
+    def push_state(self, key):
+        pass
+
+    def push_state_partial(self, key):
+        pass
+
+    def pull_state(self, key, state_len):
+        self._get_value(key, state_len)
+
+    def pull_state_offset(self, key, total_len, offset, offset_len):
+        self._get_value(key, total_len)
+
+    def chain_call(self, func, input_data):
+        call_id = next(self._call_ids)
+        result = func(input_data)
+        self.call_results[call_id] = 0 if result is None else int(result)
+        return call_id
+
+    def await_call(self, call_id):
+        return self.call_results.pop(call_id)
+
+    def set_emulator_message(self, message_json):
+        self.output_data = None
+        return next(self._message_ids)
+
+    def set_emulator_status(self, success):
+        pass
+
+    def get_emulator_async_response(self):
+        # Calls run in-process, so there's never an async response
+        return None
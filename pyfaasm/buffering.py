@@ -0,0 +1,105 @@
+from threading import Lock
+
+
+def merge_writes(writes):
+    """
+    Merges a list of (offset, value) writes into the minimal list of
+    (offset, value) writes covering the same bytes. Overlapping and adjacent
+    writes are merged, with later writes taking precedence over earlier ones.
+    """
+    if not writes:
+        return []
+
+    # Work out the merged ranges
+    ranges = list()
+    for offset, value in sorted(writes, key=lambda w: w[0]):
+        end = offset + len(value)
+        if ranges and offset <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], end)
+        else:
+            ranges.append([offset, end])
+
+    # Apply the writes in their original order
+    merged = [(start, bytearray(end - start)) for start, end in ranges]
+    starts = [start for start, _ in ranges]
+    for offset, value in writes:
+        # Find the range containing this write
+        idx = _find_range(starts, offset)
+        range_start, buffer = merged[idx]
+        buffer[offset - range_start:offset - range_start + len(value)] = value
+
+    return merged
+
+
+def _find_range(starts, offset):
+    lo, hi = 0, len(starts)
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if starts[mid] <= offset:
+            lo = mid
+        else:
+            hi = mid
+
+    return lo
+
+
+class WriteBuffer(object):
+    """
+    Holds offset writes to state until they're flushed, so that many small
+    writes to the same key can be sent to the host as a few larger ones.
+    """
+
+    def __init__(self):
+        self.pending = dict()
+
+        self.n_writes = 0
+        self.n_flushed_writes = 0
+
+        self._lock = Lock()
+
+    def add(self, key, total_len, offset, value):
+        # Take a copy as the caller may reuse its buffer
+        value = bytes(memoryview(value))
+
+        with self._lock:
+            self.n_writes += 1
+            _, writes = self.pending.setdefault(key, (total_len, list()))
+            writes.append((offset, value))
+
+    def has_pending(self, key):
+        return key in self.pending
+
+    def get_pending_keys(self):
+        with self._lock:
+            return list(self.pending.keys())
+
+    def take(self, key):
+        """
+        Removes the pending writes for the given key, returning the total
+        length and the merged writes (or None if there are none)
+        """
+        with self._lock:
+            pending = self.pending.pop(key, None)
+
+        if pending is None:
+            return None
+
+        total_len, writes = pending
+        merged = merge_writes(writes)
+
+        with self._lock:
+            self.n_flushed_writes += len(merged)
+
+        return total_len, merged
+
+    def discard(self, key):
+        with self._lock:
+            self.pending.pop(key, None)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "writes": self.n_writes,
+                "flushed_writes": self.n_flushed_writes,
+                "pending_keys": len(self.pending),
+            }
@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from threading import Lock
+
+
+class StateCache(object):
+    """
+    Byte-budgeted LRU cache of state values, keyed on state key and range.
+    Whole values are cached with an offset of None. Values bigger than the
+    whole budget are never cached.
+
+    Entries are also indexed by state key, so invalidating a key only touches
+    the ranges cached for it.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.entries = OrderedDict()
+        self.key_index = dict()
+
+        self._lock = Lock()
+
+    def get(self, key, offset, length):
+        cache_key = (key, offset, length)
+        with self._lock:
+            value = self.entries.get(cache_key)
+            if value is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(cache_key)
+            return value
+
+    def put(self, key, offset, length, value):
+        value_len = len(value)
+        if value_len > self.max_bytes:
+            return
+
+        cache_key = (key, offset, length)
+        with self._lock:
+            existing = self.entries.pop(cache_key, None)
+            if existing is not None:
+                self.current_bytes -= len(existing)
+
+            self.entries[cache_key] = value
+            self.key_index.setdefault(key, set()).add(cache_key)
+            self.current_bytes += value_len
+
+            # Evict least recently used values until we're within budget
+            while self.current_bytes > self.max_bytes:
+                evicted_key, evicted = self.entries.popitem(last=False)
+                self._remove_from_index(evicted_key)
+                self.current_bytes -= len(evicted)
+                self.evictions += 1
+
+    def _remove_from_index(self, cache_key):
+        key_entries = self.key_index.get(cache_key[0])
+        if key_entries is not None:
+            key_entries.discard(cache_key)
+            if not key_entries:
+                del self.key_index[cache_key[0]]
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self.entries.clear()
+                self.key_index.clear()
+                self.current_bytes = 0
+                return
+
+            for cache_key in self.key_index.pop(key, ()):
+                self.current_bytes -= len(self.entries.pop(cache_key))
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -45,6 +45,9 @@ void __faasm_push_state_partial(const char *key);
 FAASM_IMPORT
 void __faasm_pull_state(const char *key, long stateLen);
 
+FAASM_IMPORT
+void __faasm_pull_state_offset(const char *key, long totalLen, long offset, long len);
+
 // ------ Faasm chaining ------
 FAASM_IMPORT
 unsigned int __faasm_chain_py(const char* name, const unsigned char *inputData, long inputDataSize);
@@ -71,6 +74,53 @@ void emulatorSetCallStatus(int success);
     if(!ret) return NULL;                                               \
     return ret;
 
+// Wraps host memory in a memoryview without copying. Writes through the view
+// go straight to the underlying state value.
+#define RETURN_VIEW(value, valueLen)                                    \
+    PyObject *ret = PyMemoryView_FromMemory(                            \
+        (char*) value, valueLen, PyBUF_WRITE                            \
+    );                                                                  \
+    if(!ret) return NULL;                                               \
+    return ret;
+
+// Gets a pointer to the data of any object supporting the buffer protocol
+// (bytes, bytearray, memoryview, numpy arrays etc.). Non-contiguous buffers are
+// copied into a temporary C-contiguous buffer, so callers must always pass the
+// result to releaseBufferData when done.
+static int getBufferData(PyObject *obj, Py_buffer *view, unsigned char **data) {
+    if(PyObject_GetBuffer(obj, view, PyBUF_FULL_RO) == -1) {
+        return -1;
+    }
+
+    if(view->len == 0 || PyBuffer_IsContiguous(view, 'C')) {
+        *data = (unsigned char*) view->buf;
+        return 0;
+    }
+
+    *data = (unsigned char *) malloc(view->len);
+    if(!*data) {
+        PyBuffer_Release(view);
+        PyErr_NoMemory();
+        return -1;
+    }
+
+    if(PyBuffer_ToContiguous(*data, view, view->len, 'C') == -1) {
+        free(*data);
+        PyBuffer_Release(view);
+        return -1;
+    }
+
+    return 0;
+}
+
+static void releaseBufferData(Py_buffer *view, unsigned char *data) {
+    if(data != view->buf) {
+        free(data);
+    }
+
+    PyBuffer_Release(view);
+}
+
 // ----------------------------------
 // Tester functions
 // ----------------------------------
@@ -99,28 +149,70 @@ static PyObject *check_input(PyObject *self) {
 // Get input to the function
 static PyObject *faasm_get_input(PyObject *self) {
     unsigned char emptyBuf[1];
-    unsigned long inputSize = __faasm_read_input(emptyBuf, 0);
+    long inputSize = __faasm_read_input(emptyBuf, 0);
 
-    unsigned char *inputBuf = (unsigned char *) malloc(inputSize);
-    __faasm_read_input(inputBuf, inputSize);
+    // Read straight into a new bytes object rather than an intermediate buffer
+    PyObject *ret = PyBytes_FromStringAndSize(NULL, inputSize);
+    if(!ret) {
+        return NULL;
+    }
 
-    RETURN_BYTES(inputBuf, inputSize);
+    if(inputSize > 0) {
+        __faasm_read_input((unsigned char*) PyBytes_AS_STRING(ret), inputSize);
+    }
+
+    return ret;
+}
+
+// Get the size of the input to the function
+static PyObject *faasm_get_input_size(PyObject *self) {
+    unsigned char emptyBuf[1];
+    long inputSize = __faasm_read_input(emptyBuf, 0);
+    return PyLong_FromLong(inputSize);
+}
+
+// Read the input to the function into any writable, contiguous buffer (e.g. a
+// bytearray or numpy array) big enough to hold it, returning its size
+static PyObject *faasm_read_input_into(PyObject *self, PyObject *args) {
+    Py_buffer view;
+    if(!PyArg_ParseTuple(args, "w*", &view)) {
+        return NULL;
+    }
+
+    unsigned char emptyBuf[1];
+    long inputSize = __faasm_read_input(emptyBuf, 0);
+    if(view.len < inputSize) {
+        PyBuffer_Release(&view);
+        return PyErr_Format(
+            PyExc_ValueError, "Buffer of %zd bytes too small for input of %ld bytes", view.len, inputSize
+        );
+    }
+
+    if(inputSize > 0) {
+        __faasm_read_input((unsigned char*) view.buf, inputSize);
+    }
+
+    PyBuffer_Release(&view);
+    return PyLong_FromLong(inputSize);
 }
 
 // Set output
 static PyObject *faasm_set_output(PyObject *self, PyObject *args) {
-    // Note, the type of this variable will be PyBytesObject, but the
-    // Python C API just deals in generic PyObject pointers
+    // Output can be any object supporting the buffer protocol
     PyObject* outputData = NULL;
-    if(!PyArg_ParseTuple(args, "S", &outputData)) {
+    if(!PyArg_ParseTuple(args, "O", &outputData)) {
+        return NULL;
+    }
+
+    Py_buffer view;
+    unsigned char *data = NULL;
+    if(getBufferData(outputData, &view, &data) == -1) {
         return NULL;
     }
 
-    __faasm_write_output(
-        (unsigned char*) PyBytes_AsString(outputData),
-        PyBytes_Size(outputData)
-    );
+    __faasm_write_output(data, view.len);
 
+    releaseBufferData(&view, data);
     Py_RETURN_NONE;
 }
 
@@ -165,20 +257,49 @@ static PyObject *faasm_get_state_offset(PyObject *self, PyObject *args) {
     RETURN_BYTES(stateBuffer, len);
 }
 
+// Get whole state value as a view onto the state memory
+static PyObject *faasm_get_state_view(PyObject *self, PyObject *args) {
+    char* key = NULL;
+    int stateLen = 0;
+    if(!PyArg_ParseTuple(args, "si", &key, &stateLen)) {
+        return NULL;
+    }
+
+    unsigned char *stateBuffer = __faasm_read_state_ptr(key, stateLen);
+    RETURN_VIEW(stateBuffer, stateLen);
+}
+
+// Get state segment as a view onto the state memory
+static PyObject *faasm_get_state_offset_view(PyObject *self, PyObject *args) {
+    char* key = NULL;
+    int totalLen = 0;
+    int offset = 0;
+    int len = 0;
+    if(!PyArg_ParseTuple(args, "siii", &key, &totalLen, &offset, &len)) {
+        return NULL;
+    }
+
+    unsigned char *stateBuffer = __faasm_read_state_offset_ptr(key, totalLen, offset, len);
+    RETURN_VIEW(stateBuffer, len);
+}
+
 // Set whole state value
 static PyObject *faasm_set_state(PyObject *self, PyObject *args) {
     char* key = NULL;
     PyObject* value = NULL;
-    if(!PyArg_ParseTuple(args, "sS", &key, &value)) {
+    if(!PyArg_ParseTuple(args, "sO", &key, &value)) {
         return NULL;
     }
 
-    __faasm_write_state(
-        key,
-        (unsigned char*) PyBytes_AsString(value),
-        PyBytes_Size(value)
-    );
+    Py_buffer view;
+    unsigned char *data = NULL;
+    if(getBufferData(value, &view, &data) == -1) {
+        return NULL;
+    }
 
+    __faasm_write_state(key, data, view.len);
+
+    releaseBufferData(&view, data);
     Py_RETURN_NONE;
 }
 
@@ -188,18 +309,19 @@ static PyObject *faasm_set_state_offset(PyObject *self, PyObject *args) {
     int totalLen = 0;
     int offset = 0;
     PyObject * value = NULL;
-    if(!PyArg_ParseTuple(args, "siiS", &key, &totalLen, &offset, &value)) {
+    if(!PyArg_ParseTuple(args, "siiO", &key, &totalLen, &offset, &value)) {
         return NULL;
     }
 
-    __faasm_write_state_offset(
-        key,
-        totalLen,
-        offset,
-        (unsigned char*) PyBytes_AsString(value),
-        PyBytes_Size(value)
-    );
+    Py_buffer view;
+    unsigned char *data = NULL;
+    if(getBufferData(value, &view, &data) == -1) {
+        return NULL;
+    }
+
+    __faasm_write_state_offset(key, totalLen, offset, data, view.len);
 
+    releaseBufferData(&view, data);
     Py_RETURN_NONE;
 }
 
@@ -240,6 +362,277 @@ static PyObject *faasm_pull_state(PyObject *self, PyObject *args) {
     Py_RETURN_NONE;
 }
 
+// Pull a segment of a state value
+static PyObject *faasm_pull_state_offset(PyObject *self, PyObject *args) {
+    char* key = NULL;
+    int totalLen = 0;
+    int offset = 0;
+    int len = 0;
+    if(!PyArg_ParseTuple(args, "siii", &key, &totalLen, &offset, &len)) {
+        return NULL;
+    }
+
+    __faasm_pull_state_offset(key, totalLen, offset, len);
+
+    Py_RETURN_NONE;
+}
+
+// ----------------------------------
+// Batched state
+// ----------------------------------
+
+// The batched functions take a sequence of tuples and make all the host calls
+// in one go, avoiding the overhead of crossing from Python for each key.
+
+// Get many whole state values from a sequence of (key, len)
+static PyObject *faasm_get_state_many(PyObject *self, PyObject *args) {
+    PyObject* keyLens = NULL;
+    if(!PyArg_ParseTuple(args, "O", &keyLens)) {
+        return NULL;
+    }
+
+    PyObject *seq = PySequence_Fast(keyLens, "Expected a sequence of (key, len)");
+    if(!seq) {
+        return NULL;
+    }
+
+    Py_ssize_t nKeys = PySequence_Fast_GET_SIZE(seq);
+    PyObject *result = PyList_New(nKeys);
+    if(!result) {
+        Py_DECREF(seq);
+        return NULL;
+    }
+
+    for(Py_ssize_t i = 0; i < nKeys; i++) {
+        char* key = NULL;
+        int stateLen = 0;
+        if(!PyArg_ParseTuple(PySequence_Fast_GET_ITEM(seq, i), "si", &key, &stateLen)) {
+            Py_DECREF(result);
+            Py_DECREF(seq);
+            return NULL;
+        }
+
+        unsigned char *stateBuffer = __faasm_read_state_ptr(key, stateLen);
+        PyObject *value = PyBytes_FromStringAndSize((char*) stateBuffer, stateLen);
+        if(!value) {
+            Py_DECREF(result);
+            Py_DECREF(seq);
+            return NULL;
+        }
+
+        PyList_SET_ITEM(result, i, value);
+    }
+
+    Py_DECREF(seq);
+    return result;
+}
+
+// Get many segments of one state value from a sequence of (offset, len)
+static PyObject *faasm_get_state_offset_many(PyObject *self, PyObject *args) {
+    char* key = NULL;
+    int totalLen = 0;
+    PyObject* ranges = NULL;
+    if(!PyArg_ParseTuple(args, "siO", &key, &totalLen, &ranges)) {
+        return NULL;
+    }
+
+    PyObject *seq = PySequence_Fast(ranges, "Expected a sequence of (offset, len)");
+    if(!seq) {
+        return NULL;
+    }
+
+    Py_ssize_t nRanges = PySequence_Fast_GET_SIZE(seq);
+    PyObject *result = PyList_New(nRanges);
+    if(!result) {
+        Py_DECREF(seq);
+        return NULL;
+    }
+
+    for(Py_ssize_t i = 0; i < nRanges; i++) {
+        int offset = 0;
+        int len = 0;
+        if(!PyArg_ParseTuple(PySequence_Fast_GET_ITEM(seq, i), "ii", &offset, &len)) {
+            Py_DECREF(result);
+            Py_DECREF(seq);
+            return NULL;
+        }
+
+        unsigned char *stateBuffer = __faasm_read_state_offset_ptr(key, totalLen, offset, len);
+        PyObject *value = PyBytes_FromStringAndSize((char*) stateBuffer, len);
+        if(!value) {
+            Py_DECREF(result);
+            Py_DECREF(seq);
+            return NULL;
+        }
+
+        PyList_SET_ITEM(result, i, value);
+    }
+
+    Py_DECREF(seq);
+    return result;
+}
+
+// Set many whole state values from a sequence of (key, value)
+static PyObject *faasm_set_state_many(PyObject *self, PyObject *args) {
+    PyObject* items = NULL;
+    if(!PyArg_ParseTuple(args, "O", &items)) {
+        return NULL;
+    }
+
+    PyObject *seq = PySequence_Fast(items, "Expected a sequence of (key, value)");
+    if(!seq) {
+        return NULL;
+    }
+
+    Py_ssize_t nItems = PySequence_Fast_GET_SIZE(seq);
+    for(Py_ssize_t i = 0; i < nItems; i++) {
+        char* key = NULL;
+        PyObject* value = NULL;
+        if(!PyArg_ParseTuple(PySequence_Fast_GET_ITEM(seq, i), "sO", &key, &value)) {
+            Py_DECREF(seq);
+            return NULL;
+        }
+
+        Py_buffer view;
+        unsigned char *data = NULL;
+        if(getBufferData(value, &view, &data) == -1) {
+            Py_DECREF(seq);
+            return NULL;
+        }
+
+        __faasm_write_state(key, data, view.len);
+
+        releaseBufferData(&view, data);
+    }
+
+    Py_DECREF(seq);
+    Py_RETURN_NONE;
+}
+
+// Set many segments of one state value from a sequence of (offset, value)
+static PyObject *faasm_set_state_offset_many(PyObject *self, PyObject *args) {
+    char* key = NULL;
+    int totalLen = 0;
+    PyObject* writes = NULL;
+    if(!PyArg_ParseTuple(args, "siO", &key, &totalLen, &writes)) {
+        return NULL;
+    }
+
+    PyObject *seq = PySequence_Fast(writes, "Expected a sequence of (offset, value)");
+    if(!seq) {
+        return NULL;
+    }
+
+    Py_ssize_t nWrites = PySequence_Fast_GET_SIZE(seq);
+    for(Py_ssize_t i = 0; i < nWrites; i++) {
+        int offset = 0;
+        PyObject* value = NULL;
+        if(!PyArg_ParseTuple(PySequence_Fast_GET_ITEM(seq, i), "iO", &offset, &value)) {
+            Py_DECREF(seq);
+            return NULL;
+        }
+
+        Py_buffer view;
+        unsigned char *data = NULL;
+        if(getBufferData(value, &view, &data) == -1) {
+            Py_DECREF(seq);
+            return NULL;
+        }
+
+        __faasm_write_state_offset(key, totalLen, offset, data, view.len);
+
+        releaseBufferData(&view, data);
+    }
+
+    Py_DECREF(seq);
+    Py_RETURN_NONE;
+}
+
+// Push many whole state values from a sequence of keys
+static PyObject *faasm_push_state_many(PyObject *self, PyObject *args) {
+    PyObject* keys = NULL;
+    if(!PyArg_ParseTuple(args, "O", &keys)) {
+        return NULL;
+    }
+
+    PyObject *seq = PySequence_Fast(keys, "Expected a sequence of keys");
+    if(!seq) {
+        return NULL;
+    }
+
+    Py_ssize_t nKeys = PySequence_Fast_GET_SIZE(seq);
+    for(Py_ssize_t i = 0; i < nKeys; i++) {
+        const char *key = PyUnicode_AsUTF8(PySequence_Fast_GET_ITEM(seq, i));
+        if(!key) {
+            Py_DECREF(seq);
+            return NULL;
+        }
+
+        __faasm_push_state(key);
+    }
+
+    Py_DECREF(seq);
+    Py_RETURN_NONE;
+}
+
+// Pull many whole state values from a sequence of (key, len)
+static PyObject *faasm_pull_state_many(PyObject *self, PyObject *args) {
+    PyObject* keyLens = NULL;
+    if(!PyArg_ParseTuple(args, "O", &keyLens)) {
+        return NULL;
+    }
+
+    PyObject *seq = PySequence_Fast(keyLens, "Expected a sequence of (key, len)");
+    if(!seq) {
+        return NULL;
+    }
+
+    Py_ssize_t nKeys = PySequence_Fast_GET_SIZE(seq);
+    for(Py_ssize_t i = 0; i < nKeys; i++) {
+        char* key = NULL;
+        int stateLen = 0;
+        if(!PyArg_ParseTuple(PySequence_Fast_GET_ITEM(seq, i), "si", &key, &stateLen)) {
+            Py_DECREF(seq);
+            return NULL;
+        }
+
+        __faasm_pull_state(key, stateLen);
+    }
+
+    Py_DECREF(seq);
+    Py_RETURN_NONE;
+}
+
+// Pull many segments of one state value from a sequence of (offset, len)
+static PyObject *faasm_pull_state_offset_many(PyObject *self, PyObject *args) {
+    char* key = NULL;
+    int totalLen = 0;
+    PyObject* ranges = NULL;
+    if(!PyArg_ParseTuple(args, "siO", &key, &totalLen, &ranges)) {
+        return NULL;
+    }
+
+    PyObject *seq = PySequence_Fast(ranges, "Expected a sequence of (offset, len)");
+    if(!seq) {
+        return NULL;
+    }
+
+    Py_ssize_t nRanges = PySequence_Fast_GET_SIZE(seq);
+    for(Py_ssize_t i = 0; i < nRanges; i++) {
+        int offset = 0;
+        int len = 0;
+        if(!PyArg_ParseTuple(PySequence_Fast_GET_ITEM(seq, i), "ii", &offset, &len)) {
+            Py_DECREF(seq);
+            return NULL;
+        }
+
+        __faasm_pull_state_offset(key, totalLen, offset, len);
+    }
+
+    Py_DECREF(seq);
+    Py_RETURN_NONE;
+}
+
 // ----------------------------------
 // Chaining
 // ----------------------------------
@@ -247,16 +640,19 @@ static PyObject *faasm_pull_state(PyObject *self, PyObject *args) {
 static PyObject *faasm_chain_py(PyObject *self, PyObject *args) {
     char* functionName = NULL;
     PyObject* inputData = NULL;
-    if(!PyArg_ParseTuple(args, "sS", &functionName, &inputData)) {
+    if(!PyArg_ParseTuple(args, "sO", &functionName, &inputData)) {
         return NULL;
     }
 
-    int callId = __faasm_chain_py(
-        functionName,
-        (unsigned char*) PyBytes_AsString(inputData),
-        PyBytes_Size(inputData)
-    );
+    Py_buffer view;
+    unsigned char *data = NULL;
+    if(getBufferData(inputData, &view, &data) == -1) {
+        return NULL;
+    }
 
+    int callId = __faasm_chain_py(functionName, data, view.len);
+
+    releaseBufferData(&view, data);
     return Py_BuildValue("i", callId);
 }
 
@@ -280,6 +676,100 @@ static PyObject *faasm_await_call(PyObject *self, PyObject *args) {
     return Py_BuildValue("i", result);
 }
 
+// Chain a call to the same function for each of a sequence of inputs,
+// returning a list of call IDs
+static PyObject *faasm_chain_py_many(PyObject *self, PyObject *args) {
+    char* functionName = NULL;
+    PyObject* inputs = NULL;
+    if(!PyArg_ParseTuple(args, "sO", &functionName, &inputs)) {
+        return NULL;
+    }
+
+    PyObject *seq = PySequence_Fast(inputs, "Expected a sequence of inputs");
+    if(!seq) {
+        return NULL;
+    }
+
+    Py_ssize_t nInputs = PySequence_Fast_GET_SIZE(seq);
+    PyObject *callIds = PyList_New(nInputs);
+    if(!callIds) {
+        Py_DECREF(seq);
+        return NULL;
+    }
+
+    for(Py_ssize_t i = 0; i < nInputs; i++) {
+        Py_buffer view;
+        unsigned char *data = NULL;
+        if(getBufferData(PySequence_Fast_GET_ITEM(seq, i), &view, &data) == -1) {
+            Py_DECREF(callIds);
+            Py_DECREF(seq);
+            return NULL;
+        }
+
+        unsigned int callId = __faasm_chain_py(functionName, data, view.len);
+        releaseBufferData(&view, data);
+
+        PyList_SET_ITEM(callIds, i, PyLong_FromUnsignedLong(callId));
+    }
+
+    Py_DECREF(seq);
+    return callIds;
+}
+
+// Await all of a sequence of call IDs, returning a list of their return codes.
+// The GIL is only released and reacquired once for the whole batch.
+static PyObject *faasm_await_call_many(PyObject *self, PyObject *args) {
+    PyObject* ids = NULL;
+    if(!PyArg_ParseTuple(args, "O", &ids)) {
+        return NULL;
+    }
+
+    PyObject *seq = PySequence_Fast(ids, "Expected a sequence of call IDs");
+    if(!seq) {
+        return NULL;
+    }
+
+    Py_ssize_t nIds = PySequence_Fast_GET_SIZE(seq);
+    unsigned int *messageIds = PyMem_Malloc((nIds + 1) * sizeof(unsigned int));
+    int *results = PyMem_Malloc((nIds + 1) * sizeof(int));
+    if(!messageIds || !results) {
+        PyMem_Free(messageIds);
+        PyMem_Free(results);
+        Py_DECREF(seq);
+        return PyErr_NoMemory();
+    }
+
+    for(Py_ssize_t i = 0; i < nIds; i++) {
+        messageIds[i] = (unsigned int) PyLong_AsUnsignedLong(PySequence_Fast_GET_ITEM(seq, i));
+        if(PyErr_Occurred()) {
+            PyMem_Free(messageIds);
+            PyMem_Free(results);
+            Py_DECREF(seq);
+            return NULL;
+        }
+    }
+    Py_DECREF(seq);
+
+    Py_BEGIN_ALLOW_THREADS
+
+    for(Py_ssize_t i = 0; i < nIds; i++) {
+        results[i] = __faasm_await_call(messageIds[i]);
+    }
+
+    Py_END_ALLOW_THREADS
+
+    PyObject *resultList = PyList_New(nIds);
+    if(resultList) {
+        for(Py_ssize_t i = 0; i < nIds; i++) {
+            PyList_SET_ITEM(resultList, i, PyLong_FromLong(results[i]));
+        }
+    }
+
+    PyMem_Free(messageIds);
+    PyMem_Free(results);
+    return resultList;
+}
+
 // ----------------------------------
 // Emulator
 // ----------------------------------
@@ -317,17 +807,31 @@ static PyMethodDef cfaasm_methods[] = {
         {"hello_faasm", (PyCFunction) hello_faasm, METH_NOARGS, NULL},
         {"check_input", (PyCFunction) check_input, METH_NOARGS, NULL},
         {"faasm_get_input", (PyCFunction) faasm_get_input, METH_NOARGS, NULL},
+        {"faasm_get_input_size", (PyCFunction) faasm_get_input_size, METH_NOARGS, NULL},
+        {"faasm_read_input_into", (PyCFunction) faasm_read_input_into, METH_VARARGS, NULL},
         {"faasm_set_output", (PyCFunction) faasm_set_output, METH_VARARGS, NULL},
         {"faasm_get_state", (PyCFunction) faasm_get_state, METH_VARARGS, NULL},
         {"faasm_get_state_offset", (PyCFunction) faasm_get_state_offset, METH_VARARGS, NULL},
+        {"faasm_get_state_view", (PyCFunction) faasm_get_state_view, METH_VARARGS, NULL},
+        {"faasm_get_state_offset_view", (PyCFunction) faasm_get_state_offset_view, METH_VARARGS, NULL},
         {"faasm_get_state_size", (PyCFunction) faasm_get_state_size, METH_VARARGS, NULL},
         {"faasm_set_state", (PyCFunction) faasm_set_state, METH_VARARGS, NULL},
         {"faasm_set_state_offset", (PyCFunction) faasm_set_state_offset, METH_VARARGS, NULL},
         {"faasm_push_state", (PyCFunction) faasm_push_state, METH_VARARGS, NULL},
         {"faasm_push_state_partial", (PyCFunction) faasm_push_state_partial, METH_VARARGS, NULL},
         {"faasm_pull_state", (PyCFunction) faasm_pull_state, METH_VARARGS, NULL},
+        {"faasm_pull_state_offset", (PyCFunction) faasm_pull_state_offset, METH_VARARGS, NULL},
+        {"faasm_get_state_many", (PyCFunction) faasm_get_state_many, METH_VARARGS, NULL},
+        {"faasm_get_state_offset_many", (PyCFunction) faasm_get_state_offset_many, METH_VARARGS, NULL},
+        {"faasm_set_state_many", (PyCFunction) faasm_set_state_many, METH_VARARGS, NULL},
+        {"faasm_set_state_offset_many", (PyCFunction) faasm_set_state_offset_many, METH_VARARGS, NULL},
+        {"faasm_push_state_many", (PyCFunction) faasm_push_state_many, METH_VARARGS, NULL},
+        {"faasm_pull_state_many", (PyCFunction) faasm_pull_state_many, METH_VARARGS, NULL},
+        {"faasm_pull_state_offset_many", (PyCFunction) faasm_pull_state_offset_many, METH_VARARGS, NULL},
         {"faasm_chain_py", (PyCFunction) faasm_chain_py, METH_VARARGS, NULL},
         {"faasm_await_call", (PyCFunction) faasm_await_call, METH_VARARGS, NULL},
+        {"faasm_chain_py_many", (PyCFunction) faasm_chain_py_many, METH_VARARGS, NULL},
+        {"faasm_await_call_many", (PyCFunction) faasm_await_call_many, METH_VARARGS, NULL},
         {"set_emulator_message", (PyCFunction) set_emulator_message, METH_VARARGS, NULL},
         {"set_emulator_status", (PyCFunction) set_emulator_status, METH_VARARGS, NULL},
         {"get_emulator_async_response", (PyCFunction) get_emulator_async_response, METH_NOARGS, NULL},
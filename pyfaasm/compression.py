@@ -0,0 +1,186 @@
+import importlib
+import struct
+from threading import Lock
+from time import perf_counter
+
+# Compressed values start with a header holding the codec and the original
+# length, so readers can decode them without knowing how they were written.
+COMPRESSION_MAGIC = b"PFZ"
+COMPRESSION_HEADER = struct.Struct("<3sBQ")
+
+# Only standard library codecs, so this also works in the wasm build (where
+# not all of them may be available)
+CODEC_NONE = "none"
+CODEC_ZLIB = "zlib"
+CODEC_BZ2 = "bz2"
+CODEC_LZMA = "lzma"
+
+_CODEC_IDS = {
+    CODEC_NONE: 0,
+    CODEC_ZLIB: 1,
+    CODEC_BZ2: 2,
+    CODEC_LZMA: 3,
+}
+_CODEC_NAMES = {codec_id: codec for codec, codec_id in _CODEC_IDS.items()}
+
+
+def _compress(codec, data, level):
+    module = importlib.import_module(codec)
+    if level is None:
+        return module.compress(data)
+    elif codec == CODEC_LZMA:
+        return module.compress(data, preset=level)
+    else:
+        return module.compress(data, level)
+
+
+def _decompress(codec, data):
+    return importlib.import_module(codec).decompress(data)
+
+
+def compress_value(value, codec=CODEC_ZLIB, level=None, min_size=0):
+    """
+    Returns the value with a compression header. Values smaller than min_size,
+    or that don't get any smaller, are stored uncompressed after the header.
+    """
+    if codec not in _CODEC_IDS:
+        raise ValueError("Unrecognised codec {}".format(codec))
+
+    data = memoryview(value)
+    if not data.contiguous:
+        data = memoryview(data.tobytes())
+
+    data = data.cast("B")
+
+    payload = data
+    if codec != CODEC_NONE and len(data) >= min_size:
+        compressed = _compress(codec, data, level)
+        if len(compressed) < len(data):
+            payload = compressed
+        else:
+            codec = CODEC_NONE
+    else:
+        codec = CODEC_NONE
+
+    header = COMPRESSION_HEADER.pack(COMPRESSION_MAGIC, _CODEC_IDS[codec], len(data))
+    return b"".join([header, payload]), codec
+
+
+def decompress_value(data):
+    """
+    Returns the original value, or None if the data has no compression header
+    """
+    data = memoryview(data)
+    if len(data) < COMPRESSION_HEADER.size:
+        return None
+
+    magic, codec_id, value_len = COMPRESSION_HEADER.unpack_from(data, 0)
+    if magic != COMPRESSION_MAGIC or codec_id not in _CODEC_NAMES:
+        return None
+
+    payload = data[COMPRESSION_HEADER.size:]
+    codec = _CODEC_NAMES[codec_id]
+    value = bytes(payload) if codec == CODEC_NONE else _decompress(codec, payload)
+
+    if len(value) != value_len:
+        raise ValueError("Decompressed {} bytes, expected {}".format(len(value), value_len))
+
+    return value
+
+
+class StateCompression(object):
+    """
+    Compression policies for state keys, along with stats on how well they're
+    working. Policies apply to an exact key, or to all keys with a prefix (the
+    longest matching prefix wins).
+    """
+
+    def __init__(self):
+        self.key_policies = dict()
+        self.prefix_policies = dict()
+
+        # When disabled, values are written as they are, but those already
+        # compressed can still be read
+        self.enabled = True
+
+        self.n_compressed = 0
+        self.n_uncompressed = 0
+        self.n_decompressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.compress_time = 0.0
+        self.decompress_time = 0.0
+
+        self._lock = Lock()
+
+    def set_policy(self, key, codec=CODEC_ZLIB, level=None, min_size=0, prefix=False):
+        if codec not in _CODEC_IDS:
+            raise ValueError("Unrecognised codec {}".format(codec))
+
+        policies = self.prefix_policies if prefix else self.key_policies
+        policies[key] = (codec, level, min_size)
+
+    def remove_policy(self, key, prefix=False):
+        policies = self.prefix_policies if prefix else self.key_policies
+        policies.pop(key, None)
+
+    def get_policy(self, key):
+        policy = self.key_policies.get(key)
+        if policy is not None:
+            return policy
+
+        matches = [prefix for prefix in self.prefix_policies if key.startswith(prefix)]
+        if not matches:
+            return None
+
+        return self.prefix_policies[max(matches, key=len)]
+
+    def is_compressed(self, key):
+        return self.get_policy(key) is not None
+
+    def compress(self, key, value):
+        if not self.enabled:
+            return value
+
+        codec, level, min_size = self.get_policy(key)
+
+        start = perf_counter()
+        data, used_codec = compress_value(value, codec, level, min_size)
+        elapsed = perf_counter() - start
+
+        with self._lock:
+            if used_codec == CODEC_NONE:
+                self.n_uncompressed += 1
+            else:
+                self.n_compressed += 1
+
+            self.bytes_in += memoryview(value).nbytes
+            self.bytes_out += len(data)
+            self.compress_time += elapsed
+
+        return data
+
+    def decompress(self, data):
+        start = perf_counter()
+        value = decompress_value(data)
+        elapsed = perf_counter() - start
+
+        if value is not None:
+            with self._lock:
+                self.n_decompressed += 1
+                self.decompress_time += elapsed
+
+        return value
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "compressed": self.n_compressed,
+                "uncompressed": self.n_uncompressed,
+                "decompressed": self.n_decompressed,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "ratio": self.bytes_in / self.bytes_out if self.bytes_out > 0 else None,
+                "compress_time": self.compress_time,
+                "decompress_time": self.decompress_time,
+            }
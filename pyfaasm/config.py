@@ -1,22 +1,207 @@
-# NOTE: we are careful to use 32-bit floats to ease interoperability with wasm code
+# NOTE: we default to 32-bit floats to ease interoperability with wasm code
 NP_ELEMENT_SIZE = 4
 
+# Element types matrices can be stored in. Their position in this list is the
+# code used for them in the matrix params.
+MATRIX_DTYPES = ["float32", "float16", "float64"]
+MATRIX_DTYPE_SIZES = {
+    "float16": 2,
+    "float32": 4,
+    "float64": 8,
+}
+
 SUBMATRICES_KEY_A = "mat_a"
 SUBMATRICES_KEY_B = "mat_b"
 INTERMEDIATE_RESULT_PREFIX = "intermediate"
 RESULT_MATRIX_KEY = "result_matrix"
+RESULT_ACCUMULATE_KEY = "result_accumulate"
 MATRIX_CONF_STATE_KEY = "matrix_state"
+MATRIX_COST_MODEL_STATE_KEY = "matrix_cost_model"
+STRASSEN_OPERAND_PREFIX = "strassen"
+OCCUPANCY_KEY_SUFFIX = "occupancy"
 
 
 # Remember we're dealing with square matrices and splitting the matrix into
 # four pieces each time we do the divide in the divide and conquer.
 # The number of splits is how many times we're dividing the origin matrices.
+#
+# The top strassen_levels splits use Strassen's algorithm (7 multiplications
+# rather than 8), the remaining splits use the standard algorithm. Each
+# Strassen multiplication works on its own operands, written to state under
+# keys derived from the node ID of the multiplication. The node ID of the top
+# level is 0, and the node ID of the kth Strassen multiplication under node n
+# is (8 * n) + k.
+#
+# In in-place mode, rather than writing intermediate results, each
+# multiplication of submatrices adds its result straight into its part of the
+# result matrix. The two multiplications contributing to each part of the
+# result are run one after the other, so only one worker ever updates a given
+# part of the result at once. This serialises the fan-out into two waves: each
+# level only runs four multiplications at a time rather than eight, and the
+# second wave waits for the slowest of the first. In-place mode saves the
+# state used by intermediate results at the cost of this parallelism.
+#
+# In the tiled layout each input matrix is stored under a single key, with its
+# submatrices one after the other in row-major order (i.e. tile-major order).
+# Submatrices are then read with offset reads rather than a key each.
+#
+# Matrices are stored (inputs, intermediate results and the result) with the
+# element type dtype, but multiplications and additions are done in
+# accumulate_dtype. For example, storing in float16 and accumulating in float32
+# halves the data moved through state, at some cost in precision. In in-place
+# mode with a wider accumulate_dtype, the partial sums are kept in a separate
+# result matrix with accumulate_dtype, so they aren't rounded to dtype at each
+# step. This is converted to dtype once all the multiplications are done.
+#
+# In sparse mode, each input matrix has an occupancy bitmap in state, with a
+# bit for each of its submatrices saying whether it holds any non-zero values.
+# Empty submatrices aren't written to or read from state, and multiplications
+# where either operand is empty are pruned, their results being treated as
+# zero. Bits are in the same row-major order as the tiled layout.
+#
+# With a cost model, each multiplication above the bottom level decides for
+# itself whether to split further or just do the multiplication locally. Its
+# result is the same either way, so the decisions don't need to agree.
+
+
+class MatrixCostModel(object):
+    """
+    Estimates whether chaining a multiplication is faster than doing it
+    locally. Chaining costs the latency of a fan-out, plus the slowest child's
+    multiplication, plus moving the children's operands and results through
+    state. In in-place mode the children run in two waves, each with its own
+    fan-out latency and compute time.
+    - chain_latency is the time (in seconds) to chain and await a fan-out
+    - flop_rate is local floating point operations per second
+    - state_bandwidth is bytes per second through state (0 to ignore)
+    - max_parallel is how many children can actually run at once
+    """
+
+    def __init__(
+        self, chain_latency, flop_rate, state_bandwidth=0, max_parallel=8
+    ):
+        self.chain_latency = float(chain_latency)
+        self.flop_rate = float(flop_rate)
+        self.state_bandwidth = float(state_bandwidth)
+        self.max_parallel = max(1, int(max_parallel))
+
+    def get_local_time(self, size):
+        return (2 * size**3) / self.flop_rate
+
+    def get_transfer_time(self, n_bytes):
+        return (
+            n_bytes / self.state_bandwidth if self.state_bandwidth > 0 else 0
+        )
+
+    def get_chained_time(
+        self, size, n_children, element_size=NP_ELEMENT_SIZE, in_place=False
+    ):
+        child_size = size // 2
+        child_bytes = child_size * child_size * element_size
+
+        # In-place mode runs the children in two waves, each waiting on the
+        # last, and children beyond max_parallel have to wait their turn
+        n_waves = 2 if in_place else 1
+        children_per_wave = -(-n_children // n_waves)
+        n_rounds = -(-children_per_wave // self.max_parallel)
+        wave_time = self.chain_latency + (
+            n_rounds * self.get_local_time(child_size)
+        )
+
+        # Each child reads its two operands and writes its result. In in-place
+        # mode the result goes straight into its tile of the result matrix,
+        # and each child in the second wave first pulls just that tile to add
+        # to it, so moves another child_bytes.
+        n_transfers = 3 * n_children
+        if in_place:
+            n_transfers += n_children // 2
+
+        return (n_waves * wave_time) + self.get_transfer_time(
+            n_transfers * child_bytes
+        )
+
+    def should_chain(self, conf, split_level, n_children):
+        size = conf.get_submatrix_size(split_level)
+        chained_time = self.get_chained_time(
+            size, n_children, conf.element_size, conf.in_place
+        )
+
+        # Doing it locally still means reading both operands
+        local_time = self.get_local_time(size) + self.get_transfer_time(
+            2 * size * size * conf.element_size
+        )
+        return chained_time < local_time
+
+    def to_list(self):
+        return [
+            self.chain_latency,
+            self.flop_rate,
+            self.state_bandwidth,
+            self.max_parallel,
+        ]
+
+
+def get_dtype_name(dtype):
+    # Accepts names, numpy types or numpy dtypes without needing numpy here
+    name = (
+        getattr(dtype, "__name__", None)
+        or getattr(dtype, "name", None)
+        or str(dtype)
+    )
+    if name not in MATRIX_DTYPE_SIZES:
+        raise ValueError(
+            "Unsupported matrix dtype {} (must be one of {})".format(
+                dtype, MATRIX_DTYPES
+            )
+        )
+
+    return name
+
 
 class MatrixConf(object):
-    def __init__(self, matrix_size, n_splits):
+
+    def __init__(
+        self,
+        matrix_size,
+        n_splits,
+        strassen_levels=0,
+        in_place=False,
+        tiled=False,
+        cost_model=None,
+        dtype="float32",
+        accumulate_dtype=None,
+        sparse=False,
+    ):
+        if strassen_levels > n_splits:
+            raise ValueError(
+                "Can't have more Strassen levels ({}) than splits ({})".format(
+                    strassen_levels, n_splits
+                )
+            )
+
+        if in_place and strassen_levels > 0:
+            raise ValueError("In-place mode not supported with Strassen")
+
         self.matrix_size = matrix_size
         self.n_splits = n_splits
-        self.bytes_per_matrix = (matrix_size * matrix_size) * NP_ELEMENT_SIZE
+        self.strassen_levels = strassen_levels
+        self.in_place = bool(in_place)
+        self.tiled = bool(tiled)
+        self.cost_model = cost_model
+        self.sparse = bool(sparse)
+
+        self.dtype = get_dtype_name(dtype)
+        self.accumulate_dtype = get_dtype_name(accumulate_dtype or dtype)
+        self.element_size = MATRIX_DTYPE_SIZES[self.dtype]
+
+        self.bytes_per_matrix = (matrix_size * matrix_size) * self.element_size
+
+    def get_in_place_result_key(self):
+        # Key of the matrix that in-place mode adds partial sums to
+        if self.accumulate_dtype == self.dtype:
+            return RESULT_MATRIX_KEY
+
+        return RESULT_ACCUMULATE_KEY
 
     def get_submatrices_per_row(self, split_level):
         return 2 ** split_level
@@ -26,13 +211,60 @@ class MatrixConf(object):
 
     def get_bytes_per_submatrix(self, split_level):
         sm_size = self.get_submatrix_size(split_level)
-        return sm_size * sm_size * NP_ELEMENT_SIZE
+        return sm_size * sm_size * self.element_size
+
+    def get_tile_offset(self, row_idx, col_idx, sm_per_row):
+        # Offset of the given submatrix in the tiled layout
+        return (
+            (row_idx * sm_per_row) + col_idx
+        ) * self.get_bytes_per_submatrix(self.n_splits)
+
+    def get_tile_range(self, row_idx, col_idx, sm_per_row, n_submatrices=1):
+        # Offset and length of adjacent submatrices in a row of the tiled
+        # layout
+        sm_bytes = self.get_bytes_per_submatrix(self.n_splits)
+        return (
+            self.get_tile_offset(row_idx, col_idx, sm_per_row),
+            n_submatrices * sm_bytes,
+        )
+
+    def get_operand_bytes(self, sm_per_row):
+        # Size of an input with the given number of submatrices in each row
+        return (
+            sm_per_row
+            * sm_per_row
+            * self.get_bytes_per_submatrix(self.n_splits)
+        )
 
-    def get_intermediate_result_key(self, split_level, row_a, col_a, row_b, col_b):
+    def get_operand_submatrices_per_row(self, node_id):
+        # Each generation of Strassen nodes halves the size of the operands
+        operand_split_level = 0
+        while node_id > 0:
+            node_id //= 8
+            operand_split_level += 1
+
+        return 2 ** (self.n_splits - operand_split_level)
+
+    def get_intermediate_result_key(
+        self, split_level, row_a, col_a, row_b, col_b, node_id=0
+    ):
         key = "intermediate_{}_{}_{}_{}_{}".format(split_level, row_a, col_a, row_b, col_b)
+
+        # Multiplications under a Strassen node need to be kept separate
+        if node_id > 0:
+            key = "{}_{}".format(key, node_id)
+
         return key
 
+    def get_operand_key_prefix(self, key_prefix, node_id):
+        if node_id == 0:
+            return key_prefix
+
+        return "{}_{}_{}".format(STRASSEN_OPERAND_PREFIX, key_prefix, node_id)
+
+    def get_occupancy_key(self, key_prefix):
+        return "{}_{}".format(key_prefix, OCCUPANCY_KEY_SUFFIX)
+
     def get_submatrix_key(self, key_prefix, split_level, row_idx, col_idx):
         full_key = "{}_{}_{}_{}".format(key_prefix, split_level, row_idx, col_idx)
         return full_key
-
@@ -1,25 +1,417 @@
 import os
+from time import perf_counter
 
-import pyfaasm.cfaasm as cf
+from pyfaasm.backend import NativeBackend, LocalBackend
+
+# Note - modules for optional features (caching, buffering, instrumentation,
+# memoisation and local pools) are only imported when the feature is used, to
+# keep cold starts fast.
 
 PYTHON_LOCAL_CHAINING = bool(os.environ.get("PYTHON_LOCAL_CHAINING"))
+PYTHON_LOCAL_CHAINING_POOL = os.environ.get("PYTHON_LOCAL_CHAINING_POOL")
+PYTHON_LOCAL_CHAINING_WORKERS = int(os.environ.get("PYTHON_LOCAL_CHAINING_WORKERS", 0)) or None
 PYTHON_LOCAL_OUTPUT = bool(os.environ.get("PYTHON_LOCAL_OUTPUT"))
+PYTHON_LOCAL_STATE = bool(os.environ.get("PYTHON_LOCAL_STATE"))
+PYTHON_STATE_CACHE_BYTES = int(os.environ.get("PYTHON_STATE_CACHE_BYTES", 0))
+PYTHON_INSTRUMENTATION = bool(os.environ.get("PYTHON_INSTRUMENTATION"))
 
 input_data = None
 output_data = None
 
+backend = None
+local_executor = None
+state_cache = None
+write_buffer = None
+compression = None
+call_stats = None
+call_memo = None
+
+
+def get_backend():
+    if backend is None:
+        set_backend(LocalBackend() if PYTHON_LOCAL_STATE else NativeBackend())
+
+        if PYTHON_INSTRUMENTATION:
+            enable_instrumentation()
+
+    return backend
+
+
+def set_backend(value):
+    global backend
+    if call_stats is not None:
+        from pyfaasm.stats import InstrumentedBackend
+
+        if not isinstance(value, InstrumentedBackend):
+            value = InstrumentedBackend(value, call_stats)
+
+    backend = value
+
+
+def enable_instrumentation():
+    """
+    Records count, bytes moved and latency for every call that goes through to
+    the host, along with totals for each state key. Calls served by the state
+    cache or held in the write buffer don't reach the host, so aren't recorded.
+    When disabled, calls go straight to the backend.
+    """
+    from pyfaasm.stats import CallStats
+
+    global call_stats
+    if call_stats is None:
+        call_stats = CallStats()
+        set_backend(get_backend())
+
+
+def disable_instrumentation():
+    global backend, call_stats
+    if call_stats is not None:
+        # The backend is always wrapped while instrumentation is enabled
+        backend = backend.backend
+
+    call_stats = None
+
+
+def get_instrumentation_stats():
+    return None if call_stats is None else call_stats.snapshot()
+
+
+def export_instrumentation(file_path=None, as_output=False):
+    """
+    Returns the instrumentation stats as JSON, optionally writing them to the
+    given file and/ or setting them as the function output
+    """
+    if call_stats is None:
+        raise RuntimeError("Instrumentation is not enabled")
+
+    stats_json = call_stats.to_json()
+
+    if file_path:
+        with open(file_path, "w") as fh:
+            fh.write(stats_json)
+
+    if as_output:
+        set_output(stats_json.encode("utf-8"))
+
+    return stats_json
+
+
+def _record_local(op, n_bytes, start):
+    # Records calls handled locally rather than by the backend
+    if call_stats is not None:
+        call_stats.record(op, [], n_bytes, perf_counter() - start)
+
 
 def set_local_chaining(value):
     global PYTHON_LOCAL_CHAINING
     PYTHON_LOCAL_CHAINING = value
 
 
+def get_local_executor():
+    global local_executor
+    if local_executor is None and PYTHON_LOCAL_CHAINING_POOL:
+        from pyfaasm.executor import LocalExecutor
+
+        local_executor = LocalExecutor(PYTHON_LOCAL_CHAINING_POOL, PYTHON_LOCAL_CHAINING_WORKERS)
+
+    return local_executor
+
+
+def set_local_chaining_pool(pool_type, max_workers=None):
+    """
+    Sets the type of pool ("thread" or "process") used to run locally chained
+    calls concurrently. Passing None runs them synchronously.
+    """
+    global local_executor, PYTHON_LOCAL_CHAINING_POOL, PYTHON_LOCAL_CHAINING_WORKERS
+    if local_executor is not None:
+        local_executor.shutdown()
+        local_executor = None
+
+    PYTHON_LOCAL_CHAINING_POOL = pool_type
+    PYTHON_LOCAL_CHAINING_WORKERS = max_workers
+
+
+def enable_state_cache(max_bytes):
+    """
+    Caches state values read with get_state and friends, up to the given number
+    of bytes. This is only safe for values that aren't changed elsewhere (e.g.
+    read-only inputs), unless the cache is invalidated. Writes through this
+    module invalidate the relevant key, but writes through state views do not.
+    Pulls always go through to the host and invalidate the pulled keys, so
+    pulling is how to pick up changes made elsewhere.
+    """
+    from pyfaasm.cache import StateCache
+
+    global state_cache
+    state_cache = StateCache(max_bytes)
+
+
+def disable_state_cache():
+    global state_cache
+    state_cache = None
+
+
+def invalidate_state_cache(key=None):
+    """
+    Invalidates the given key in the state cache, or everything if no key given
+    """
+    if state_cache is not None:
+        state_cache.invalidate(key)
+
+
+def get_state_cache_stats():
+    return None if state_cache is None else state_cache.get_stats()
+
+
+if PYTHON_STATE_CACHE_BYTES > 0:
+    enable_state_cache(PYTHON_STATE_CACHE_BYTES)
+
+
+def set_state_compression(key, codec="zlib", level=None, min_size=1024, prefix=False):
+    """
+    Compresses state values written to the given key (or all keys with the
+    given prefix) with a standard library codec (zlib, bz2 or lzma). Values
+    smaller than min_size are stored uncompressed. Compressed values carry a
+    header, so readers only need the policy to be set, not the same codec.
+
+    Compressed values can only be read and written whole, or read at an offset
+    (which decompresses the whole value), not written at an offset or viewed.
+    """
+    from pyfaasm.compression import StateCompression
+
+    global compression
+    if compression is None:
+        compression = StateCompression()
+
+    compression.enabled = True
+    compression.set_policy(key, codec=codec, level=level, min_size=min_size, prefix=prefix)
+
+
+def disable_state_compression():
+    """
+    Stops compressing values written to state. Policies are kept so that values
+    already stored compressed can still be read, which means their keys can
+    still only be written whole.
+    """
+    if compression is not None:
+        compression.enabled = False
+
+
+def remove_state_compression(key=None, prefix=False):
+    """
+    Removes the policy for the given key or prefix, or all policies if no key
+    is given. Values still stored compressed under those keys will then be read
+    with their compression header.
+    """
+    global compression
+    if compression is None:
+        return
+
+    if key is None:
+        compression = None
+    else:
+        compression.remove_policy(key, prefix=prefix)
+
+
+def is_state_compressed(key):
+    """
+    Whether the given key has a compression policy, i.e. can't be viewed or
+    written at an offset
+    """
+    return _is_compressed(key)
+
+
+def get_state_compression_stats():
+    return None if compression is None else compression.get_stats()
+
+
+def enable_call_memoisation(max_entries=1024):
+    """
+    Memoises chained calls to functions registered with set_call_memoisation,
+    keeping up to max_entries completed calls. Replaces any existing table.
+    """
+    from pyfaasm.memo import CallMemo
+
+    global call_memo
+    call_memo = CallMemo(max_entries)
+
+
+def set_call_memoisation(func, state_keys=None, result_keys=None):
+    """
+    Memoises chained calls to the given function. A call with the same input
+    as a completed one, while the given state keys hold the same values, isn't
+    chained again, as long as its result keys are unchanged since. The function
+    must be deterministic and only depend on its input and these keys.
+
+    Keys can be a list, or a function of the call's input returning a list.
+    If state_keys returns None that call isn't memoised. Values are compared
+    through their digests in this process, so for keys written on other hosts
+    they must have been pulled.
+    """
+    if call_memo is None:
+        enable_call_memoisation()
+
+    call_memo.set_policy(func, state_keys, result_keys)
+
+
+def remove_call_memoisation(func):
+    if call_memo is not None:
+        call_memo.remove_policy(func)
+
+
+def disable_call_memoisation():
+    global call_memo
+    call_memo = None
+
+
+def get_call_memoisation_stats():
+    return None if call_memo is None else call_memo.get_stats()
+
+
+def _get_state_digest_reader():
+    # Returns a function giving the digest of a state value, which only reads
+    # each key once, so should only be used while the state isn't changing
+    from pyfaasm.memo import get_digest
+
+    digests = dict()
+
+    def _read_digest(key):
+        digest = digests.get(key)
+        if digest is None:
+            _flush_pending(key)
+            state_len = get_backend().get_state_size(key)
+            value = get_backend().get_state_view(key, state_len) if state_len > 0 else b""
+            digest = digests[key] = get_digest(value)
+
+        return digest
+
+    return _read_digest
+
+
+def _is_compressed(key):
+    return compression is not None and compression.is_compressed(key)
+
+
+def _check_not_compressed(key, action="written at an offset"):
+    if _is_compressed(key):
+        raise ValueError("State {} is compressed so can't be {}".format(key, action))
+
+
+def _read_compressed(key, state_len):
+    # The stored value has a different length to the original, so read
+    # whatever is there and decompress it
+    stored_len = get_backend().get_state_size(key)
+    value = None
+    if stored_len > 0:
+        value = compression.decompress(get_backend().get_state(key, stored_len))
+
+    if value is None:
+        # Not written compressed, e.g. before the policy was set
+        return get_backend().get_state(key, state_len)
+
+    if len(value) < state_len:
+        raise ValueError("State {} is {} bytes, not {}".format(key, len(value), state_len))
+
+    return value[:state_len] if len(value) > state_len else value
+
+
+def _get_pull_len(key, state_len):
+    if not _is_compressed(key):
+        return state_len
+
+    stored_len = get_backend().get_state_size(key)
+    return stored_len if stored_len > 0 else state_len
+
+
+def _read_state(key, state_len):
+    if _is_compressed(key):
+        return _read_compressed(key, state_len)
+
+    return get_backend().get_state(key, state_len)
+
+
+def _read_state_offset(key, total_len, offset, offset_len):
+    if _is_compressed(key):
+        return _read_compressed(key, total_len)[offset:offset + offset_len]
+
+    return get_backend().get_state_offset(key, total_len, offset, offset_len)
+
+
+def _read_state_many(key_lens):
+    if compression is None:
+        return get_backend().get_state_many(key_lens)
+
+    # Read all the uncompressed values in one go
+    values = [None] * len(key_lens)
+    uncompressed = [i for i, (key, _) in enumerate(key_lens) if not compression.is_compressed(key)]
+    fetched = get_backend().get_state_many([key_lens[i] for i in uncompressed]) if uncompressed else []
+    for i, value in zip(uncompressed, fetched):
+        values[i] = value
+
+    for i, (key, state_len) in enumerate(key_lens):
+        if values[i] is None:
+            values[i] = _read_compressed(key, state_len)
+
+    return values
+
+
+def _read_state_offset_many(key, total_len, ranges):
+    if _is_compressed(key):
+        value = _read_compressed(key, total_len)
+        return [value[offset:offset + offset_len] for offset, offset_len in ranges]
+
+    return get_backend().get_state_offset_many(key, total_len, ranges)
+
+
+def set_write_buffering(value):
+    """
+    When write buffering is on, offset writes are held in memory until the key
+    is pushed, read or explicitly flushed. Adjacent and overlapping writes are
+    then merged, so the host gets as few writes as possible.
+    """
+    global write_buffer
+    if value and write_buffer is None:
+        from pyfaasm.buffering import WriteBuffer
+
+        write_buffer = WriteBuffer()
+    elif not value and write_buffer is not None:
+        flush_state()
+        write_buffer = None
+
+
+def flush_state(key=None):
+    """
+    Sends any buffered writes for the given key (or all keys) to the host
+    """
+    if write_buffer is None:
+        return
+
+    keys = [key] if key is not None else write_buffer.get_pending_keys()
+    for k in keys:
+        pending = write_buffer.take(k)
+        if pending is not None:
+            total_len, writes = pending
+            get_backend().set_state_offset_many(k, total_len, writes)
+
+
+def get_write_buffer_stats():
+    return None if write_buffer is None else write_buffer.get_stats()
+
+
+def _flush_pending(key):
+    # Make sure buffered writes are sent before anything else touches the key
+    if write_buffer is not None and write_buffer.has_pending(key):
+        flush_state(key)
+
+
 def set_local_input_output(value):
     global PYTHON_LOCAL_OUTPUT
     PYTHON_LOCAL_OUTPUT = value
 
 
 def check_python_bindings():
+    import pyfaasm.cfaasm as cf
+
     # This should return a valid string
     message = cf.hello_faasm()
     print(message)
@@ -34,15 +426,53 @@ def check_python_bindings():
 
 
 def get_input():
-    return cf.faasm_get_input()
+    return get_backend().get_input()
+
+
+def get_input_size():
+    return get_backend().get_input_size()
+
+
+def read_input_into(buffer):
+    """
+    Reads the whole input into the given writable buffer (e.g. a bytearray or
+    numpy array), returning the input size. This avoids creating an
+    intermediate bytes object for large inputs.
+    """
+    return get_backend().read_input_into(buffer)
+
+
+def get_input_stream():
+    """
+    Returns a file-like, readinto-capable stream over the function input
+    """
+    from pyfaasm.streams import InputStream
+
+    return InputStream(get_input())
+
+
+def get_output_writer(size=None):
+    """
+    Returns a file-like writer for building up the function output in chunks.
+    The output is set when the writer is closed (e.g. at the end of a with
+    block). Passing the total size, if known, avoids resizing the buffer.
+    """
+    from pyfaasm.streams import OutputWriter
+
+    return OutputWriter(set_output, size)
 
 
 def set_output(output):
     if PYTHON_LOCAL_OUTPUT:
+        start = perf_counter()
+
+        # Output may be any buffer, but we always hand back bytes
         global output_data
-        output_data = output
+        output_data = bytes(output)
+
+        _record_local("set_output", len(output_data), start)
     else:
-        cf.faasm_set_output(output)
+        get_backend().set_output(output)
 
 
 def get_output():
@@ -54,55 +484,343 @@ def get_output():
 
 
 def get_state_size(key):
-    return cf.faasm_get_state_size(key)
+    _flush_pending(key)
+    return get_backend().get_state_size(key)
 
 
 def get_state(key, len):
-    return cf.faasm_get_state(key, len)
+    _flush_pending(key)
+    if state_cache is None:
+        return _read_state(key, len)
+
+    value = state_cache.get(key, None, len)
+    if value is None:
+        value = _read_state(key, len)
+        state_cache.put(key, None, len, value)
+
+    return value
 
 
 def get_state_offset(key, total_len, offset, offset_len):
-    return cf.faasm_get_state_offset(key, total_len, offset, offset_len)
+    _flush_pending(key)
+    if state_cache is None:
+        return _read_state_offset(key, total_len, offset, offset_len)
+
+    value = state_cache.get(key, offset, offset_len)
+    if value is None:
+        value = _read_state_offset(key, total_len, offset, offset_len)
+        state_cache.put(key, offset, offset_len, value)
+
+    return value
+
+
+# The view functions return a memoryview directly over the state memory rather
+# than a copy, so e.g. np.frombuffer can sit on top of the state value.
+# Writing to the view modifies the local copy of the state.
+def get_state_view(key, len):
+    _check_not_compressed(key, "viewed")
+    _flush_pending(key)
+    return get_backend().get_state_view(key, len)
+
+
+def get_state_offset_view(key, total_len, offset, offset_len):
+    _check_not_compressed(key, "viewed")
+    _flush_pending(key)
+    return get_backend().get_state_offset_view(key, total_len, offset, offset_len)
 
 
 def set_state(key, value):
-    cf.faasm_set_state(key, value)
+    invalidate_state_cache(key)
+
+    # Any buffered writes are overwritten by this one
+    if write_buffer is not None:
+        write_buffer.discard(key)
+
+    if _is_compressed(key):
+        value = compression.compress(key, value)
+
+    get_backend().set_state(key, value)
 
 
 def set_state_offset(key, total_len, offset, value):
-    cf.faasm_set_state_offset(key, total_len, offset, value)
+    _check_not_compressed(key)
+    invalidate_state_cache(key)
+
+    if write_buffer is not None:
+        write_buffer.add(key, total_len, offset, value)
+    else:
+        get_backend().set_state_offset(key, total_len, offset, value)
 
 
 def push_state(key):
-    cf.faasm_push_state(key)
+    _flush_pending(key)
+    get_backend().push_state(key)
 
 
 def push_state_partial(key):
-    cf.faasm_push_state_partial(key)
+    _flush_pending(key)
+    get_backend().push_state_partial(key)
 
 
 def pull_state(key, state_len):
-    cf.faasm_pull_state(key, state_len)
+    _flush_pending(key)
+    state_len = _get_pull_len(key, state_len)
+    get_backend().pull_state(key, state_len)
+    invalidate_state_cache(key)
+
+
+def pull_state_offset(key, total_len, offset, offset_len):
+    """
+    Pulls just the given range of a state value, rather than all of it
+    """
+    _check_not_compressed(key, "pulled at an offset")
+    _flush_pending(key)
+    get_backend().pull_state_offset(key, total_len, offset, offset_len)
+    invalidate_state_cache(key)
+
+
+# The batched functions below each make a single call through to the host for
+# many keys (or many ranges of the same key).
+#  - key_lens is a list of (key, state_len)
+#  - items is a list of (key, value)
+#  - ranges is a list of (offset, offset_len)
+#  - writes is a list of (offset, value)
+def get_state_many(key_lens):
+    for key, _ in key_lens:
+        _flush_pending(key)
+
+    if state_cache is None:
+        return _read_state_many(key_lens)
+
+    values = [state_cache.get(key, None, state_len) for key, state_len in key_lens]
+
+    # Fetch all the misses in one go
+    missing = [i for i, value in enumerate(values) if value is None]
+    if missing:
+        fetched = _read_state_many([key_lens[i] for i in missing])
+        for i, value in zip(missing, fetched):
+            key, state_len = key_lens[i]
+            state_cache.put(key, None, state_len, value)
+            values[i] = value
+
+    return values
+
+
+def get_state_offset_many(key, total_len, ranges):
+    _flush_pending(key)
+    if state_cache is None:
+        return _read_state_offset_many(key, total_len, ranges)
+
+    values = [state_cache.get(key, offset, offset_len) for offset, offset_len in ranges]
+
+    # Fetch all the misses in one go
+    missing = [i for i, value in enumerate(values) if value is None]
+    if missing:
+        fetched = _read_state_offset_many(key, total_len, [ranges[i] for i in missing])
+        for i, value in zip(missing, fetched):
+            offset, offset_len = ranges[i]
+            state_cache.put(key, offset, offset_len, value)
+            values[i] = value
+
+    return values
+
+
+def set_state_many(items):
+    for key, _ in items:
+        invalidate_state_cache(key)
+        if write_buffer is not None:
+            write_buffer.discard(key)
+
+    if compression is not None:
+        items = [
+            (key, compression.compress(key, value) if compression.is_compressed(key) else value)
+            for key, value in items
+        ]
+
+    get_backend().set_state_many(items)
+
+
+def set_state_offset_many(key, total_len, writes):
+    _check_not_compressed(key)
+    invalidate_state_cache(key)
+
+    if write_buffer is not None:
+        for offset, value in writes:
+            write_buffer.add(key, total_len, offset, value)
+    else:
+        get_backend().set_state_offset_many(key, total_len, writes)
+
+
+def push_state_many(keys):
+    for key in keys:
+        _flush_pending(key)
+
+    get_backend().push_state_many(keys)
+
+
+def pull_state_many(key_lens):
+    for key, _ in key_lens:
+        _flush_pending(key)
+
+    key_lens = [(key, _get_pull_len(key, state_len)) for key, state_len in key_lens]
+    get_backend().pull_state_many(key_lens)
+
+    for key, _ in key_lens:
+        invalidate_state_cache(key)
+
+
+def pull_state_offset_many(key, total_len, ranges):
+    _check_not_compressed(key, "pulled at an offset")
+    _flush_pending(key)
+    get_backend().pull_state_offset_many(key, total_len, ranges)
+    invalidate_state_cache(key)
 
 
 def chain_this_with_input(func, chained_input_data):
+    if call_memo is not None and call_memo.has_policy(func):
+        return _chain_memoised(func, [chained_input_data])[0]
+
+    return _chain_call(func, chained_input_data)
+
+
+def _chain_call(func, chained_input_data):
     if PYTHON_LOCAL_CHAINING:
-        # Run function directly
-        func(chained_input_data)
-        return 0
+        start = perf_counter()
+        executor = get_local_executor()
+        if executor is not None:
+            call_id = executor.chain_call(func, chained_input_data)
+        else:
+            # Run function directly. Its run time is left out of the chain
+            # time, as its own calls are recorded as it runs.
+            func_start = perf_counter()
+            func(chained_input_data)
+            start += perf_counter() - func_start
+            call_id = 0
+
+        _record_local("chain_call", memoryview(chained_input_data).nbytes, start)
+        return call_id
     else:
-        # Call native
-        func_name = func.__name__
-        return cf.faasm_chain_py(func_name, chained_input_data)
+        return get_backend().chain_call(func, chained_input_data)
 
 
 def await_call(call_id):
+    if call_memo is None:
+        return _await_call(call_id)
+
+    status = _pop_memoised(call_id)
+    if status is not None:
+        return status
+
+    result = _await_call(call_id)
+    _complete_memoised(call_id, result)
+    return result
+
+
+def _pop_memoised(call_id):
+    # Returns the status of a call short-circuited by memoisation, or None
+    return None if call_memo is None else call_memo.pop_memoised(call_id)
+
+
+def _complete_memoised(call_id, result):
+    # Records an awaited call for memoisation, if it was chained with a policy
+    if call_memo is not None:
+        call_memo.complete(call_id, result, _get_state_digest_reader())
+
+
+def _await_call(call_id):
+    if PYTHON_LOCAL_CHAINING:
+        start = perf_counter()
+        executor = get_local_executor()
+        if executor is not None and call_id > 0:
+            result = executor.await_call(call_id)
+        else:
+            # Calls are run immediately
+            result = 0
+
+        _record_local("await_call", 0, start)
+        return result
+    else:
+        return get_backend().await_call(call_id)
+
+
+def chain_many(func, inputs):
+    """
+    Chains a call to the given function for each of the inputs, returning the
+    call IDs. Outside local chaining the whole batch goes to the host at once.
+    """
+    if call_memo is not None and call_memo.has_policy(func):
+        return _chain_memoised(func, inputs)
+
+    return _chain_many(func, inputs)
+
+
+def _chain_many(func, inputs):
+    if PYTHON_LOCAL_CHAINING:
+        return [_chain_call(func, input_data) for input_data in inputs]
+    else:
+        return get_backend().chain_call_many(func, inputs)
+
+
+def _chain_memoised(func, inputs):
+    # Only chains the calls that don't match a completed one, the rest get
+    # memoised call IDs. State digests are shared by the whole batch.
+    read_digest = _get_state_digest_reader()
+
+    call_ids = list()
+    to_chain = list()
+    for i, input_data in enumerate(inputs):
+        call = call_memo.get_call(func, input_data, read_digest)
+        call_id = None if call is None else call_memo.lookup(call, read_digest)
+
+        call_ids.append(call_id)
+        if call_id is None:
+            to_chain.append((i, call))
+
+    if not to_chain:
+        return call_ids
+
+    chained_ids = _chain_many(func, [inputs[i] for i, _ in to_chain])
+    for (i, call), call_id in zip(to_chain, chained_ids):
+        call_ids[i] = call_id
+        if call is None:
+            continue
+
+        if PYTHON_LOCAL_CHAINING and call_id == 0:
+            # The call has already run, so can be recorded straight away
+            call_memo.record(call, 0, _get_state_digest_reader())
+        else:
+            call_memo.add_pending(call_id, call)
+
+    return call_ids
+
+
+def await_all(call_ids):
+    """
+    Waits for all the given calls, returning their return codes
+    """
+    if call_memo is None:
+        return _await_all(call_ids)
+
+    results = [call_memo.pop_memoised(call_id) for call_id in call_ids]
+    to_await = [i for i, result in enumerate(results) if result is None]
+    if not to_await:
+        return results
+
+    # Digests are read once all the calls have finished
+    awaited = _await_all([call_ids[i] for i in to_await])
+    read_digest = _get_state_digest_reader()
+    for i, result in zip(to_await, awaited):
+        results[i] = result
+        call_memo.complete(call_ids[i], result, read_digest)
+
+    return results
+
+
+def _await_all(call_ids):
     if PYTHON_LOCAL_CHAINING:
-        # Calls are run immediately
-        return 0
+        return [_await_call(call_id) for call_id in call_ids]
     else:
-        # Call native
-        return cf.faasm_await_call(call_id)
+        return get_backend().await_call_many(call_ids)
 
 
 def set_emulator_message(message_json):
@@ -110,12 +828,12 @@ def set_emulator_message(message_json):
         global output_data
         output_data = None
 
-    return cf.set_emulator_message(message_json)
+    return get_backend().set_emulator_message(message_json)
 
 
 def set_emulator_status(success):
-    cf.set_emulator_status(success)
+    get_backend().set_emulator_status(success)
 
 
 def get_emulator_async_response():
-    return cf.get_emulator_async_response()
+    return get_backend().get_emulator_async_response()
@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from itertools import count
+from threading import Lock
+
+POOL_TYPE_THREAD = "thread"
+POOL_TYPE_PROCESS = "process"
+
+
+def _run_chained(func, input_data):
+    # Chained functions can return a status code, None counts as success
+    result = func(input_data)
+    return 0 if result is None else int(result)
+
+
+def _init_worker_process():
+    # Chained calls made from a worker process run directly in that process,
+    # otherwise they could end up waiting on the pool that's running them. The
+    # pool type has to be cleared too, or the worker would create its own pool.
+    import pyfaasm.core as core
+    core.set_local_chaining(True)
+    core.local_executor = None
+    core.PYTHON_LOCAL_CHAINING_POOL = None
+
+
+class LocalExecutor(object):
+    """
+    Runs locally chained calls on a thread or process pool so that they
+    execute concurrently. Each call gets a real call ID which can be awaited.
+
+    Note that with a process pool, chained functions must be picklable
+    (i.e. defined at module level) and state is only shared between processes
+    if the backend shares it (i.e. not with the local backend).
+    """
+
+    def __init__(self, pool_type=POOL_TYPE_THREAD, max_workers=None):
+        if pool_type == POOL_TYPE_THREAD:
+            self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        elif pool_type == POOL_TYPE_PROCESS:
+            self.pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker_process)
+        else:
+            raise ValueError("Unrecognised pool type: {}".format(pool_type))
+
+        self.pool_type = pool_type
+        self.calls = dict()
+
+        self._call_ids = count(1)
+        self._lock = Lock()
+
+    def chain_call(self, func, input_data):
+        # Take a copy of the input as the caller may reuse its buffer
+        input_data = bytes(input_data)
+        future = self.pool.submit(_run_chained, func, input_data)
+
+        with self._lock:
+            call_id = next(self._call_ids)
+            self.calls[call_id] = (future, func, input_data)
+
+        return call_id
+
+    def pop_future(self, call_id):
+        with self._lock:
+            return self.calls.pop(call_id)[0]
+
+    def await_call(self, call_id):
+        with self._lock:
+            future, func, input_data = self.calls.pop(call_id)
+
+        # If the call hasn't started yet we run it here instead. Otherwise a
+        # chained call awaiting its own children could block waiting on a
+        # pool whose workers are all busy awaiting.
+        if future.cancel():
+            return _run_chained(func, input_data)
+
+        # Raises any exception from the chained call
+        return future.result()
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
@@ -0,0 +1,25 @@
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """
+    Returns the named module, deferring the actual import until one of its
+    attributes is first used. Modules that are already imported are returned
+    as they are.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError("No module named {}".format(name), name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    return module
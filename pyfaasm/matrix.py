@@ -1,153 +1,942 @@
-import numpy as np
-from numpy import int32
+from time import perf_counter
 
-from pyfaasm.config import MATRIX_CONF_STATE_KEY, SUBMATRICES_KEY_A, SUBMATRICES_KEY_B, MatrixConf, RESULT_MATRIX_KEY
-from pyfaasm.core import set_state, get_state, chain_this_with_input, await_call
-from pyfaasm.matrix_data import do_subdivide_matrix, do_reconstruct_matrix
+from pyfaasm.config import (
+    MATRIX_CONF_STATE_KEY,
+    MATRIX_COST_MODEL_STATE_KEY,
+    SUBMATRICES_KEY_A,
+    SUBMATRICES_KEY_B,
+    MATRIX_DTYPES,
+    MatrixConf,
+    MatrixCostModel,
+    RESULT_MATRIX_KEY,
+    get_dtype_name,
+)
+from pyfaasm.core import (
+    set_state,
+    get_state,
+    get_state_offset_view,
+    get_state_many,
+    set_state_many,
+    get_state_offset,
+    get_state_offset_many,
+    push_state,
+    push_state_many,
+    pull_state,
+    pull_state_many,
+    chain_many,
+    await_all,
+    set_call_memoisation,
+    is_state_compressed,
+)
+from pyfaasm.lazy import lazy_import
+from pyfaasm.matrix_data import (
+    do_reconstruct_matrix,
+    get_tile_major_view,
+    get_tile_occupancy,
+    open_tiled_matrix_file,
+)
+from pyfaasm.state_array import StateArray
 
+# Numpy is only imported when first used, to keep cold starts fast
+np = lazy_import("numpy")
 
-def write_matrix_params_to_state(matrix_size, n_splits):
-    params = np.array((matrix_size, n_splits), dtype=int32)
-    set_state(MATRIX_CONF_STATE_KEY, params.tobytes())
+N_MATRIX_PARAMS = 9
+N_COST_MODEL_PARAMS = 4
+
+
+def _get_matrix_params_array():
+    return StateArray(
+        MATRIX_CONF_STATE_KEY, (N_MATRIX_PARAMS,), dtype=np.int32
+    )
+
+
+def _get_cost_model_array():
+    return StateArray(
+        MATRIX_COST_MODEL_STATE_KEY, (N_COST_MODEL_PARAMS,), dtype=np.float64
+    )
+
+
+def write_matrix_params_to_state(
+    matrix_size,
+    n_splits,
+    strassen_levels=0,
+    in_place=False,
+    tiled=False,
+    cost_model=None,
+    dtype="float32",
+    accumulate_dtype=None,
+    sparse=False,
+):
+    has_cost_model = cost_model is not None
+    dtype_code = MATRIX_DTYPES.index(get_dtype_name(dtype))
+    accumulate_dtype_code = MATRIX_DTYPES.index(
+        get_dtype_name(accumulate_dtype or dtype)
+    )
+
+    _get_matrix_params_array().write(
+        (
+            matrix_size,
+            n_splits,
+            strassen_levels,
+            in_place,
+            tiled,
+            has_cost_model,
+            dtype_code,
+            accumulate_dtype_code,
+            sparse,
+        )
+    )
+
+    if has_cost_model:
+        _get_cost_model_array().write(cost_model.to_list())
 
 
 def load_matrix_conf_from_state():
-    # Params are ints so need to work out what size they are
-    dummy = np.array((1, 2), dtype=int32)
-    param_len = len(dummy.tobytes())
-    param_bytes = get_state(MATRIX_CONF_STATE_KEY, param_len)
-    params = np.frombuffer(param_bytes, dtype=int32)
+    # Convert to plain ints, so numpy ints don't leak into calculations
+    params = [int(p) for p in _get_matrix_params_array().read()]
 
     matrix_size = params[0]
     n_splits = params[1]
+    strassen_levels = params[2]
+    in_place = params[3]
+    tiled = params[4]
+    dtype = MATRIX_DTYPES[params[6]]
+    accumulate_dtype = MATRIX_DTYPES[params[7]]
+    sparse = params[8]
 
-    conf = MatrixConf(matrix_size, n_splits)
+    cost_model = None
+    if params[5]:
+        cost_model = MatrixCostModel(*_get_cost_model_array().read())
+
+    conf = MatrixConf(
+        matrix_size,
+        n_splits,
+        strassen_levels=strassen_levels,
+        in_place=in_place,
+        tiled=tiled,
+        cost_model=cost_model,
+        dtype=dtype,
+        accumulate_dtype=accumulate_dtype,
+        sparse=sparse,
+    )
 
     return conf
 
 
-def random_matrix(size):
-    return np.random.rand(size, size).astype(np.float32)
+def calibration_noop(input_bytes):
+    return 0
+
+
+def _min_time(current, start):
+    elapsed = perf_counter() - start
+    return elapsed if current is None else min(current, elapsed)
+
+
+def calibrate_cost_model(sample_size=256, n_samples=3, max_parallel=8):
+    """
+    Builds a cost model from measurements on this machine: the rate of a
+    local multiplication, the latency of chaining and awaiting a fan-out of
+    no-op calls, and the rate of writing and reading a value through state.
+    The fastest of n_samples is used for each.
+
+    Like distributed_divide_and_conquer, calibration_noop must be exposed by
+    the function's entry point so that it can be chained.
+    """
+    mat = random_matrix(sample_size)
+    sample_bytes = mat.nbytes
+    sample_key = "{}_sample".format(MATRIX_COST_MODEL_STATE_KEY)
+
+    dot_time = chain_time = state_time = None
+    for _ in range(n_samples):
+        start = perf_counter()
+        np.dot(mat, mat)
+        dot_time = _min_time(dot_time, start)
+
+        start = perf_counter()
+        await_all(chain_many(calibration_noop, [b""] * 8))
+        chain_time = _min_time(chain_time, start)
+
+        start = perf_counter()
+        set_state(sample_key, mat)
+        push_state(sample_key)
+        pull_state(sample_key, sample_bytes)
+        get_state(sample_key, sample_bytes)
+        state_time = _min_time(state_time, start)
+
+    flop_rate = (2 * sample_size**3) / max(dot_time, 1e-9)
+    state_bandwidth = (2 * sample_bytes) / max(state_time, 1e-9)
+
+    return MatrixCostModel(
+        chain_time,
+        flop_rate,
+        state_bandwidth=state_bandwidth,
+        max_parallel=max_parallel,
+    )
+
+
+def random_matrix(size, dtype="float32"):
+    return np.random.rand(size, size).astype(dtype)
+
+
+def _get_submatrix_key_lens(
+    conf, key_prefix, sm_per_row, occupancy=None, rows=None
+):
+    # Empty submatrices of sparse matrices are left out. Covers all rows of
+    # submatrices unless given a range of them.
+    sm_bytes = conf.get_bytes_per_submatrix(conf.n_splits)
+
+    key_lens = list()
+    for row_idx in rows or range(0, sm_per_row):
+        for col_idx in range(0, sm_per_row):
+            if occupancy is not None and not occupancy[row_idx, col_idx]:
+                continue
+
+            full_key = conf.get_submatrix_key(
+                key_prefix, conf.n_splits, row_idx, col_idx
+            )
+            key_lens.append((full_key, sm_bytes))
+
+    return key_lens
+
+
+def _get_occupancy_bytes(sm_per_row):
+    return -(-(sm_per_row * sm_per_row) // 8)
+
+
+# Writes the occupancy bitmap of a sparse matrix (see config)
+def write_occupancy(conf, key_prefix, occupancy):
+    set_state(
+        conf.get_occupancy_key(key_prefix), np.packbits(occupancy.ravel())
+    )
+
+
+# Reads the occupancy bitmap of a sparse matrix, returned as a boolean array
+# with shape (sm_per_row, sm_per_row)
+def read_occupancy(conf, key_prefix, sm_per_row=None):
+    sm_per_row = sm_per_row or conf.get_submatrices_per_row(conf.n_splits)
+    data = get_state(
+        conf.get_occupancy_key(key_prefix), _get_occupancy_bytes(sm_per_row)
+    )
+
+    bits = np.unpackbits(
+        np.frombuffer(data, dtype=np.uint8), count=sm_per_row * sm_per_row
+    )
+    return bits.astype(bool).reshape(sm_per_row, sm_per_row)
+
+
+# Returns the occupancy of both operands of the given node, or None if the
+# matrices aren't sparse
+def read_operand_occupancy(conf, node_id):
+    if not conf.sparse:
+        return None
+
+    sm_per_row = conf.get_operand_submatrices_per_row(node_id)
+    return (
+        read_occupancy(
+            conf,
+            conf.get_operand_key_prefix(SUBMATRICES_KEY_A, node_id),
+            sm_per_row,
+        ),
+        read_occupancy(
+            conf,
+            conf.get_operand_key_prefix(SUBMATRICES_KEY_B, node_id),
+            sm_per_row,
+        ),
+    )
+
+
+def _get_region_occupancy(conf, occupancy, split_level, row_idx, col_idx):
+    sm_per_region_row = 2 ** (conf.n_splits - split_level)
+    row_start = row_idx * sm_per_region_row
+    col_start = col_idx * sm_per_region_row
+    return occupancy[
+        row_start : row_start + sm_per_region_row,
+        col_start : col_start + sm_per_region_row,
+    ]
+
+
+def is_region_empty(conf, occupancy, split_level, row_idx, col_idx):
+    return not _get_region_occupancy(
+        conf, occupancy, split_level, row_idx, col_idx
+    ).any()
+
+
+def _is_product_empty(conf, occupancy, split_level, submatrix_a, submatrix_b):
+    # Multiplications with an empty operand are zero
+    if occupancy is None:
+        return False
+
+    occupancy_a, occupancy_b = occupancy
+    return is_region_empty(
+        conf, occupancy_a, split_level, *submatrix_a
+    ) or is_region_empty(conf, occupancy_b, split_level, *submatrix_b)
 
 
 # Split up the original matrix into square submatrices and write to state
 def subdivide_matrix_into_state(conf, mat, key_prefix):
-    def _write_submatrix_to_state(sm_bytes, row_idx, col_idx):
-        full_key = conf.get_submatrix_key(key_prefix, conf.n_splits, row_idx, col_idx)
-        set_state(full_key, sm_bytes)
+    write_input_region(conf, key_prefix, mat)
 
-    do_subdivide_matrix(conf, mat, _write_submatrix_to_state)
 
+# Loads a matrix from a tiled file (see matrix_data) straight into state
+def load_tiled_file_into_state(conf, file_path, key_prefix):
+    tiled_file = open_tiled_matrix_file(file_path)
+    if (
+        tiled_file.matrix_size != conf.matrix_size
+        or tiled_file.n_splits != conf.n_splits
+    ):
+        raise ValueError(
+            "Tiled file {} does not match matrix conf".format(file_path)
+        )
+
+    occupancy = None
+    if conf.sparse:
+        occupancy = tiled_file.tiles.any(axis=(1, 2)).reshape(
+            tiled_file.sm_per_row, tiled_file.sm_per_row
+        )
+        write_occupancy(conf, key_prefix, occupancy)
+
+    if conf.tiled:
+        # Layout in the file is the same as in state
+        set_state(key_prefix, tiled_file.tiles.astype(conf.dtype, copy=False))
+        return
+
+    items = list()
+    for row_idx in range(0, tiled_file.sm_per_row):
+        for col_idx in range(0, tiled_file.sm_per_row):
+            if occupancy is not None and not occupancy[row_idx, col_idx]:
+                continue
+
+            full_key = conf.get_submatrix_key(
+                key_prefix, conf.n_splits, row_idx, col_idx
+            )
+            items.append(
+                (
+                    full_key,
+                    tiled_file.get_submatrix(row_idx, col_idx).astype(
+                        conf.dtype, copy=False
+                    ),
+                )
+            )
+
+    set_state_many(items)
+
+
+# Pulls or pushes a whole input matrix, in one call for the tiled layout. For
+# sparse matrices this includes the occupancy bitmap, but not empty
+# submatrices.
+def pull_input_matrix(conf, key_prefix):
+    sm_per_row = conf.get_submatrices_per_row(conf.n_splits)
+
+    occupancy = None
+    if conf.sparse:
+        pull_state(
+            conf.get_occupancy_key(key_prefix),
+            _get_occupancy_bytes(sm_per_row),
+        )
+        occupancy = read_occupancy(conf, key_prefix, sm_per_row)
+
+    if conf.tiled:
+        pull_state(key_prefix, conf.bytes_per_matrix)
+    else:
+        pull_state_many(
+            _get_submatrix_key_lens(conf, key_prefix, sm_per_row, occupancy)
+        )
+
+
+def push_input_matrix(conf, key_prefix):
+    sm_per_row = conf.get_submatrices_per_row(conf.n_splits)
+
+    keys = list()
+    occupancy = None
+    if conf.sparse:
+        keys.append(conf.get_occupancy_key(key_prefix))
+        occupancy = read_occupancy(conf, key_prefix, sm_per_row)
+
+    if conf.tiled:
+        keys.append(key_prefix)
+    else:
+        keys += [
+            key
+            for key, _ in _get_submatrix_key_lens(
+                conf, key_prefix, sm_per_row, occupancy
+            )
+        ]
+
+    push_state_many(keys)
+
+
+# Reads a given submatrix from the input. sm_per_row is only needed for inputs
+# smaller than the original matrices, i.e. Strassen operands.
+def read_input_submatrix(conf, key_prefix, row_idx, col_idx, sm_per_row=None):
+    if conf.tiled:
+        return read_input_submatrices(
+            conf, key_prefix, row_idx, col_idx, 1, sm_per_row
+        )[0]
 
-# Reads a given submatrix from the input
-def read_input_submatrix(conf, key_prefix, row_idx, col_idx):
-    sm_bytes = conf.get_bytes_per_submatrix(conf.n_splits)
     sm_size = conf.get_submatrix_size(conf.n_splits)
-    full_key = conf.get_submatrix_key(key_prefix, conf.n_splits, row_idx, col_idx)
+    full_key = conf.get_submatrix_key(
+        key_prefix, conf.n_splits, row_idx, col_idx
+    )
+
+    # Compressed values can't be viewed, so have to be copied
+    if is_state_compressed(full_key):
+        sm_data = get_state(
+            full_key, conf.get_bytes_per_submatrix(conf.n_splits)
+        )
+        return np.frombuffer(sm_data, dtype=conf.dtype).reshape(
+            sm_size, sm_size
+        )
+
+    # Avoid copying the submatrix out of state
+    return StateArray(full_key, (sm_size, sm_size), dtype=conf.dtype).array
+
+
+# Reads a number of adjacent submatrices from a row of the input, returned with
+# shape (n_submatrices, sm_size, sm_size). With the tiled layout this is a
+# single read of a contiguous range.
+def read_input_submatrices(
+    conf, key_prefix, row_idx, col_idx, n_submatrices, sm_per_row=None
+):
+    sm_per_row = sm_per_row or conf.get_submatrices_per_row(conf.n_splits)
+
+    if conf.tiled:
+        offset, length = conf.get_tile_range(
+            row_idx, col_idx, sm_per_row, n_submatrices
+        )
+        read_func = (
+            get_state_offset
+            if is_state_compressed(key_prefix)
+            else get_state_offset_view
+        )
+        data = read_func(
+            key_prefix, conf.get_operand_bytes(sm_per_row), offset, length
+        )
+        return _submatrices_from_bytes(
+            conf, data, conf.n_splits, n_submatrices
+        )
+
+    keys = [
+        conf.get_submatrix_key(key_prefix, conf.n_splits, row_idx, sm_col)
+        for sm_col in range(col_idx, col_idx + n_submatrices)
+    ]
+    return np.stack(_read_submatrices(conf, keys, conf.n_splits))
+
+
+def _submatrices_from_bytes(conf, data, split_level, n_submatrices=None):
+    # Array over submatrices at the given split level, one after the other
+    sm_size = conf.get_submatrix_size(split_level)
+    shape = (
+        (sm_size, sm_size)
+        if n_submatrices is None
+        else (n_submatrices, sm_size, sm_size)
+    )
+    return np.frombuffer(data, dtype=conf.dtype).reshape(shape)
+
+
+def _read_submatrices(conf, keys, split_level):
+    # Reads the submatrices under the given keys in one go
+    if not keys:
+        return []
+
+    key_lens = [
+        (key, conf.get_bytes_per_submatrix(split_level)) for key in keys
+    ]
+    return [
+        _submatrices_from_bytes(conf, data, split_level)
+        for data in get_state_many(key_lens)
+    ]
+
+
+# Reads the region of an input at the given split level from its submatrices,
+# optionally into the given output array. For sparse matrices, only occupied
+# submatrices are read, using the given occupancy if already known.
+def read_input_region(
+    conf,
+    key_prefix,
+    split_level,
+    row_idx,
+    col_idx,
+    sm_per_row=None,
+    out=None,
+    occupancy=None,
+):
+    sm_per_region_row = 2 ** (conf.n_splits - split_level)
+    sm_size = conf.get_submatrix_size(conf.n_splits)
+    sm_per_row = sm_per_row or conf.get_submatrices_per_row(conf.n_splits)
+
+    # Work out which submatrices this region covers
+    row_start = row_idx * sm_per_region_row
+    col_start = col_idx * sm_per_region_row
+
+    region_size = sm_per_region_row * sm_size
+    region = (
+        np.empty((region_size, region_size), dtype=conf.dtype)
+        if out is None
+        else out
+    )
+    region_tiles = get_tile_major_view(conf, region)
+
+    total_bytes = conf.get_operand_bytes(sm_per_row)
+    if conf.tiled and not conf.sparse:
+        # Read each row of submatrices as a contiguous range, all in one go
+        ranges = [
+            conf.get_tile_range(
+                sm_row, col_start, sm_per_row, sm_per_region_row
+            )
+            for sm_row in range(row_start, row_start + sm_per_region_row)
+        ]
+
+        for i, row_data in enumerate(
+            get_state_offset_many(key_prefix, total_bytes, ranges)
+        ):
+            region_tiles[i] = _submatrices_from_bytes(
+                conf, row_data, conf.n_splits, sm_per_region_row
+            )
+
+        return region
+
+    if conf.sparse:
+        if occupancy is None:
+            occupancy = read_occupancy(conf, key_prefix, sm_per_row)
+
+        # Empty submatrices are zeroed rather than read
+        region_occupancy = _get_region_occupancy(
+            conf, occupancy, split_level, row_idx, col_idx
+        )
+        region_tiles[~region_occupancy] = 0
+        positions = [
+            (int(r), int(c)) for r, c in np.argwhere(region_occupancy)
+        ]
+    else:
+        positions = [
+            (r, c)
+            for r in range(0, sm_per_region_row)
+            for c in range(0, sm_per_region_row)
+        ]
+
+    if not positions:
+        return region
+
+    # Read all the submatrices in one go
+    if conf.tiled:
+        ranges = [
+            conf.get_tile_range(row_start + r, col_start + c, sm_per_row)
+            for r, c in positions
+        ]
+        submatrices = [
+            _submatrices_from_bytes(conf, sm_data, conf.n_splits)
+            for sm_data in get_state_offset_many(
+                key_prefix, total_bytes, ranges
+            )
+        ]
+    else:
+        keys = [
+            conf.get_submatrix_key(
+                key_prefix, conf.n_splits, row_start + r, col_start + c
+            )
+            for r, c in positions
+        ]
+        submatrices = _read_submatrices(conf, keys, conf.n_splits)
+
+    for (r, c), submatrix in zip(positions, submatrices):
+        region_tiles[r, c] = submatrix
+
+    return region
+
 
-    sub_mat_data = get_state(full_key, sm_bytes)
-    return np.frombuffer(sub_mat_data, dtype=np.float32).reshape(sm_size, sm_size)
+# Writes an input matrix of any size to state as submatrices. Note this may be
+# smaller than the original matrix, e.g. the operands of a Strassen node.
+def write_input_region(conf, key_prefix, region):
+    region = np.asarray(region, dtype=conf.dtype)
+    region_tiles = get_tile_major_view(conf, region)
 
+    occupancy = None
+    if conf.sparse:
+        occupancy = get_tile_occupancy(conf, region)
+        write_occupancy(conf, key_prefix, occupancy)
+
+    if conf.tiled:
+        # The whole matrix goes under one key
+        set_state(key_prefix, region_tiles)
+        return
+
+    # Write all the submatrices in one go
+    sm_per_region_row = region_tiles.shape[0]
+    items = list()
+    for sm_row in range(0, sm_per_region_row):
+        for sm_col in range(0, sm_per_region_row):
+            if occupancy is not None and not occupancy[sm_row, sm_col]:
+                continue
+
+            full_key = conf.get_submatrix_key(
+                key_prefix, conf.n_splits, sm_row, sm_col
+            )
+            items.append((full_key, region_tiles[sm_row, sm_col]))
+
+    if items:
+        set_state_many(items)
+
+
+# Rebuilds a matrix from its submatrices in state, optionally into the given
+# output array (e.g. an np.memmap)
+def reconstruct_matrix_from_submatrices(conf, key_prefix, out=None):
+    if conf.tiled:
+        return read_input_region(conf, key_prefix, 0, 0, 0, out=out)
+
+    sm_per_row = conf.get_submatrices_per_row(conf.n_splits)
+    occupancy = (
+        read_occupancy(conf, key_prefix, sm_per_row) if conf.sparse else None
+    )
+
+    # Submatrices are read a row at a time (in one go for each row), so only
+    # one row of them is held alongside the output. Empty ones are left out.
+    row_submatrices = dict()
 
-# Rebuilds a matrix from its submatrices in state
-def reconstruct_matrix_from_submatrices(conf, key_prefix):
     def _read_submatrix_from_state(row_idx, col_idx):
-        full_key = conf.get_submatrix_key(key_prefix, conf.n_splits, row_idx, col_idx)
-        sm_bytes = conf.get_bytes_per_submatrix(conf.n_splits)
-        return get_state(full_key, sm_bytes)
+        if row_idx not in row_submatrices:
+            row_submatrices.clear()
+            key_lens = _get_submatrix_key_lens(
+                conf, key_prefix, sm_per_row, occupancy, rows=[row_idx]
+            )
+            values = get_state_many(key_lens) if key_lens else []
+            row_submatrices[row_idx] = dict(
+                zip([key for key, _ in key_lens], values)
+            )
+
+        return row_submatrices[row_idx].get(
+            conf.get_submatrix_key(key_prefix, conf.n_splits, row_idx, col_idx)
+        )
+
+    return do_reconstruct_matrix(conf, _read_submatrix_from_state, out=out)
+
+
+def _parse_multiplication_input(input_bytes):
+    input_args = np.frombuffer(input_bytes, dtype=np.int32)
+
+    # Node ID is only relevant when using Strassen
+    node_id = input_args[5] if len(input_args) > 5 else 0
 
-    return do_reconstruct_matrix(conf, _read_submatrix_from_state)
+    return (
+        input_args[0],
+        input_args[1],
+        input_args[2],
+        input_args[3],
+        input_args[4],
+        node_id,
+    )
 
 
 # This is the distributed worker that will be invoked by faasm
 def distributed_divide_and_conquer(input_bytes):
     conf = load_matrix_conf_from_state()
+    split_level, row_a, col_a, row_b, col_b, node_id = (
+        _parse_multiplication_input(input_bytes)
+    )
 
-    input_args = np.frombuffer(input_bytes, dtype=int32)
+    result = multiply_submatrices(
+        conf, split_level, row_a, col_a, row_b, col_b, node_id
+    )
 
-    split_level = input_args[0]
-    row_a = input_args[1]
-    col_a = input_args[2]
-    row_b = input_args[3]
-    col_b = input_args[4]
+    # In in-place mode the result has already been written
+    if conf.in_place:
+        return
 
-    # If we're at the target number of splits, do the work
-    if split_level == conf.n_splits:
-        # Read in the relevant submatrices of each input matrix
-        mat_a = read_input_submatrix(conf, SUBMATRICES_KEY_A, row_a, col_a)
-        mat_b = read_input_submatrix(conf, SUBMATRICES_KEY_B, row_b, col_b)
+    # Write the result
+    result_key = conf.get_intermediate_result_key(
+        split_level, row_a, col_a, row_b, col_b, node_id
+    )
+    set_state(result_key, result.astype(conf.dtype, copy=False))
 
-        # Do the multiplication in memory
-        result = np.dot(mat_a, mat_b)
+
+def _get_region_keys(conf, key_prefix, split_level, row_idx, col_idx):
+    # The state keys holding the region of an input at the given split level
+    if conf.tiled:
+        keys = [key_prefix]
+    else:
+        sm_per_region_row = 2 ** (conf.n_splits - split_level)
+        keys = [
+            conf.get_submatrix_key(key_prefix, conf.n_splits, sm_row, sm_col)
+            for sm_row in range(
+                row_idx * sm_per_region_row, (row_idx + 1) * sm_per_region_row
+            )
+            for sm_col in range(
+                col_idx * sm_per_region_row, (col_idx + 1) * sm_per_region_row
+            )
+        ]
+
+    if conf.sparse:
+        keys.append(conf.get_occupancy_key(key_prefix))
+
+    return keys
+
+
+def get_multiplication_state_keys(input_bytes):
+    """
+    The state keys read by the multiplication with the given input, or None
+    in in-place mode, where the result is added to the result matrix so can't
+    be memoised
+    """
+    conf = load_matrix_conf_from_state()
+    if conf.in_place:
+        return None
+
+    split_level, row_a, col_a, row_b, col_b, node_id = (
+        _parse_multiplication_input(input_bytes)
+    )
+    key_prefix_a = conf.get_operand_key_prefix(SUBMATRICES_KEY_A, node_id)
+    key_prefix_b = conf.get_operand_key_prefix(SUBMATRICES_KEY_B, node_id)
+
+    keys = [MATRIX_CONF_STATE_KEY]
+    keys += _get_region_keys(conf, key_prefix_a, split_level, row_a, col_a)
+    keys += _get_region_keys(conf, key_prefix_b, split_level, row_b, col_b)
+    return keys
+
+
+def get_multiplication_result_keys(input_bytes):
+    conf = load_matrix_conf_from_state()
+    split_level, row_a, col_a, row_b, col_b, node_id = (
+        _parse_multiplication_input(input_bytes)
+    )
+    return [
+        conf.get_intermediate_result_key(
+            split_level, row_a, col_a, row_b, col_b, node_id
+        )
+    ]
+
+
+def set_multiplication_memoisation():
+    """
+    Memoises chained multiplications, so that repeated multiplications skip
+    any parts whose operands haven't changed. Not used in in-place mode.
+
+    The memo table lives in the calling process, so this only memoises the
+    top-level fan-out, i.e. the children chained from here. Children running
+    on other hosts chain their own children without it, so deeper levels are
+    only memoised when chaining locally in this process.
+
+    Each chained call is looked up by hashing the state it reads, so every
+    fan-out reads the whole of its children's operand regions (plus the
+    matrix parameters) on the calling host before chaining, and hashes each
+    child's result once it's awaited. Digests are shared across a fan-out, so
+    each key is only read once per fan-out. With the tiled layout each operand
+    is a single key, so the whole operand is hashed, and any change to it
+    misses every entry.
+    """
+    set_call_memoisation(
+        distributed_divide_and_conquer,
+        state_keys=get_multiplication_state_keys,
+        result_keys=get_multiplication_result_keys,
+    )
+
+
+def multiply_submatrices(
+    conf, split_level, row_a, col_a, row_b, col_b, node_id
+):
+    is_strassen = split_level < conf.strassen_levels
+    n_children = 7 if is_strassen else 8
+
+    # For sparse matrices, there's nothing to do if either operand is empty
+    occupancy = read_operand_occupancy(conf, node_id)
+    if _is_product_empty(
+        conf, occupancy, split_level, (row_a, col_a), (row_b, col_b)
+    ):
+        sm_size = conf.get_submatrix_size(split_level)
+        return np.zeros((sm_size, sm_size), dtype=conf.accumulate_dtype)
+
+    # If we're at the target number of splits, or the cost model says splitting
+    # further isn't worth it, do the work here
+    if split_level == conf.n_splits:
+        return multiply_locally(
+            conf, split_level, row_a, col_a, row_b, col_b, node_id, occupancy
+        )
+    elif conf.cost_model is not None and not conf.cost_model.should_chain(
+        conf, split_level, n_children
+    ):
+        return multiply_locally(
+            conf, split_level, row_a, col_a, row_b, col_b, node_id, occupancy
+        )
+    elif is_strassen:
+        return chain_strassen_multiplications(
+            conf, split_level, row_a, col_a, row_b, col_b, node_id, occupancy
+        )
     else:
         # Recursively kick off more divide and conquer
-        result = chain_multiplications(conf, split_level, row_a, col_a, row_b, col_b)
+        return chain_multiplications(
+            conf, split_level, row_a, col_a, row_b, col_b, node_id, occupancy
+        )
+
+
+def multiply_locally(
+    conf, split_level, row_a, col_a, row_b, col_b, node_id, occupancy=None
+):
+    # Read in the relevant parts of each input matrix
+    key_prefix_a = conf.get_operand_key_prefix(SUBMATRICES_KEY_A, node_id)
+    key_prefix_b = conf.get_operand_key_prefix(SUBMATRICES_KEY_B, node_id)
+    sm_per_row = conf.get_operand_submatrices_per_row(node_id)
+    occupancy_a, occupancy_b = occupancy or (None, None)
+
+    if split_level == conf.n_splits:
+        mat_a = read_input_submatrix(
+            conf, key_prefix_a, row_a, col_a, sm_per_row
+        )
+        mat_b = read_input_submatrix(
+            conf, key_prefix_b, row_b, col_b, sm_per_row
+        )
+    else:
+        mat_a = read_input_region(
+            conf,
+            key_prefix_a,
+            split_level,
+            row_a,
+            col_a,
+            sm_per_row,
+            occupancy=occupancy_a,
+        )
+        mat_b = read_input_region(
+            conf,
+            key_prefix_b,
+            split_level,
+            row_b,
+            col_b,
+            sm_per_row,
+            occupancy=occupancy_b,
+        )
+
+    # Do the multiplication in memory
+    result = np.dot(
+        _to_accumulate_dtype(conf, mat_a), _to_accumulate_dtype(conf, mat_b)
+    )
+
+    if conf.in_place:
+        # The first multiplication for this part of the result overwrites
+        # it, the rest add to it. For sparse matrices the first may have been
+        # pruned, so they all add to a zeroed result.
+        add_to_result_matrix(
+            conf, split_level, row_a, col_b, result, col_a > 0 or conf.sparse
+        )
+
+    return result
 
-    # Write the result
-    result_key = conf.get_intermediate_result_key(split_level, row_a, col_a, row_b, col_b)
-    set_state(result_key, result.tobytes())
+
+def _to_accumulate_dtype(conf, mat):
+    return mat.astype(conf.accumulate_dtype, copy=False)
 
 
 def divide_and_conquer():
     conf = load_matrix_conf_from_state()
-    print("Running divide and conquer for {}x{} matrix with {} splits".format(
-        conf.matrix_size,
-        conf.matrix_size,
-        conf.n_splits
-    ))
-
-    # Short-cut for no splits
-    if conf.n_splits == 0:
-        # Read in the relevant submatrices of each input matrix
-        mat_a = read_input_submatrix(conf, SUBMATRICES_KEY_A, 0, 0)
-        mat_b = read_input_submatrix(conf, SUBMATRICES_KEY_B, 0, 0)
-
-        # Do the multiplication in memory
-        result = np.dot(mat_a, mat_b)
-    else:
-        # Kick off the basic multiplication jobs
-        result = chain_multiplications(conf, 0, 0, 0, 0, 0)
+    print(
+        "Running divide and conquer for {}x{} {} matrix with {} splits "
+        "({} Strassen)".format(
+            conf.matrix_size,
+            conf.matrix_size,
+            conf.dtype,
+            conf.n_splits,
+            conf.strassen_levels,
+        )
+    )
+
+    in_place_key = conf.get_in_place_result_key()
+    if conf.in_place and conf.sparse:
+        set_state(
+            in_place_key,
+            np.zeros(
+                (conf.matrix_size, conf.matrix_size),
+                dtype=conf.accumulate_dtype,
+            ),
+        )
+        push_state(in_place_key)
+
+    # Kick off the top-level multiplication, with no splits this is done here
+    result = multiply_submatrices(conf, 0, 0, 0, 0, 0, 0)
+
+    # Write final result (already done in in-place mode, unless the partial
+    # sums were kept with a wider type)
+    if not conf.in_place:
+        set_state(RESULT_MATRIX_KEY, result.astype(conf.dtype, copy=False))
+    elif in_place_key != RESULT_MATRIX_KEY:
+        result_matrix = StateArray(
+            in_place_key,
+            (conf.matrix_size, conf.matrix_size),
+            dtype=conf.accumulate_dtype,
+        )
+        result_matrix.pull()
+        set_state(RESULT_MATRIX_KEY, result_matrix.read().astype(conf.dtype))
 
-    # Write final result
-    set_state(RESULT_MATRIX_KEY, result.tobytes())
 
+def add_to_result_matrix(
+    conf, split_level, row_idx, col_idx, result, accumulate
+):
+    """
+    Writes the given submatrix into its place in the result matrix, adding it
+    to what's already there if accumulate is set. Each row of the submatrix is
+    a separate range of the result matrix, but these are all read and written
+    in one go. Before accumulating, just these ranges are pulled so that the
+    read sees what earlier multiplications (possibly on other hosts) pushed.
+    Partial sums are kept in accumulate_dtype, see get_in_place_result_key.
+    """
+    result_matrix = StateArray(
+        conf.get_in_place_result_key(),
+        (conf.matrix_size, conf.matrix_size),
+        dtype=conf.accumulate_dtype,
+    )
 
-def get_addition_result(conf, split_level, addition_def):
     sm_size = conf.get_submatrix_size(split_level)
-    sm_byte_size = conf.get_bytes_per_submatrix(split_level)
+    rows = slice(row_idx * sm_size, (row_idx + 1) * sm_size)
+    cols = slice(col_idx * sm_size, (col_idx + 1) * sm_size)
+
+    if accumulate:
+        result_matrix.pull((rows, cols))
+        result = result + result_matrix[rows, cols]
 
-    key_a = conf.get_intermediate_result_key(split_level,
-                                             addition_def[0][0][0], addition_def[0][0][1],
-                                             addition_def[0][1][0], addition_def[0][1][1],
-                                             )
+    result_matrix[rows, cols] = result
+    result_matrix.push_partial()
+
+
+def get_addition_result(conf, split_level, addition_def, node_id=0, out=None):
+    """
+    Adds up the intermediate results of the multiplications in addition_def.
+    Multiplications pruned for sparse matrices are left out of addition_def,
+    so it may have fewer than two, and with none the result is zero.
+    """
+    sm_size = conf.get_submatrix_size(split_level)
+    keys = [
+        conf.get_intermediate_result_key(
+            split_level, sm_a[0], sm_a[1], sm_b[0], sm_b[1], node_id
+        )
+        for sm_a, sm_b in addition_def
+    ]
+    mats = _read_submatrices(conf, keys, split_level)
 
-    key_b = conf.get_intermediate_result_key(split_level,
-                                             addition_def[1][0][0], addition_def[1][0][1],
-                                             addition_def[1][1][0], addition_def[1][1][1],
-                                             )
+    if len(mats) == 2:
+        return np.add(mats[0], mats[1], out=out, dtype=conf.accumulate_dtype)
 
-    bytes_a = get_state(key_a, sm_byte_size)
-    mat_a = np.frombuffer(bytes_a, dtype=np.float32).reshape(sm_size, sm_size)
+    if out is None:
+        out = np.empty((sm_size, sm_size), dtype=conf.accumulate_dtype)
 
-    bytes_b = get_state(key_b, sm_byte_size)
-    mat_b = np.frombuffer(bytes_b, dtype=np.float32).reshape(sm_size, sm_size)
+    if mats:
+        out[:] = mats[0]
+    else:
+        out.fill(0)
 
-    return mat_a + mat_b
+    return out
 
 
-def chain_multiplications(conf, split_level, row_a, col_a, row_b, col_b):
+def chain_multiplications(
+    conf, split_level, row_a, col_a, row_b, col_b, node_id=0, occupancy=None
+):
     """
     Spawns 8 workers to do the relevant multiplication in parallel.
     - split level is how many times we've split the original matrix
     - row_a, col_a is the chunk of matrix A
     - row_b, col_b is the chunk of matrix B
+    - node_id is the Strassen node whose operands we're working on
+    - occupancy is the occupancy of both operands for sparse matrices, any
+      multiplications with an empty operand are skipped
 
-    The row/ col values will specify which chunk of the current split level, not
-    actual indices in the final input matrices. Those must only be calculated
-    when the final multiplication is done.
+    The row/ col values will specify which chunk of the current split level,
+    not actual indices in the final input matrices. Those must only be
+    calculated when the final multiplication is done.
     """
-    call_ids = []
-
     # Next split down we'll double the number of submatrices
     next_split_level = split_level + 1
     next_row_a = 2 * row_a
@@ -172,39 +961,223 @@ def chain_multiplications(conf, split_level, row_a, col_a, row_b, col_b):
         [(a21, b11), (a22, b21)], [(a21, b12), (a22, b22)],
     ]
 
+    # Leave out multiplications with an empty operand, their results are zero
+    if occupancy is not None:
+        additions = [
+            [
+                (sm_a, sm_b)
+                for sm_a, sm_b in addition
+                if not _is_product_empty(
+                    conf, occupancy, next_split_level, sm_a, sm_b
+                )
+            ]
+            for addition in additions
+        ]
+
     # Build a list of all the required multiplications
     multiplications = list()
-    for mult_one, mult_two in additions:
-        multiplications.append(mult_one)
-        multiplications.append(mult_two)
+    for addition in additions:
+        multiplications.extend(addition)
 
-    # Kick off the multiplications in parallel
-    for submatrix_a, submatrix_b in multiplications:
-        inputs_a = np.array([
-            next_split_level,
-            submatrix_a[0], submatrix_a[1],
-            submatrix_b[0], submatrix_b[1],
-        ], dtype=int32)
+    def _get_inputs(submatrix_a, submatrix_b):
+        return np.array(
+            [
+                next_split_level,
+                submatrix_a[0],
+                submatrix_a[1],
+                submatrix_b[0],
+                submatrix_b[1],
+                node_id,
+            ],
+            dtype=np.int32,
+        ).tobytes()
 
-        call_ids.append(chain_this_with_input(
-            distributed_divide_and_conquer,
-            inputs_a.tobytes())
+    if conf.in_place:
+        # Each pair of multiplications adds to the same part of the result, so
+        # the first of each pair runs, then the second. This halves the
+        # fan-out, with the second wave waiting for the whole first wave.
+        for mult_idx in range(0, 2):
+            inputs = [
+                _get_inputs(*addition[mult_idx])
+                for addition in additions
+                if len(addition) > mult_idx
+            ]
+            if inputs:
+                await_all(chain_many(distributed_divide_and_conquer, inputs))
+
+        # Result has been written in place
+        return None
+
+    # Kick off the multiplications in parallel and await completion
+    inputs = [
+        _get_inputs(submatrix_a, submatrix_b)
+        for submatrix_a, submatrix_b in multiplications
+    ]
+    if inputs:
+        await_all(chain_many(distributed_divide_and_conquer, inputs))
+
+    # Go through and add the results straight into their part of the result
+    sm_size = conf.get_submatrix_size(next_split_level)
+    result = np.empty((2 * sm_size, 2 * sm_size), dtype=conf.accumulate_dtype)
+
+    get_addition_result(
+        conf,
+        next_split_level,
+        additions[0],
+        node_id,
+        out=result[:sm_size, :sm_size],
+    )
+    get_addition_result(
+        conf,
+        next_split_level,
+        additions[1],
+        node_id,
+        out=result[:sm_size, sm_size:],
+    )
+    get_addition_result(
+        conf,
+        next_split_level,
+        additions[2],
+        node_id,
+        out=result[sm_size:, :sm_size],
+    )
+    get_addition_result(
+        conf,
+        next_split_level,
+        additions[3],
+        node_id,
+        out=result[sm_size:, sm_size:],
+    )
+
+    return result
+
+
+def chain_strassen_multiplications(
+    conf, split_level, row_a, col_a, row_b, col_b, node_id=0, occupancy=None
+):
+    """
+    Spawns 7 workers to do the multiplication using Strassen's algorithm.
+    Unlike the standard algorithm, the operands of each multiplication are sums
+    of the submatrices of A and B, so these are written to state first. For
+    sparse matrices, multiplications with an all-zero operand are skipped.
+    """
+    # Read in the chunks of A and B we're multiplying
+    key_prefix_a = conf.get_operand_key_prefix(SUBMATRICES_KEY_A, node_id)
+    key_prefix_b = conf.get_operand_key_prefix(SUBMATRICES_KEY_B, node_id)
+    sm_per_row = conf.get_operand_submatrices_per_row(node_id)
+    occupancy_a, occupancy_b = occupancy or (None, None)
+    mat_a = _to_accumulate_dtype(
+        conf,
+        read_input_region(
+            conf,
+            key_prefix_a,
+            split_level,
+            row_a,
+            col_a,
+            sm_per_row,
+            occupancy=occupancy_a,
+        ),
+    )
+    mat_b = _to_accumulate_dtype(
+        conf,
+        read_input_region(
+            conf,
+            key_prefix_b,
+            split_level,
+            row_b,
+            col_b,
+            sm_per_row,
+            occupancy=occupancy_b,
+        ),
+    )
+
+    half = mat_a.shape[0] // 2
+    a11, a12, a21, a22 = (
+        mat_a[:half, :half],
+        mat_a[:half, half:],
+        mat_a[half:, :half],
+        mat_a[half:, half:],
+    )
+    b11, b12, b21, b22 = (
+        mat_b[:half, :half],
+        mat_b[:half, half:],
+        mat_b[half:, :half],
+        mat_b[half:, half:],
+    )
+
+    # Operands of M1 to M7
+    operands = [
+        (a11 + a22, b11 + b22),
+        (a21 + a22, b11),
+        (a11, b12 - b22),
+        (a22, b21 - b11),
+        (a11 + a12, b22),
+        (a21 - a11, b11 + b12),
+        (a12 - a22, b21 + b22),
+    ]
+
+    # Write the operands and kick off the multiplications
+    next_split_level = split_level + 1
+    child_node_ids = list()
+    inputs = list()
+    for k, (operand_a, operand_b) in enumerate(operands):
+        if conf.sparse and not (operand_a.any() and operand_b.any()):
+            child_node_ids.append(None)
+            continue
+
+        child_node_id = (8 * node_id) + k + 1
+        child_node_ids.append(child_node_id)
+
+        write_input_region(
+            conf,
+            conf.get_operand_key_prefix(SUBMATRICES_KEY_A, child_node_id),
+            operand_a,
+        )
+        write_input_region(
+            conf,
+            conf.get_operand_key_prefix(SUBMATRICES_KEY_B, child_node_id),
+            operand_b,
+        )
+
+        inputs.append(
+            np.array(
+                [next_split_level, 0, 0, 0, 0, child_node_id], dtype=np.int32
+            ).tobytes()
         )
 
-    # Await completion
-    for call_id in call_ids:
-        await_call(call_id)
+    if inputs:
+        await_all(chain_many(distributed_divide_and_conquer, inputs))
 
-    # Go through and get the results
-    r_1 = get_addition_result(conf, next_split_level, additions[0])
-    r_2 = get_addition_result(conf, next_split_level, additions[1])
-    r_3 = get_addition_result(conf, next_split_level, additions[2])
-    r_4 = get_addition_result(conf, next_split_level, additions[3])
+    # Read in M1 to M7, any that were skipped are zero
+    sm_size = conf.get_submatrix_size(next_split_level)
+    chained_ids = [
+        child_node_id
+        for child_node_id in child_node_ids
+        if child_node_id is not None
+    ]
+    keys = [
+        conf.get_intermediate_result_key(
+            next_split_level, 0, 0, 0, 0, child_node_id
+        )
+        for child_node_id in chained_ids
+    ]
+
+    products = dict()
+    for child_node_id, m_mat in zip(
+        chained_ids, _read_submatrices(conf, keys, next_split_level)
+    ):
+        products[child_node_id] = _to_accumulate_dtype(conf, m_mat)
+
+    zeros = np.zeros((sm_size, sm_size), dtype=conf.accumulate_dtype)
+    m1, m2, m3, m4, m5, m6, m7 = [
+        products.get(child_node_id, zeros) for child_node_id in child_node_ids
+    ]
 
     # Reconstitute the result
-    result = np.concatenate((
-        np.concatenate((r_1, r_2), axis=1),
-        np.concatenate((r_3, r_4), axis=1)
-    ), axis=0)
+    result = np.empty((2 * half, 2 * half), dtype=conf.accumulate_dtype)
+    result[:half, :half] = m1 + m4 - m5 + m7
+    result[:half, half:] = m3 + m5
+    result[half:, :half] = m2 + m4
+    result[half:, half:] = m1 - m2 + m3 + m6
 
     return result
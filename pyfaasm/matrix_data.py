@@ -1,38 +1,168 @@
-from os.path import join
+import struct
+from os.path import exists, join
 
-import numpy as np
+from pyfaasm.lazy import lazy_import
+
+np = lazy_import("numpy")
+
+# Tiled files have a header, followed by an index with the offset of each
+# submatrix, followed by the submatrices themselves in row-major order. The
+# submatrices are always contiguous, so the index is checked against this
+# when a file is opened.
+TILED_FILE_MAGIC = b"PYFAASMT"
+TILED_FILE_VERSION = 1
+TILED_FILE_HEADER = struct.Struct("<8sIII4s")
+TILED_FILE_INDEX_DTYPE = "<i8"
+
+
+def get_tile_major_view(conf, mat):
+    """
+    Returns a view of the given matrix with shape (sm_per_row, sm_per_row,
+    sm_size, sm_size), i.e. with submatrices one after the other
+    """
+    sm_size = conf.get_submatrix_size(conf.n_splits)
+    sm_per_row = mat.shape[0] // sm_size
+    return mat.reshape(sm_per_row, sm_size, sm_per_row, sm_size).swapaxes(1, 2)
+
+
+def get_tile_occupancy(conf, mat):
+    """
+    Returns a boolean array with shape (sm_per_row, sm_per_row), saying which
+    submatrices of the given matrix hold any non-zero values
+    """
+    return get_tile_major_view(conf, mat).any(axis=(2, 3))
 
 
 def subdivide_matrix_into_files(conf, mat, file_dir, file_prefix):
-    def _write_submatrix_to_file(sm_bytes, row_idx, col_idx):
+    mat = np.asarray(mat, dtype=conf.dtype)
+
+    def _write_submatrix_to_file(sub_mat, row_idx, col_idx):
         file_name = conf.get_submatrix_key(file_prefix, conf.n_splits, row_idx, col_idx)
         file_path = join(file_dir, file_name)
         with open(file_path, "wb") as fh:
-            fh.write(sm_bytes)
+            sub_mat.tofile(fh)
 
     do_subdivide_matrix(conf, mat, _write_submatrix_to_file)
 
 
-def reconstruct_matrix_from_files(conf, file_dir, file_prefix):
+def reconstruct_matrix_from_files(conf, file_dir, file_prefix, out=None):
+    # Reuse the same buffer for reading each file
+    sm_buffer = bytearray(conf.get_bytes_per_submatrix(conf.n_splits))
+
     def _read_submatrix_from_file(row_idx, col_idx):
         file_name = conf.get_submatrix_key(file_prefix, conf.n_splits, row_idx, col_idx)
         file_path = join(file_dir, file_name)
+
+        # Empty submatrices of sparse matrices aren't written
+        if conf.sparse and not exists(file_path):
+            return None
+
+        with open(file_path, "rb") as fh:
+            fh.readinto(sm_buffer)
+
+        return sm_buffer
+
+    return do_reconstruct_matrix(conf, _read_submatrix_from_file, out=out)
+
+
+def _get_tiled_file_index(n_submatrices, sm_bytes):
+    data_offset = TILED_FILE_HEADER.size + (n_submatrices * np.dtype(TILED_FILE_INDEX_DTYPE).itemsize)
+    return np.arange(n_submatrices, dtype=TILED_FILE_INDEX_DTYPE) * sm_bytes + data_offset
+
+
+def write_matrix_to_tiled_file(conf, mat, file_path):
+    """
+    Writes the matrix to a single tiled file in one sequential stream
+    """
+    sm_per_row = conf.get_submatrices_per_row(conf.n_splits)
+    sm_bytes = conf.get_bytes_per_submatrix(conf.n_splits)
+    dtype = np.dtype(conf.dtype)
+
+    header = TILED_FILE_HEADER.pack(
+        TILED_FILE_MAGIC, TILED_FILE_VERSION, conf.matrix_size, conf.n_splits, dtype.str.encode(),
+    )
+
+    index = _get_tiled_file_index(sm_per_row * sm_per_row, sm_bytes)
+
+    with open(file_path, "wb") as fh:
+        fh.write(header)
+        index.tofile(fh)
+
+        # Writing the tile-major view directly goes element by element, so
+        # each row of tiles is copied into a contiguous block first
+        tiles = get_tile_major_view(conf, mat)
+        for row_tiles in tiles:
+            np.ascontiguousarray(row_tiles, dtype=dtype).tofile(fh)
+
+
+class TiledMatrixFile(object):
+    """
+    Read-only access to a tiled file. Submatrices are views onto a memory map
+    of the file, so are only read from disk when used.
+    """
+
+    def __init__(self, file_path):
         with open(file_path, "rb") as fh:
-            file_bytes = fh.read()
+            magic, version, matrix_size, n_splits, dtype_str = TILED_FILE_HEADER.unpack(
+                fh.read(TILED_FILE_HEADER.size)
+            )
+
+            if magic != TILED_FILE_MAGIC or version != TILED_FILE_VERSION:
+                raise ValueError("{} is not a tiled matrix file".format(file_path))
+
+            self.matrix_size = matrix_size
+            self.n_splits = n_splits
+            self.sm_per_row = 2 ** n_splits
+            self.sm_size = matrix_size // self.sm_per_row
+            self.dtype = np.dtype(dtype_str.rstrip(b"\0").decode())
+
+            n_submatrices = self.sm_per_row * self.sm_per_row
+            self.index = np.fromfile(fh, dtype=TILED_FILE_INDEX_DTYPE, count=n_submatrices)
+
+        sm_bytes = self.sm_size * self.sm_size * self.dtype.itemsize
+        if not np.array_equal(self.index, _get_tiled_file_index(n_submatrices, sm_bytes)):
+            raise ValueError("{} has an invalid submatrix index".format(file_path))
+
+        # Submatrices are written contiguously, so can be mapped as one array
+        self.tiles = np.memmap(
+            file_path, dtype=self.dtype, mode="r", offset=int(self.index[0]),
+            shape=(n_submatrices, self.sm_size, self.sm_size),
+        )
+
+    def get_submatrix(self, row_idx, col_idx):
+        return self.tiles[row_idx * self.sm_per_row + col_idx]
 
-        return file_bytes
+    def read_matrix(self, out=None):
+        if out is None:
+            out = np.empty((self.matrix_size, self.matrix_size), dtype=self.dtype)
 
-    return do_reconstruct_matrix(conf, _read_submatrix_from_file)
+        tiles = self.tiles.reshape(self.sm_per_row, self.sm_per_row, self.sm_size, self.sm_size)
+        out.reshape(self.sm_per_row, self.sm_size, self.sm_per_row, self.sm_size).swapaxes(1, 2)[:] = tiles
+        return out
+
+
+def open_tiled_matrix_file(file_path):
+    return TiledMatrixFile(file_path)
+
+
+def reconstruct_matrix_from_tiled_file(file_path, out=None):
+    return open_tiled_matrix_file(file_path).read_matrix(out=out)
 
 
 def do_subdivide_matrix(conf, mat, write_func):
-    # Step through rows and columns of original matrix, appending submatrix bytes
-    # to the overall byte stream
+    # Step through rows and columns of original matrix, passing each submatrix to
+    # the write function. Submatrices are views onto the original matrix, so any
+    # copying is left to the write function. For sparse matrices, empty
+    # submatrices are skipped.
     sm_per_row = conf.get_submatrices_per_row(conf.n_splits)
     sm_size = conf.get_submatrix_size(conf.n_splits)
+    occupancy = get_tile_occupancy(conf, mat) if conf.sparse else None
 
     for row_idx in range(0, sm_per_row):
         for col_idx in range(0, sm_per_row):
+            if occupancy is not None and not occupancy[row_idx, col_idx]:
+                continue
+
             # Work out the position of the top left and bottom right corner of the submatrix
             row_start = row_idx * sm_size
             col_start = col_idx * sm_size
@@ -40,34 +170,35 @@ def do_subdivide_matrix(conf, mat, write_func):
             row_end = row_start + sm_size
             col_end = col_start + sm_size
 
-            # Extract the submatrix and write to bytes
+            # Extract the submatrix and write
             sub_mat = mat[row_start:row_end, col_start:col_end]
-            sm_bytes = sub_mat.tobytes()
-            write_func(sm_bytes, row_idx, col_idx)
+            write_func(sub_mat, row_idx, col_idx)
 
 
-def do_reconstruct_matrix(conf, read_func):
-    result = None
-
+def do_reconstruct_matrix(conf, read_func, out=None):
+    """
+    Rebuilds the full matrix from its submatrices, copying each one straight
+    into its place in the output. The output is allocated here unless passed
+    in (e.g. an existing array or an np.memmap). Submatrices for which the
+    read function returns None are empty, i.e. all zeros.
+    """
     sm_per_row = conf.get_submatrices_per_row(conf.n_splits)
     sm_size = conf.get_submatrix_size(conf.n_splits)
 
-    # Need to read in row by row concatenate the rows
+    if out is None:
+        out = np.empty((conf.matrix_size, conf.matrix_size), dtype=conf.dtype)
+
     for row_idx in range(0, sm_per_row):
-        submatrices = []
+        row_start = row_idx * sm_size
         for col_idx in range(0, sm_per_row):
-            sm_data = read_func(row_idx, col_idx)
-            this_submat = np.frombuffer(sm_data, dtype=np.float32)
-            this_submat = this_submat.reshape(sm_size, sm_size)
-            submatrices.append(this_submat)
+            col_start = col_idx * sm_size
 
-        this_row = np.concatenate(submatrices, axis=1)
+            sm_data = read_func(row_idx, col_idx)
+            if sm_data is None:
+                out[row_start:row_start + sm_size, col_start:col_start + sm_size] = 0
+                continue
 
-        if row_idx == 0:
-            # Initialise the result
-            result = this_row
-        else:
-            # Add the row to the existing result
-            result = np.concatenate((result, this_row), axis=0)
+            this_submat = np.frombuffer(sm_data, dtype=conf.dtype)
+            out[row_start:row_start + sm_size, col_start:col_start + sm_size] = this_submat.reshape(sm_size, sm_size)
 
-    return result
+    return out
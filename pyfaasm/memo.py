@@ -0,0 +1,166 @@
+import hashlib
+from collections import OrderedDict
+from itertools import count
+from threading import Lock
+
+MEMO_DIGEST_SIZE = 16
+
+
+def get_digest(value):
+    return hashlib.blake2b(value, digest_size=MEMO_DIGEST_SIZE).digest()
+
+
+def _get_keys(keys, input_data):
+    # Keys can be given as a list, or a function of the call's input
+    if keys is None:
+        return []
+
+    return keys(input_data) if callable(keys) else keys
+
+
+class CallMemo(object):
+    """
+    Bounded LRU table of completed chained calls, keyed on a digest of the
+    function name, the input, and the contents of the state keys the function
+    declares it reads. Only functions with a policy are memoised.
+
+    Each entry also holds digests of the function's result keys as they were
+    when it completed. A matching call is only short-circuited if these are
+    unchanged, i.e. the result is still in state. Only successful calls (with
+    a status of zero) are recorded, failed calls are always chained again.
+
+    Short-circuited calls get a negative call ID, which never clashes with
+    those from the host.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+
+        self.policies = dict()
+        self.entries = OrderedDict()
+        self.pending = dict()
+        self.memoised_calls = dict()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+        self._memo_ids = count(1)
+        self._lock = Lock()
+
+    def set_policy(self, func, state_keys=None, result_keys=None):
+        self.policies[func.__name__] = (state_keys, result_keys)
+
+    def remove_policy(self, func):
+        self.policies.pop(func.__name__, None)
+
+    def has_policy(self, func):
+        return func.__name__ in self.policies
+
+    def get_call(self, func, input_data, read_digest):
+        """
+        Returns the digest and result keys of a call to the given function,
+        or None if it can't be memoised. read_digest returns the digest of a
+        state value given its key.
+        """
+        state_keys, result_keys = self.policies[func.__name__]
+
+        state_keys = _get_keys(state_keys, input_data)
+        if state_keys is None:
+            return None
+
+        call_hash = hashlib.blake2b(digest_size=MEMO_DIGEST_SIZE)
+        call_hash.update(func.__name__.encode("utf-8"))
+        call_hash.update(b"\0")
+        call_hash.update(input_data)
+
+        for key in state_keys:
+            call_hash.update(b"\0")
+            call_hash.update(key.encode("utf-8"))
+            call_hash.update(read_digest(key))
+
+        return call_hash.digest(), list(_get_keys(result_keys, input_data) or [])
+
+    def lookup(self, call, read_digest):
+        """
+        Returns a memoised call ID if the call matches a completed one whose
+        results are still in state, otherwise None
+        """
+        call_digest, result_keys = call
+
+        with self._lock:
+            entry = self.entries.get(call_digest)
+
+        if entry is not None:
+            status, result_digests = entry
+            is_stale = result_digests != [read_digest(key) for key in result_keys]
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if is_stale:
+                self.entries.pop(call_digest, None)
+                self.stale += 1
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(call_digest)
+
+            memo_id = -next(self._memo_ids)
+            self.memoised_calls[memo_id] = status
+            return memo_id
+
+    def add_pending(self, call_id, call):
+        with self._lock:
+            self.pending[call_id] = call
+
+    def complete(self, call_id, status, read_digest):
+        # Records a chained call once it's been awaited
+        with self._lock:
+            call = self.pending.pop(call_id, None)
+
+        if call is not None:
+            self.record(call, status, read_digest)
+
+    def record(self, call, status, read_digest):
+        if status != 0:
+            return
+
+        call_digest, result_keys = call
+        result_digests = [read_digest(key) for key in result_keys]
+
+        with self._lock:
+            self.entries.pop(call_digest, None)
+            self.entries[call_digest] = (status, result_digests)
+
+            # Evict least recently used entries until we're within bounds
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop_memoised(self, call_id):
+        """
+        Returns the status of a memoised call, or None if it's not one
+        """
+        with self._lock:
+            return self.memoised_calls.pop(call_id, None)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "pending": len(self.pending),
+            }
@@ -1,4 +1,176 @@
+import struct
+from zlib import crc32
 
+from pyfaasm.core import get_state_many, set_state_many, push_state_many, pull_state_many
 
-class Dictionary:
-    pass
\ No newline at end of file
+# Partitions are a count followed by (key length, value length, key, value)
+# for each entry, padded with zeros to the partition size
+_COUNT_FORMAT = struct.Struct("<I")
+_ENTRY_FORMAT = struct.Struct("<II")
+
+
+def _to_bytes(key):
+    return key.encode("utf-8") if isinstance(key, str) else bytes(key)
+
+
+def encode_partition(entries, partition_size=None):
+    parts = [_COUNT_FORMAT.pack(len(entries))]
+    for key, value in entries.items():
+        parts.append(_ENTRY_FORMAT.pack(len(key), len(value)))
+        parts.append(key)
+        parts.append(value)
+
+    data = b"".join(parts)
+    if partition_size is None:
+        return data
+
+    if len(data) > partition_size:
+        raise ValueError("Partition is {} bytes, more than its size of {}".format(len(data), partition_size))
+
+    return data + bytes(partition_size - len(data))
+
+
+def decode_partition(data):
+    data = memoryview(data)
+    (count,) = _COUNT_FORMAT.unpack_from(data, 0)
+    pos = _COUNT_FORMAT.size
+
+    entries = dict()
+    for _ in range(count):
+        key_len, value_len = _ENTRY_FORMAT.unpack_from(data, pos)
+        pos += _ENTRY_FORMAT.size
+        key = bytes(data[pos:pos + key_len])
+        pos += key_len
+        entries[key] = bytes(data[pos:pos + value_len])
+        pos += value_len
+
+    return entries
+
+
+class Dictionary(object):
+    """
+    A dictionary shared between functions through state. Entries are split
+    between a fixed number of partitions by a hash of their key, and each
+    partition is stored under its own state key. Partitions are always
+    partition_size bytes, holding their own entry count, so each is read and
+    written whole in one go. Pushing a partition that has outgrown its size
+    raises a ValueError.
+
+    Partitions are pulled the first time they're needed (or explicitly with
+    pull), and changed partitions are written back with push. Keys and values
+    are bytes, str keys are encoded as UTF-8.
+    """
+
+    def __init__(self, name, n_partitions=16, partition_size=16384):
+        self.name = name
+        self.n_partitions = n_partitions
+        self.partition_size = partition_size
+
+        self.partitions = dict()
+        self.dirty = set()
+
+    def get_partition_key(self, partition_idx):
+        return "{}_part_{}".format(self.name, partition_idx)
+
+    def get_partition_idx(self, key):
+        # Note, can't use hash() as it differs between processes
+        return crc32(_to_bytes(key)) % self.n_partitions
+
+    def pull(self, partition_idxs=None):
+        """
+        Pulls the given partitions (or all of them) from state, discarding any
+        local changes to them
+        """
+        if partition_idxs is None:
+            partition_idxs = range(0, self.n_partitions)
+
+        partition_idxs = sorted(set(partition_idxs))
+
+        # Partitions not yet written are all zeros, i.e. empty
+        key_lens = [(self.get_partition_key(idx), self.partition_size) for idx in partition_idxs]
+        pull_state_many(key_lens)
+
+        for idx, value in zip(partition_idxs, get_state_many(key_lens)):
+            self.partitions[idx] = decode_partition(value)
+            self.dirty.discard(idx)
+
+    def push(self):
+        """
+        Writes all changed partitions back to state
+        """
+        if not self.dirty:
+            return
+
+        # Encode everything first, so nothing is written if a partition is full
+        items = [
+            (self.get_partition_key(idx), encode_partition(self.partitions[idx], self.partition_size))
+            for idx in sorted(self.dirty)
+        ]
+        set_state_many(items)
+        push_state_many([key for key, _ in items])
+
+        self.dirty.clear()
+
+    def _get_partitions(self, keys):
+        # Returns the partition for each key, pulling any not yet loaded
+        idxs = [self.get_partition_idx(key) for key in keys]
+        missing = [idx for idx in idxs if idx not in self.partitions]
+        if missing:
+            self.pull(missing)
+
+        return idxs
+
+    def get(self, key, default=None):
+        return self.get_many([key], default)[0]
+
+    def get_many(self, keys, default=None):
+        keys = [_to_bytes(key) for key in keys]
+        idxs = self._get_partitions(keys)
+        return [self.partitions[idx].get(key, default) for idx, key in zip(idxs, keys)]
+
+    def update(self, entries):
+        entries = [(_to_bytes(key), bytes(value)) for key, value in dict(entries).items()]
+        idxs = self._get_partitions([key for key, _ in entries])
+        for idx, (key, value) in zip(idxs, entries):
+            self.partitions[idx][key] = value
+            self.dirty.add(idx)
+
+    def __getitem__(self, key):
+        key = _to_bytes(key)
+        (idx,) = self._get_partitions([key])
+        return self.partitions[idx][key]
+
+    def __setitem__(self, key, value):
+        self.update({key: value})
+
+    def __delitem__(self, key):
+        key = _to_bytes(key)
+        (idx,) = self._get_partitions([key])
+        del self.partitions[idx][key]
+        self.dirty.add(idx)
+
+    def __contains__(self, key):
+        key = _to_bytes(key)
+        (idx,) = self._get_partitions([key])
+        return key in self.partitions[idx]
+
+    def __len__(self):
+        self._load_all()
+        return sum(len(p) for p in self.partitions.values())
+
+    def items(self):
+        self._load_all()
+        for idx in range(0, self.n_partitions):
+            for item in self.partitions[idx].items():
+                yield item
+
+    def keys(self):
+        return [key for key, _ in self.items()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def _load_all(self):
+        missing = [idx for idx in range(0, self.n_partitions) if idx not in self.partitions]
+        if missing:
+            self.pull(missing)
@@ -0,0 +1,177 @@
+from pyfaasm.core import get_state, get_state_view, get_state_offset, get_state_offset_many, set_state, \
+    set_state_offset, set_state_offset_many, push_state, push_state_partial, pull_state, pull_state_offset_many
+from pyfaasm.lazy import lazy_import
+
+np = lazy_import("numpy")
+
+
+def _normalise_index(idx, dim_len):
+    # Returns (start, stop, is_int) for an int or a slice with step 1
+    if isinstance(idx, (int, np.integer)):
+        idx = int(idx)
+        if idx < 0:
+            idx += dim_len
+
+        if not 0 <= idx < dim_len:
+            raise IndexError("Index {} out of range for length {}".format(idx, dim_len))
+
+        return idx, idx + 1, True
+
+    if isinstance(idx, slice):
+        start, stop, step = idx.indices(dim_len)
+        if step != 1:
+            return None
+
+        return start, max(start, stop), False
+
+    return None
+
+
+class StateArray(object):
+    """
+    A typed numpy array stored under a state key. Indexing rows (with an int or
+    a slice), optionally followed by a slice of columns, reads and writes just
+    the relevant ranges of the state value. Other indexing goes through the
+    whole array.
+
+    Indexing always returns a copy, never a view onto the state, so changing
+    the result doesn't change the state (assign through the StateArray for
+    that). Only the array property gives a view.
+
+    Writes go to the local copy of the state, use push/ push_partial to send
+    them to the host.
+    """
+
+    def __init__(self, key, shape, dtype="float32"):
+        self.key = key
+        self.shape = tuple(int(d) for d in shape)
+        self.dtype = np.dtype(dtype)
+
+        self.size = int(np.prod(self.shape))
+        self.nbytes = self.size * self.dtype.itemsize
+
+    @property
+    def array(self):
+        """
+        An ndarray directly over the state memory, without copying
+        """
+        data = get_state_view(self.key, self.nbytes)
+        return np.frombuffer(data, dtype=self.dtype).reshape(self.shape)
+
+    def __array__(self, dtype=None, copy=None):
+        arr = self.array
+        return arr if dtype is None else arr.astype(dtype)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _get_ranges(self, idx):
+        """
+        Works out the byte ranges of the state value covered by the given
+        index. Returns the ranges, the shape of the block they cover, and the
+        index to apply to the block to get the result, or None if the index
+        isn't supported.
+        """
+        if not isinstance(idx, tuple):
+            idx = (idx,)
+
+        if len(self.shape) == 0 or len(idx) > min(2, len(self.shape)):
+            return None
+
+        rows = _normalise_index(idx[0], self.shape[0])
+        if rows is None:
+            return None
+
+        row_start, row_stop, squeeze_row = rows
+        row_nbytes = self.nbytes // self.shape[0]
+        n_rows = row_stop - row_start
+
+        if len(idx) == 1:
+            ranges = [(row_start * row_nbytes, n_rows * row_nbytes)]
+            block_shape = (n_rows,) + self.shape[1:]
+            return ranges, block_shape, (0 if squeeze_row else slice(None),)
+
+        cols = _normalise_index(idx[1], self.shape[1])
+        if cols is None:
+            return None
+
+        col_start, col_stop, squeeze_col = cols
+        col_nbytes = row_nbytes // self.shape[1]
+        n_cols = col_stop - col_start
+
+        # One range for each row
+        ranges = [
+            ((r * row_nbytes) + (col_start * col_nbytes), n_cols * col_nbytes)
+            for r in range(row_start, row_stop)
+        ]
+        block_shape = (n_rows, n_cols) + self.shape[2:]
+        return ranges, block_shape, (0 if squeeze_row else slice(None), 0 if squeeze_col else slice(None))
+
+    def __getitem__(self, idx):
+        ranges = self._get_ranges(idx)
+        if ranges is None:
+            return self.read()[idx]
+
+        ranges, block_shape, block_idx = ranges
+        if len(ranges) == 1:
+            offset, length = ranges[0]
+            values = [get_state_offset(self.key, self.nbytes, offset, length)]
+        else:
+            values = get_state_offset_many(self.key, self.nbytes, ranges)
+
+        # Each range is a row of the block
+        block = np.empty(block_shape, dtype=self.dtype)
+        if values:
+            block_rows = block.reshape(len(values), -1)
+            for i, value in enumerate(values):
+                block_rows[i] = np.frombuffer(value, dtype=self.dtype)
+
+        return block[block_idx]
+
+    def __setitem__(self, idx, value):
+        ranges = self._get_ranges(idx)
+        if ranges is None:
+            arr = self.read()
+            arr[idx] = value
+            self.write(arr)
+            return
+
+        ranges, block_shape, block_idx = ranges
+
+        # Value has the shape of the indexed result, so put it back into the
+        # shape of the block
+        block = np.empty(block_shape, dtype=self.dtype)
+        block[block_idx] = value
+
+        if len(ranges) == 1:
+            set_state_offset(self.key, self.nbytes, ranges[0][0], block)
+        else:
+            writes = [(offset, block[i]) for i, (offset, _) in enumerate(ranges)]
+            set_state_offset_many(self.key, self.nbytes, writes)
+
+    def read(self):
+        """
+        Returns a copy of the whole array
+        """
+        data = get_state(self.key, self.nbytes)
+        return np.frombuffer(data, dtype=self.dtype).reshape(self.shape).copy()
+
+    def write(self, value):
+        set_state(self.key, np.broadcast_to(np.asarray(value, dtype=self.dtype), self.shape))
+
+    def pull(self, idx=None):
+        """
+        Pulls the whole array, or just the ranges covered by the given index
+        (as for reads and writes)
+        """
+        ranges = None if idx is None else self._get_ranges(idx)
+        if ranges is None:
+            pull_state(self.key, self.nbytes)
+        else:
+            pull_state_offset_many(self.key, self.nbytes, ranges[0])
+
+    def push(self):
+        push_state(self.key)
+
+    def push_partial(self):
+        push_state_partial(self.key)
@@ -0,0 +1,268 @@
+from functools import wraps
+from math import log2
+from threading import Lock, get_ident
+from time import perf_counter
+
+from pyfaasm.backend import StateBackend
+
+
+def _nbytes(value):
+    return memoryview(value).nbytes
+
+
+def _time_nested_runs(func):
+    # Wraps func to total the time it spends running on this thread, i.e.
+    # nested inside a chain call for backends that run calls in-process
+    thread_id = get_ident()
+    nested_time = [0.0]
+
+    @wraps(func)
+    def timed_func(input_data):
+        start = perf_counter()
+        try:
+            return func(input_data)
+        finally:
+            if get_ident() == thread_id:
+                nested_time[0] += perf_counter() - start
+
+    return timed_func, nested_time
+
+
+class CallStats(object):
+    """
+    Records the count, bytes moved and latency of calls for each operation, and
+    totals for each state key. Latencies are kept in a histogram with
+    power-of-two microsecond buckets.
+    """
+
+    def __init__(self):
+        self.ops = dict()
+        self.keys = dict()
+        self._lock = Lock()
+
+    def record(self, op, keys, nbytes, elapsed, key_bytes=None):
+        """
+        Records a call moving nbytes in total. For batched calls, key_bytes
+        gives the bytes moved for each of the keys, otherwise the total is
+        spread evenly across them. Time is always spread evenly.
+        """
+        elapsed_us = elapsed * 1000000
+        bucket = 0 if elapsed_us < 1 else int(log2(elapsed_us)) + 1
+
+        with self._lock:
+            op_stats = self.ops.setdefault(op, {"count": 0, "bytes": 0, "time": 0.0, "histogram": dict()})
+            op_stats["count"] += 1
+            op_stats["bytes"] += nbytes
+            op_stats["time"] += elapsed
+            op_stats["histogram"][bucket] = op_stats["histogram"].get(bucket, 0) + 1
+
+            if key_bytes is None:
+                key_bytes = [nbytes // len(keys)] * len(keys) if keys else []
+
+            for key, key_nbytes in zip(keys, key_bytes):
+                key_stats = self.keys.setdefault(key, {"count": 0, "bytes": 0, "time": 0.0})
+                key_stats["count"] += 1
+                key_stats["bytes"] += key_nbytes
+                key_stats["time"] += elapsed / len(keys)
+
+    def snapshot(self):
+        with self._lock:
+            ops = dict()
+            for op, op_stats in self.ops.items():
+                # Histogram buckets are labelled with their upper bound in us
+                histogram = {
+                    "<{}us".format(2 ** bucket): count
+                    for bucket, count in sorted(op_stats["histogram"].items())
+                }
+                ops[op] = {
+                    "count": op_stats["count"],
+                    "bytes": op_stats["bytes"],
+                    "time": op_stats["time"],
+                    "histogram": histogram,
+                }
+
+            return {
+                "ops": ops,
+                "keys": {key: dict(key_stats) for key, key_stats in self.keys.items()},
+                "total_time": sum(op_stats["time"] for op_stats in self.ops.values()),
+            }
+
+    def to_json(self):
+        # Imported here as json is slow to import and only needed for export
+        import json
+
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+
+class InstrumentedBackend(StateBackend):
+    """
+    Wraps another backend, recording stats on every call made through it
+    """
+
+    def __init__(self, backend, stats=None):
+        self.backend = backend
+        self.stats = stats or CallStats()
+
+    def _record(self, op, keys, nbytes, start):
+        self.stats.record(op, keys, nbytes, perf_counter() - start)
+
+    def _record_many(self, op, key_sizes, start):
+        # Records a batched call given the bytes moved for each key
+        keys = [key for key, _ in key_sizes]
+        key_bytes = [nbytes for _, nbytes in key_sizes]
+        self.stats.record(op, keys, sum(key_bytes), perf_counter() - start, key_bytes=key_bytes)
+
+    def get_input(self):
+        start = perf_counter()
+        value = self.backend.get_input()
+        self._record("get_input", [], _nbytes(value), start)
+        return value
+
+    def set_output(self, output):
+        start = perf_counter()
+        self.backend.set_output(output)
+        self._record("set_output", [], _nbytes(output), start)
+
+    def get_input_size(self):
+        start = perf_counter()
+        value = self.backend.get_input_size()
+        self._record("get_input_size", [], 0, start)
+        return value
+
+    def read_input_into(self, buffer):
+        start = perf_counter()
+        n_bytes = self.backend.read_input_into(buffer)
+        self._record("read_input_into", [], n_bytes, start)
+        return n_bytes
+
+    def get_state_size(self, key):
+        start = perf_counter()
+        value = self.backend.get_state_size(key)
+        self._record("get_state_size", [key], 0, start)
+        return value
+
+    def get_state(self, key, state_len):
+        start = perf_counter()
+        value = self.backend.get_state(key, state_len)
+        self._record("get_state", [key], state_len, start)
+        return value
+
+    def get_state_offset(self, key, total_len, offset, offset_len):
+        start = perf_counter()
+        value = self.backend.get_state_offset(key, total_len, offset, offset_len)
+        self._record("get_state_offset", [key], offset_len, start)
+        return value
+
+    def get_state_view(self, key, state_len):
+        start = perf_counter()
+        value = self.backend.get_state_view(key, state_len)
+        self._record("get_state_view", [key], state_len, start)
+        return value
+
+    def get_state_offset_view(self, key, total_len, offset, offset_len):
+        start = perf_counter()
+        value = self.backend.get_state_offset_view(key, total_len, offset, offset_len)
+        self._record("get_state_offset_view", [key], offset_len, start)
+        return value
+
+    def set_state(self, key, value):
+        start = perf_counter()
+        self.backend.set_state(key, value)
+        self._record("set_state", [key], _nbytes(value), start)
+
+    def set_state_offset(self, key, total_len, offset, value):
+        start = perf_counter()
+        self.backend.set_state_offset(key, total_len, offset, value)
+        self._record("set_state_offset", [key], _nbytes(value), start)
+
+    def push_state(self, key):
+        start = perf_counter()
+        self.backend.push_state(key)
+        self._record("push_state", [key], 0, start)
+
+    def push_state_partial(self, key):
+        start = perf_counter()
+        self.backend.push_state_partial(key)
+        self._record("push_state_partial", [key], 0, start)
+
+    def pull_state(self, key, state_len):
+        start = perf_counter()
+        self.backend.pull_state(key, state_len)
+        self._record("pull_state", [key], state_len, start)
+
+    def pull_state_offset(self, key, total_len, offset, offset_len):
+        start = perf_counter()
+        self.backend.pull_state_offset(key, total_len, offset, offset_len)
+        self._record("pull_state_offset", [key], offset_len, start)
+
+    def get_state_many(self, key_lens):
+        start = perf_counter()
+        values = self.backend.get_state_many(key_lens)
+        self._record_many("get_state_many", key_lens, start)
+        return values
+
+    def get_state_offset_many(self, key, total_len, ranges):
+        start = perf_counter()
+        values = self.backend.get_state_offset_many(key, total_len, ranges)
+        self._record("get_state_offset_many", [key], sum(n for _, n in ranges), start)
+        return values
+
+    def set_state_many(self, items):
+        start = perf_counter()
+        self.backend.set_state_many(items)
+        self._record_many("set_state_many", [(k, _nbytes(v)) for k, v in items], start)
+
+    def set_state_offset_many(self, key, total_len, writes):
+        start = perf_counter()
+        self.backend.set_state_offset_many(key, total_len, writes)
+        self._record("set_state_offset_many", [key], sum(_nbytes(v) for _, v in writes), start)
+
+    def push_state_many(self, keys):
+        start = perf_counter()
+        self.backend.push_state_many(keys)
+        self._record("push_state_many", list(keys), 0, start)
+
+    def pull_state_many(self, key_lens):
+        start = perf_counter()
+        self.backend.pull_state_many(key_lens)
+        self._record_many("pull_state_many", key_lens, start)
+
+    def pull_state_offset_many(self, key, total_len, ranges):
+        start = perf_counter()
+        self.backend.pull_state_offset_many(key, total_len, ranges)
+        self._record("pull_state_offset_many", [key], sum(n for _, n in ranges), start)
+
+    def chain_call(self, func, input_data):
+        timed_func, nested_time = _time_nested_runs(func)
+        start = perf_counter()
+        call_id = self.backend.chain_call(timed_func, input_data)
+        self._record("chain_call", [], _nbytes(input_data), start + nested_time[0])
+        return call_id
+
+    def await_call(self, call_id):
+        start = perf_counter()
+        result = self.backend.await_call(call_id)
+        self._record("await_call", [], 0, start)
+        return result
+
+    def chain_call_many(self, func, inputs):
+        timed_func, nested_time = _time_nested_runs(func)
+        start = perf_counter()
+        call_ids = self.backend.chain_call_many(timed_func, inputs)
+        self._record("chain_call_many", [], sum(_nbytes(i) for i in inputs), start + nested_time[0])
+        return call_ids
+
+    def await_call_many(self, call_ids):
+        start = perf_counter()
+        results = self.backend.await_call_many(call_ids)
+        self._record("await_call_many", [], 0, start)
+        return results
+
+    def set_emulator_message(self, message_json):
+        return self.backend.set_emulator_message(message_json)
+
+    def set_emulator_status(self, success):
+        self.backend.set_emulator_status(success)
+
+    def get_emulator_async_response(self):
+        return self.backend.get_emulator_async_response()
@@ -0,0 +1,98 @@
+import io
+
+
+class InputStream(io.RawIOBase):
+    """
+    Read-only file-like access to the function input. Reads are served
+    straight from the input, so readinto copies each chunk once, and readview
+    returns chunks without copying at all.
+    """
+
+    def __init__(self, input_data):
+        super().__init__()
+        self._data = memoryview(input_data).cast("B")
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = len(self._data) + offset
+        else:
+            raise ValueError("Invalid whence {}".format(whence))
+
+        if pos < 0:
+            raise ValueError("Negative seek position {}".format(pos))
+
+        self._pos = pos
+        return self._pos
+
+    def readinto(self, buffer):
+        out = memoryview(buffer).cast("B")
+        n_bytes = max(0, min(len(out), len(self._data) - self._pos))
+        out[:n_bytes] = self._data[self._pos:self._pos + n_bytes]
+        self._pos += n_bytes
+        return n_bytes
+
+    def readview(self, size=-1):
+        """
+        Returns a memoryview of up to size bytes of the input (or the rest of
+        it) without copying
+        """
+        end = len(self._data) if size is None or size < 0 else min(len(self._data), self._pos + size)
+        view = self._data[self._pos:max(self._pos, end)]
+        self._pos += len(view)
+        return view
+
+
+class OutputWriter(io.RawIOBase):
+    """
+    Write-only file-like object that builds up the function output in chunks,
+    setting it when closed. If the size of the output is known up front, the
+    buffer is allocated once and each chunk is written straight into place.
+    """
+
+    def __init__(self, set_output_func, size=None):
+        super().__init__()
+        self._set_output = set_output_func
+        self._buffer = bytearray(size or 0)
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("Write to closed output writer")
+
+        data = memoryview(data).cast("B")
+        end = self._pos + len(data)
+        if end > len(self._buffer):
+            # Replaces the unwritten tail, growing the buffer
+            self._buffer[self._pos:] = data
+        else:
+            self._buffer[self._pos:end] = data
+
+        self._pos = end
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            with memoryview(self._buffer) as view:
+                self._set_output(view[:self._pos])
+
+        super().close()
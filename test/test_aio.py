@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import unittest
+
+from pyfaasm import core
+from pyfaasm.aio import chain_async, await_call_async, gather_calls
+from pyfaasm.backend import LocalBackend
+from pyfaasm.core import set_backend, set_local_chaining, set_local_chaining_pool, set_call_memoisation, \
+    disable_call_memoisation, get_call_memoisation_stats
+
+
+def _return_input_len(input_bytes):
+    return len(input_bytes)
+
+
+def _succeed(input_bytes):
+    return 0
+
+
+def _raise_error(input_bytes):
+    raise ValueError("Chained error")
+
+
+async def _chain_and_gather(n_calls):
+    call_ids = [await chain_async(_return_input_len, bytes(i)) for i in range(n_calls)]
+    return await gather_calls(call_ids)
+
+
+async def _chain_and_await_error():
+    call_id = await chain_async(_raise_error, b'')
+    return await await_call_async(call_id)
+
+
+async def _chain_and_await_each(func, n_calls):
+    # Awaits each call before chaining the next, so later calls can be memoised
+    results = list()
+    for _ in range(n_calls):
+        call_id = await chain_async(func, b'1')
+        results.append(await await_call_async(call_id))
+
+    return results
+
+
+class BatchRecordingBackend(LocalBackend):
+    """
+    Records the size of each batch of awaits and the threads they're made from
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.batch_sizes = list()
+        self.await_threads = set()
+
+    def await_call_many(self, call_ids):
+        self.batch_sizes.append(len(call_ids))
+        self.await_threads.add(threading.current_thread().name)
+        return super().await_call_many(call_ids)
+
+
+async def _chain_and_await_concurrently(n_calls):
+    call_ids = [await chain_async(_return_input_len, bytes(i)) for i in range(n_calls)]
+    return list(await asyncio.gather(*[await_call_async(call_id) for call_id in call_ids]))
+
+
+class TestAio(unittest.TestCase):
+    def setUp(self):
+        self.original_backend = core.backend
+        self.original_local_chaining = core.PYTHON_LOCAL_CHAINING
+        set_backend(LocalBackend())
+        set_local_chaining(True)
+
+    def tearDown(self):
+        disable_call_memoisation()
+        set_local_chaining_pool(None)
+        set_local_chaining(self.original_local_chaining)
+        set_backend(self.original_backend)
+
+    def test_gather_with_pool(self):
+        set_local_chaining_pool("thread", 4)
+
+        actual = asyncio.run(_chain_and_gather(20))
+        self.assertEqual(list(range(20)), actual)
+
+        with self.assertRaises(ValueError):
+            asyncio.run(_chain_and_await_error())
+
+    def test_gather_without_pool(self):
+        actual = asyncio.run(_chain_and_gather(5))
+        self.assertEqual([0] * 5, actual)
+
+    def test_gather_with_backend_chaining(self):
+        set_local_chaining(False)
+
+        actual = asyncio.run(_chain_and_gather(5))
+        self.assertEqual(list(range(5)), actual)
+
+    def test_awaits_batched_with_backend_chaining(self):
+        backend = BatchRecordingBackend()
+        set_backend(backend)
+        set_local_chaining(False)
+
+        # Gathered calls are awaited in one batch
+        actual = asyncio.run(_chain_and_gather(200))
+        self.assertEqual(list(range(200)), actual)
+        self.assertEqual([200], backend.batch_sizes)
+
+        # Concurrent awaits are batched, and all made from the same thread
+        n_threads = threading.active_count()
+        actual = asyncio.run(_chain_and_await_concurrently(200))
+        self.assertEqual(list(range(200)), actual)
+        self.assertEqual(200, sum(backend.batch_sizes[1:]))
+        self.assertLess(len(backend.batch_sizes), 200)
+        self.assertEqual({"pyfaasm-await"}, backend.await_threads)
+        self.assertEqual(n_threads, threading.active_count())
+
+    def test_memoised_calls(self):
+        for pool_type in [None, "thread"]:
+            set_local_chaining_pool(pool_type)
+            disable_call_memoisation()
+            set_call_memoisation(_succeed)
+
+            self.assertEqual([0, 0, 0], asyncio.run(_chain_and_await_each(_succeed, 3)))
+
+            stats = get_call_memoisation_stats()
+            self.assertEqual(1, stats["misses"])
+            self.assertEqual(2, stats["hits"])
+            self.assertEqual(0, stats["pending"])
+            self.assertFalse(core.call_memo.memoised_calls)
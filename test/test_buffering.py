@@ -0,0 +1,82 @@
+import unittest
+
+from pyfaasm import core
+from pyfaasm.backend import LocalBackend
+from pyfaasm.buffering import merge_writes
+from pyfaasm.core import set_backend, set_write_buffering, flush_state, get_write_buffer_stats, get_state, \
+    set_state, set_state_offset, push_state_partial
+
+
+class CountingBackend(LocalBackend):
+    def __init__(self):
+        super().__init__()
+        self.offset_writes = list()
+
+    def set_state_offset(self, key, total_len, offset, value):
+        self.offset_writes.append((offset, bytes(value)))
+        super().set_state_offset(key, total_len, offset, value)
+
+
+class TestBuffering(unittest.TestCase):
+    def setUp(self):
+        self.original_backend = core.backend
+        self.backend = CountingBackend()
+        set_backend(self.backend)
+        set_write_buffering(True)
+
+    def tearDown(self):
+        set_write_buffering(False)
+        set_backend(self.original_backend)
+
+    def test_merge_writes(self):
+        writes = [
+            (10, b'ccc'),
+            (0, b'aa'),
+            (2, b'bb'),
+            (11, b'X'),
+            (20, b'dd'),
+            (1, b'YY'),
+        ]
+
+        expected = [
+            (0, bytearray(b'aYYb')),
+            (10, bytearray(b'cXc')),
+            (20, bytearray(b'dd')),
+        ]
+        self.assertEqual(expected, merge_writes(writes))
+        self.assertEqual([], merge_writes([]))
+
+    def test_writes_coalesced_on_push(self):
+        key = "bufferA"
+        set_state(key, bytes(10))
+
+        for i in range(0, 5):
+            set_state_offset(key, 10, i, bytes([i + 1]))
+        set_state_offset(key, 10, 8, b'z')
+
+        # Nothing written until pushed
+        self.assertEqual([], self.backend.offset_writes)
+
+        push_state_partial(key)
+        self.assertEqual([(0, b'\x01\x02\x03\x04\x05'), (8, b'z')], self.backend.offset_writes)
+
+        stats = get_write_buffer_stats()
+        self.assertEqual(6, stats["writes"])
+        self.assertEqual(2, stats["flushed_writes"])
+        self.assertEqual(0, stats["pending_keys"])
+
+    def test_reads_see_buffered_writes(self):
+        key = "bufferB"
+        set_state(key, b'0000')
+        set_state_offset(key, 4, 1, b'11')
+
+        self.assertEqual(b'0110', get_state(key, 4))
+
+    def test_full_write_discards_buffered_writes(self):
+        key = "bufferC"
+        set_state_offset(key, 4, 0, b'11')
+        set_state(key, b'2222')
+        flush_state()
+
+        self.assertEqual([], self.backend.offset_writes)
+        self.assertEqual(b'2222', get_state(key, 4))
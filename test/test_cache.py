@@ -0,0 +1,125 @@
+import unittest
+
+from pyfaasm import core
+from pyfaasm.backend import LocalBackend
+from pyfaasm.cache import StateCache
+from pyfaasm.core import set_backend, enable_state_cache, disable_state_cache, \
+    get_state_cache_stats, get_state, get_state_offset, get_state_many, set_state, set_state_offset, pull_state
+
+
+class CountingBackend(LocalBackend):
+    def __init__(self):
+        super().__init__()
+        self.n_reads = 0
+        self.n_pulls = 0
+
+    def get_state(self, key, state_len):
+        self.n_reads += 1
+        return super().get_state(key, state_len)
+
+    def get_state_offset(self, key, total_len, offset, offset_len):
+        self.n_reads += 1
+        return super().get_state_offset(key, total_len, offset, offset_len)
+
+    def pull_state(self, key, state_len):
+        self.n_pulls += 1
+        super().pull_state(key, state_len)
+
+
+class TestStateCache(unittest.TestCase):
+    def setUp(self):
+        self.original_backend = core.backend
+        self.backend = CountingBackend()
+        set_backend(self.backend)
+        enable_state_cache(1024)
+
+    def tearDown(self):
+        disable_state_cache()
+        set_backend(self.original_backend)
+
+    def test_repeated_reads_hit_cache(self):
+        set_state("cacheA", b'0123456789')
+
+        for _ in range(5):
+            self.assertEqual(b'0123456789', get_state("cacheA", 10))
+            self.assertEqual(b'234', get_state_offset("cacheA", 10, 2, 3))
+
+        self.assertEqual(2, self.backend.n_reads)
+
+        stats = get_state_cache_stats()
+        self.assertEqual(8, stats["hits"])
+        self.assertEqual(2, stats["misses"])
+        self.assertEqual(13, stats["bytes"])
+
+    def test_writes_invalidate(self):
+        set_state("cacheB", b'aaaa')
+        self.assertEqual(b'aaaa', get_state("cacheB", 4))
+
+        set_state("cacheB", b'bbbb')
+        self.assertEqual(b'bbbb', get_state("cacheB", 4))
+
+        set_state_offset("cacheB", 4, 1, b'cc')
+        self.assertEqual(b'bccb', get_state("cacheB", 4))
+
+    def test_batched_reads_only_fetch_misses(self):
+        set_state("cacheC", b'cc')
+        set_state("cacheD", b'dd')
+        get_state("cacheC", 2)
+
+        actual = get_state_many([("cacheC", 2), ("cacheD", 2)])
+        self.assertEqual([b'cc', b'dd'], actual)
+        self.assertEqual(1, get_state_cache_stats()["hits"])
+
+    def test_pulls_invalidate(self):
+        set_state("cacheE", b'eeee')
+        self.assertEqual(b'eeee', get_state("cacheE", 4))
+
+        # Change the value behind the cache's back, then pull it
+        self.backend.set_state("cacheE", b'ffff')
+        self.assertEqual(b'eeee', get_state("cacheE", 4))
+
+        for _ in range(3):
+            pull_state("cacheE", 4)
+
+        self.assertEqual(3, self.backend.n_pulls)
+        self.assertEqual(b'ffff', get_state("cacheE", 4))
+
+    def test_invalidate_key(self):
+        cache = StateCache(20)
+        cache.put("a", None, 4, b'aaaa')
+        cache.put("a", 1, 2, b'aa')
+        cache.put("b", None, 4, b'bbbb')
+
+        cache.invalidate("a")
+        self.assertIsNone(cache.get("a", None, 4))
+        self.assertIsNone(cache.get("a", 1, 2))
+        self.assertEqual(b'bbbb', cache.get("b", None, 4))
+        self.assertEqual(4, cache.get_stats()["bytes"])
+        self.assertEqual({"b"}, set(cache.key_index))
+
+        # Evicted entries are dropped from the index
+        cache.put("c", None, 20, bytes(20))
+        self.assertEqual({"c"}, set(cache.key_index))
+
+        cache.invalidate()
+        self.assertEqual(0, cache.get_stats()["entries"])
+        self.assertEqual({}, cache.key_index)
+
+    def test_lru_eviction(self):
+        cache = StateCache(10)
+        cache.put("a", None, 4, b'aaaa')
+        cache.put("b", None, 4, b'bbbb')
+
+        # Use a so that b is least recently used
+        self.assertEqual(b'aaaa', cache.get("a", None, 4))
+        cache.put("c", None, 4, b'cccc')
+
+        self.assertIsNone(cache.get("b", None, 4))
+        self.assertEqual(b'aaaa', cache.get("a", None, 4))
+        self.assertEqual(b'cccc', cache.get("c", None, 4))
+        self.assertEqual(1, cache.get_stats()["evictions"])
+        self.assertEqual(8, cache.get_stats()["bytes"])
+
+        # Values bigger than the budget aren't cached
+        cache.put("d", None, 11, bytes(11))
+        self.assertIsNone(cache.get("d", None, 11))
@@ -0,0 +1,159 @@
+import unittest
+
+import numpy as np
+from parameterized import parameterized
+
+from pyfaasm import core
+from pyfaasm.backend import LocalBackend
+from pyfaasm.compression import COMPRESSION_HEADER, compress_value, decompress_value
+from pyfaasm.config import RESULT_MATRIX_KEY
+from pyfaasm.core import set_backend, set_state_compression, disable_state_compression, \
+    get_state_compression_stats, get_state, get_state_offset, get_state_many, get_state_view, set_state, \
+    set_state_offset, set_state_many, push_state, pull_state, pull_state_many, remove_state_compression, \
+    set_local_chaining
+from pyfaasm.matrix import write_matrix_params_to_state, load_matrix_conf_from_state, random_matrix, \
+    subdivide_matrix_into_state, divide_and_conquer, SUBMATRICES_KEY_A, SUBMATRICES_KEY_B
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        self.original_backend = core.backend
+        self.original_local_chaining = core.PYTHON_LOCAL_CHAINING
+        self.backend = LocalBackend()
+        set_backend(self.backend)
+
+    def tearDown(self):
+        remove_state_compression()
+        set_backend(self.original_backend)
+        set_local_chaining(self.original_local_chaining)
+
+    @parameterized.expand([
+        ("zlib",), ("bz2",), ("lzma",),
+    ])
+    def test_codecs(self, codec):
+        value = bytes(1000) + b"abc"
+        data, used_codec = compress_value(value, codec)
+        self.assertEqual(codec, used_codec)
+        self.assertLess(len(data), len(value))
+        self.assertEqual(value, decompress_value(data))
+
+    def test_incompressible_stored_raw(self):
+        value = np.random.bytes(1000)
+        data, used_codec = compress_value(value, "zlib")
+        self.assertEqual("none", used_codec)
+        self.assertEqual(COMPRESSION_HEADER.size + len(value), len(data))
+        self.assertEqual(value, decompress_value(data))
+
+        # Values with no header aren't decompressed
+        self.assertIsNone(decompress_value(value))
+
+    def test_compressed_round_trip(self):
+        set_state_compression("comp", prefix=True, min_size=100)
+
+        mat = np.zeros((64, 64), dtype=np.float32)
+        mat[3, 5] = 1.5
+        set_state("compA", mat)
+        push_state("compA")
+
+        # Stored compressed
+        self.assertLess(len(self.backend.state["compA"]), mat.nbytes)
+
+        pull_state("compA", mat.nbytes)
+        actual = np.frombuffer(get_state("compA", mat.nbytes), dtype=np.float32).reshape(64, 64)
+        np.testing.assert_array_equal(mat, actual)
+
+        # Offset reads decompress the whole value
+        self.assertEqual(mat[0, :4].tobytes(), get_state_offset("compA", mat.nbytes, 0, 16))
+
+        # Below the threshold, stored uncompressed but with a header
+        set_state("compB", bytes(10))
+        self.assertEqual(COMPRESSION_HEADER.size + 10, len(self.backend.state["compB"]))
+        self.assertEqual(bytes(10), get_state("compB", 10))
+
+        stats = get_state_compression_stats()
+        self.assertEqual(1, stats["compressed"])
+        self.assertEqual(1, stats["uncompressed"])
+        self.assertGreater(stats["ratio"], 1)
+
+    def test_policy_by_key_and_prefix(self):
+        set_state_compression("compressed_", prefix=True, min_size=0)
+        set_state_compression("compressed_raw", codec="none")
+
+        set_state_many([
+            ("compressed_a", bytes(500)),
+            ("compressed_raw", bytes(500)),
+            ("plain", bytes(500)),
+        ])
+        pull_state_many([("compressed_a", 500), ("plain", 500)])
+
+        self.assertLess(len(self.backend.state["compressed_a"]), 500)
+        self.assertEqual(500 + COMPRESSION_HEADER.size, len(self.backend.state["compressed_raw"]))
+        self.assertEqual(500, len(self.backend.state["plain"]))
+
+        actual = get_state_many([("compressed_a", 500), ("compressed_raw", 500), ("plain", 500)])
+        self.assertEqual([bytes(500)] * 3, actual)
+
+    def test_value_written_before_policy(self):
+        set_state("compC", b"0123456789")
+        set_state_compression("compC")
+        self.assertEqual(b"0123456789", get_state("compC", 10))
+
+    def test_partial_writes_not_allowed(self):
+        set_state_compression("compD")
+        set_state("compD", bytes(2000))
+
+        with self.assertRaises(ValueError):
+            set_state_offset("compD", 2000, 0, b"123")
+
+        with self.assertRaises(ValueError):
+            get_state_view("compD", 2000)
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            set_state_compression("compE", codec="foo")
+
+    def test_disable_compression(self):
+        set_state_compression("compF", min_size=0)
+        set_state("compF", bytes(500))
+        self.assertLess(len(self.backend.state["compF"]), 500)
+
+        # Values already compressed can still be read, new ones are raw
+        disable_state_compression()
+        self.assertEqual(bytes(500), get_state("compF", 500))
+
+        set_state("compG", bytes(500))
+        set_state("compF", b"1" * 500)
+        self.assertEqual(b"1" * 500, bytes(self.backend.state["compF"]))
+        self.assertEqual(b"1" * 500, get_state("compF", 500))
+
+        # Re-enabled by setting a policy
+        set_state_compression("compG", min_size=0)
+        set_state("compG", bytes(500))
+        self.assertLess(len(self.backend.state["compG"]), 500)
+
+    @parameterized.expand([
+        (2, 0, False), (2, 0, True), (2, 1, False),
+    ])
+    def test_compressed_operands(self, n_splits, strassen_levels, tiled):
+        set_local_chaining(True)
+
+        # Operands of the original matrices and of Strassen nodes
+        for prefix in ["mat_", "strassen_"]:
+            set_state_compression(prefix, prefix=True, min_size=0)
+
+        write_matrix_params_to_state(128, n_splits, strassen_levels, tiled=tiled)
+        conf = load_matrix_conf_from_state()
+
+        mat_a = random_matrix(conf.matrix_size)
+        mat_b = random_matrix(conf.matrix_size)
+        mat_a[:64] = 0
+        subdivide_matrix_into_state(conf, mat_a, SUBMATRICES_KEY_A)
+        subdivide_matrix_into_state(conf, mat_b, SUBMATRICES_KEY_B)
+
+        divide_and_conquer()
+
+        actual_bytes = get_state(RESULT_MATRIX_KEY, conf.bytes_per_matrix)
+        actual = np.frombuffer(actual_bytes, dtype=np.float32).reshape(conf.matrix_size, conf.matrix_size)
+        np.testing.assert_allclose(actual, np.dot(mat_a, mat_b), rtol=1e-4, atol=1e-4)
+
+        self.assertGreater(get_state_compression_stats()["compressed"], 0)
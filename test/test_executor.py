@@ -0,0 +1,119 @@
+import unittest
+
+import numpy as np
+from parameterized import parameterized
+
+from pyfaasm import core
+from pyfaasm.backend import LocalBackend
+from pyfaasm.config import RESULT_MATRIX_KEY
+from pyfaasm.core import set_backend, set_local_chaining, set_local_chaining_pool, chain_this_with_input, \
+    await_call, chain_many, await_all, get_state
+from pyfaasm.matrix import subdivide_matrix_into_state, divide_and_conquer, write_matrix_params_to_state, \
+    load_matrix_conf_from_state, SUBMATRICES_KEY_A, SUBMATRICES_KEY_B, random_matrix
+
+
+def _return_input_len(input_bytes):
+    return len(input_bytes)
+
+
+def _raise_error(input_bytes):
+    raise ValueError("Chained error")
+
+
+def _chain_children(input_bytes):
+    # Chains and awaits more calls, checking nested awaits don't deadlock
+    n_children = input_bytes[0]
+    call_ids = [chain_this_with_input(_return_input_len, bytes(i)) for i in range(n_children)]
+    return sum(await_call(call_id) for call_id in call_ids)
+
+
+def _count_children(input_bytes):
+    # Chains and awaits more calls, counting the ones that succeed
+    n_children = input_bytes[0]
+    call_ids = [chain_this_with_input(_return_input_len, bytes(i)) for i in range(n_children)]
+    return sum(1 for call_id in call_ids if await_call(call_id) == 0)
+
+
+class TestExecutor(unittest.TestCase):
+    def setUp(self):
+        self.original_backend = core.backend
+        self.original_local_chaining = core.PYTHON_LOCAL_CHAINING
+        set_backend(LocalBackend())
+        set_local_chaining(True)
+
+    def tearDown(self):
+        set_local_chaining_pool(None)
+        set_local_chaining(self.original_local_chaining)
+        set_backend(self.original_backend)
+
+    def check_return_codes(self):
+        call_ids = [chain_this_with_input(_return_input_len, bytes(i)) for i in range(10)]
+        self.assertEqual(len(set(call_ids)), 10)
+        for call_id in call_ids:
+            self.assertGreater(call_id, 0)
+
+        actual = [await_call(call_id) for call_id in call_ids]
+        self.assertEqual(list(range(10)), actual)
+
+        call_id = chain_this_with_input(_raise_error, b'')
+        with self.assertRaises(ValueError):
+            await_call(call_id)
+
+    def test_thread_pool(self):
+        set_local_chaining_pool("thread", 4)
+        self.check_return_codes()
+
+    def test_process_pool(self):
+        set_local_chaining_pool("process", 2)
+        self.check_return_codes()
+
+    def test_nested_chaining_with_small_pool(self):
+        set_local_chaining_pool("thread", 2)
+
+        call_ids = [chain_this_with_input(_chain_children, bytes([5])) for _ in range(4)]
+        actual = [await_call(call_id) for call_id in call_ids]
+
+        self.assertEqual([10, 10, 10, 10], actual)
+
+    def test_nested_chaining_with_process_pool(self):
+        set_local_chaining_pool("process", 2)
+
+        # Children are run directly in the worker rather than on a nested pool
+        # (which would stop the worker exiting)
+        call_ids = [chain_this_with_input(_count_children, bytes([5])) for _ in range(2)]
+        actual = [await_call(call_id) for call_id in call_ids]
+
+        self.assertEqual([5, 5], actual)
+        set_local_chaining_pool(None)
+
+    def test_chain_many(self):
+        set_local_chaining_pool("thread", 4)
+
+        call_ids = chain_many(_return_input_len, [bytes(i) for i in range(10)])
+        self.assertEqual(list(range(10)), await_all(call_ids))
+
+    def test_invalid_pool_type(self):
+        set_local_chaining_pool("foo")
+        with self.assertRaises(ValueError):
+            chain_this_with_input(_return_input_len, b'')
+
+    @parameterized.expand([
+        (False,), (True,),
+    ])
+    def test_distributed_multiplication_with_thread_pool(self, in_place):
+        set_local_chaining_pool("thread", 4)
+
+        write_matrix_params_to_state(256, 2, in_place=in_place)
+        conf = load_matrix_conf_from_state()
+
+        mat_a = random_matrix(conf.matrix_size)
+        mat_b = random_matrix(conf.matrix_size)
+        subdivide_matrix_into_state(conf, mat_a, SUBMATRICES_KEY_A)
+        subdivide_matrix_into_state(conf, mat_b, SUBMATRICES_KEY_B)
+
+        divide_and_conquer()
+
+        actual_bytes = get_state(RESULT_MATRIX_KEY, conf.bytes_per_matrix)
+        actual = np.frombuffer(actual_bytes, dtype=np.float32).reshape(conf.matrix_size, conf.matrix_size)
+
+        np.testing.assert_allclose(actual, np.dot(mat_a, mat_b), rtol=1e-5)
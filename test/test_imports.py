@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# Prints which of the slow optional modules have been loaded after the
+# given imports
+_CHECK_IMPORTS = """
+import sys
+{}
+
+print(json.dumps({{
+    "numpy": any(m.startswith("numpy.") for m in sys.modules),
+    "futures": "concurrent.futures" in sys.modules,
+}}))
+"""
+
+
+def _get_loaded_modules(imports):
+    code = _CHECK_IMPORTS.format(imports + "\nimport json")
+    env = dict(os.environ, PYTHON_LOCAL_STATE="1")
+    output = subprocess.check_output([sys.executable, "-c", code], env=env)
+    return json.loads(output.decode("utf-8").splitlines()[-1])
+
+
+class TestImports(unittest.TestCase):
+    def test_import_pyfaasm_is_lazy(self):
+        loaded = _get_loaded_modules("import pyfaasm")
+        self.assertEqual({"numpy": False, "futures": False}, loaded)
+
+    def test_importing_matrix_defers_numpy(self):
+        loaded = _get_loaded_modules("import pyfaasm.core, pyfaasm.objects, pyfaasm.matrix, pyfaasm.matrix_data")
+        self.assertEqual({"numpy": False, "futures": False}, loaded)
+
+    def test_numpy_loaded_on_use(self):
+        loaded = _get_loaded_modules("from pyfaasm.matrix import random_matrix\nrandom_matrix(4)")
+        self.assertTrue(loaded["numpy"])
+
+    def test_submodule_attribute_access(self):
+        import pyfaasm
+
+        self.assertEqual("result_matrix", pyfaasm.config.RESULT_MATRIX_KEY)
+        self.assertIn("core", dir(pyfaasm))
+
+        with self.assertRaises(AttributeError):
+            pyfaasm.not_a_module
@@ -0,0 +1,646 @@
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+from parameterized import parameterized
+
+from pyfaasm.backend import LocalBackend
+from pyfaasm.config import (
+    RESULT_MATRIX_KEY,
+    RESULT_ACCUMULATE_KEY,
+    MatrixConf,
+    MatrixCostModel,
+)
+from pyfaasm import core, matrix
+from pyfaasm.core import (
+    set_backend,
+    set_local_chaining,
+    get_state,
+    set_state,
+    get_state_offset,
+    set_state_offset,
+    get_state_size,
+    get_state_view,
+    push_state,
+    pull_state,
+    chain_this_with_input,
+    await_call,
+    chain_many,
+    await_all,
+    set_emulator_message,
+    set_emulator_status,
+    get_emulator_async_response,
+)
+from pyfaasm.matrix import (
+    subdivide_matrix_into_state,
+    divide_and_conquer,
+    write_matrix_params_to_state,
+    load_matrix_conf_from_state,
+    SUBMATRICES_KEY_A,
+    SUBMATRICES_KEY_B,
+    random_matrix,
+    reconstruct_matrix_from_submatrices,
+    read_input_submatrix,
+    read_input_submatrices,
+    calibrate_cost_model,
+    read_occupancy,
+)
+
+chained_inputs = []
+
+
+def _chained_func(input_bytes):
+    chained_inputs.append(input_bytes)
+    return len(input_bytes)
+
+
+def _block_sparse_matrix(conf, occupancy):
+    # Random matrix with only the given submatrices non-zero
+    sm_size = conf.get_submatrix_size(conf.n_splits)
+    mask = np.kron(occupancy, np.ones((sm_size, sm_size)))
+    return (random_matrix(conf.matrix_size) * mask).astype(np.float32)
+
+
+class TestLocalBackend(unittest.TestCase):
+    def setUp(self):
+        self.original_backend = core.backend
+        self.original_local_chaining = core.PYTHON_LOCAL_CHAINING
+        self.backend = LocalBackend()
+        set_backend(self.backend)
+
+    def tearDown(self):
+        set_backend(self.original_backend)
+        set_local_chaining(self.original_local_chaining)
+
+    def test_state_read_write(self):
+        key = "localStateTest"
+        set_state(key, b'0123456789')
+        push_state(key)
+
+        value_len = get_state_size(key)
+        self.assertEqual(10, value_len)
+
+        pull_state(key, value_len)
+        self.assertEqual(b'0123456789', get_state(key, value_len))
+
+        set_state_offset(key, value_len, 2, b'999')
+        self.assertEqual(b'0199956789', get_state(key, value_len))
+        self.assertEqual(b'999', get_state_offset(key, value_len, 2, 3))
+
+    def test_emulator(self):
+        self.assertGreater(
+            set_emulator_message('{"user": "foo", "function": "bar"}'), 0
+        )
+        set_emulator_status(True)
+        self.assertIsNone(get_emulator_async_response())
+
+    def test_missing_state_is_created(self):
+        self.assertEqual(0, get_state_size("localMissing"))
+        self.assertEqual(bytes(4), get_state("localMissing", 4))
+        self.assertEqual(4, get_state_size("localMissing"))
+
+    def test_views_see_updates(self):
+        key = "localViewTest"
+        set_state(key, b'abcd')
+        view = get_state_view(key, 4)
+
+        set_state(key, b'wxyz')
+        self.assertEqual(b'wxyz', bytes(view))
+
+    def test_chaining(self):
+        set_local_chaining(False)
+        del chained_inputs[:]
+
+        call_id = chain_this_with_input(_chained_func, b'123')
+        self.assertGreater(call_id, 0)
+        self.assertEqual([b'123'], chained_inputs)
+        self.assertEqual(3, await_call(call_id))
+
+    def test_chain_many(self):
+        set_local_chaining(False)
+        del chained_inputs[:]
+
+        inputs = [b'1', b'22', b'333']
+        call_ids = chain_many(_chained_func, inputs)
+        self.assertEqual(3, len(set(call_ids)))
+        self.assertEqual(inputs, chained_inputs)
+        self.assertEqual([1, 2, 3], await_all(call_ids))
+
+    def test_distributed_multiplication(self):
+        set_local_chaining(True)
+
+        write_matrix_params_to_state(256, 2)
+        conf = load_matrix_conf_from_state()
+
+        mat_a = random_matrix(conf.matrix_size)
+        mat_b = random_matrix(conf.matrix_size)
+        subdivide_matrix_into_state(conf, mat_a, SUBMATRICES_KEY_A)
+        subdivide_matrix_into_state(conf, mat_b, SUBMATRICES_KEY_B)
+
+        divide_and_conquer()
+
+        actual_bytes = get_state(RESULT_MATRIX_KEY, conf.bytes_per_matrix)
+        actual = np.frombuffer(actual_bytes, dtype=np.float32).reshape(
+            conf.matrix_size, conf.matrix_size
+        )
+
+        np.testing.assert_array_almost_equal_nulp(
+            actual, np.dot(mat_a, mat_b), nulp=20
+        )
+
+    @parameterized.expand(
+        [
+            (1, 1),
+            (2, 1),
+            (2, 2),
+            (3, 2),
+        ]
+    )
+    def test_strassen_multiplication(self, n_splits, strassen_levels):
+        set_local_chaining(True)
+
+        write_matrix_params_to_state(256, n_splits, strassen_levels)
+        conf = load_matrix_conf_from_state()
+        self.assertEqual(strassen_levels, conf.strassen_levels)
+
+        mat_a = random_matrix(conf.matrix_size)
+        mat_b = random_matrix(conf.matrix_size)
+        subdivide_matrix_into_state(conf, mat_a, SUBMATRICES_KEY_A)
+        subdivide_matrix_into_state(conf, mat_b, SUBMATRICES_KEY_B)
+
+        divide_and_conquer()
+
+        actual_bytes = get_state(RESULT_MATRIX_KEY, conf.bytes_per_matrix)
+        actual = np.frombuffer(actual_bytes, dtype=np.float32).reshape(
+            conf.matrix_size, conf.matrix_size
+        )
+
+        # Strassen is less numerically stable so needs a higher tolerance
+        np.testing.assert_allclose(actual, np.dot(mat_a, mat_b), rtol=1e-4)
+
+    def test_too_many_strassen_levels(self):
+        with self.assertRaises(ValueError):
+            MatrixConf(256, 1, strassen_levels=2)
+
+    @parameterized.expand(
+        [
+            (0,),
+            (1,),
+            (3,),
+        ]
+    )
+    def test_in_place_multiplication(self, n_splits):
+        set_local_chaining(True)
+
+        write_matrix_params_to_state(256, n_splits, in_place=True)
+        conf = load_matrix_conf_from_state()
+        self.assertTrue(conf.in_place)
+
+        mat_a = random_matrix(conf.matrix_size)
+        mat_b = random_matrix(conf.matrix_size)
+        subdivide_matrix_into_state(conf, mat_a, SUBMATRICES_KEY_A)
+        subdivide_matrix_into_state(conf, mat_b, SUBMATRICES_KEY_B)
+
+        # Record pulls, the part of the result being added to must be pulled
+        # before each accumulation, but never the whole result
+        pulled_keys = []
+        pulled_bytes = []
+        self.backend.pull_state = lambda key, state_len: pulled_keys.append(
+            key
+        )
+        self.backend.pull_state_offset = (
+            lambda key, total_len, offset, offset_len: pulled_bytes.append(
+                offset_len
+            )
+        )
+
+        divide_and_conquer()
+
+        # Check no intermediate results were written
+        self.assertFalse(
+            [
+                key
+                for key in self.backend.state
+                if key.startswith("intermediate")
+            ]
+        )
+        self.assertNotIn(RESULT_MATRIX_KEY, pulled_keys)
+
+        # Each part of the result has 2 ** n_splits products added to it, all
+        # but the first of which pull it
+        self.assertEqual(
+            ((2**n_splits) - 1) * conf.bytes_per_matrix, sum(pulled_bytes)
+        )
+
+        actual_bytes = get_state(RESULT_MATRIX_KEY, conf.bytes_per_matrix)
+        actual = np.frombuffer(actual_bytes, dtype=np.float32).reshape(
+            conf.matrix_size, conf.matrix_size
+        )
+
+        np.testing.assert_allclose(actual, np.dot(mat_a, mat_b), rtol=1e-5)
+
+    @parameterized.expand(
+        [
+            # Never worth chaining
+            (1e6, 0, False, 0),
+            # Always worth chaining
+            (0, 0, False, 3),
+            # Only worth chaining at the top level
+            (0.01, 0, False, 1),
+            (0.01, 1, False, 1),
+            (0.01, 0, True, 1),
+            # Only worth chaining at the top level in one wave, not in two
+            (0.015, 0, False, 1),
+            (0.015, 0, True, 0),
+        ]
+    )
+    def test_cost_model_cutoff(
+        self, chain_latency, strassen_levels, in_place, expected_depth
+    ):
+        set_local_chaining(True)
+
+        cost_model = MatrixCostModel(chain_latency, 1e9)
+        write_matrix_params_to_state(
+            256, 3, strassen_levels, in_place, cost_model=cost_model
+        )
+        conf = load_matrix_conf_from_state()
+        self.assertEqual(cost_model.to_list(), conf.cost_model.to_list())
+
+        mat_a = random_matrix(conf.matrix_size)
+        mat_b = random_matrix(conf.matrix_size)
+        subdivide_matrix_into_state(conf, mat_a, SUBMATRICES_KEY_A)
+        subdivide_matrix_into_state(conf, mat_b, SUBMATRICES_KEY_B)
+
+        # Check how deep the multiplication went from where it was done locally
+        with patch.object(
+            matrix, "multiply_locally", wraps=matrix.multiply_locally
+        ) as multiply_locally:
+            divide_and_conquer()
+
+        split_levels = {
+            call_args[0][1] for call_args in multiply_locally.call_args_list
+        }
+        self.assertEqual({expected_depth}, split_levels)
+
+        actual_bytes = get_state(RESULT_MATRIX_KEY, conf.bytes_per_matrix)
+        actual = np.frombuffer(actual_bytes, dtype=np.float32).reshape(
+            conf.matrix_size, conf.matrix_size
+        )
+
+        np.testing.assert_allclose(actual, np.dot(mat_a, mat_b), rtol=1e-4)
+
+    def test_cost_model(self):
+        cost_model = MatrixCostModel(0.01, 1e9, max_parallel=8)
+        conf = MatrixConf(256, 3)
+
+        self.assertTrue(cost_model.should_chain(conf, 0, 8))
+        self.assertFalse(cost_model.should_chain(conf, 1, 8))
+
+        # Children that can't run in parallel make chaining less worthwhile
+        serial_model = MatrixCostModel(0.01, 1e9, max_parallel=1)
+        self.assertFalse(serial_model.should_chain(conf, 0, 8))
+
+        # As do two waves of children in in-place mode
+        in_place_model = MatrixCostModel(0.015, 1e9)
+        self.assertTrue(in_place_model.should_chain(conf, 0, 8))
+        self.assertFalse(
+            in_place_model.should_chain(
+                MatrixConf(256, 3, in_place=True), 0, 8
+            )
+        )
+
+        # And moving the children's operands through state
+        self.assertGreater(
+            MatrixCostModel(0.01, 1e9, state_bandwidth=1e9).get_chained_time(
+                256, 8
+            ),
+            cost_model.get_chained_time(256, 8)
+            + (2 * 8 * 128 * 128 * 4) / 1e9,
+        )
+
+        # In-place mode also moves a tile for each accumulating child
+        transfer_model = MatrixCostModel(0, 1e30, state_bandwidth=1e9)
+        self.assertAlmostEqual(
+            transfer_model.get_chained_time(256, 8, in_place=True)
+            - transfer_model.get_chained_time(256, 8),
+            (4 * 128 * 128 * 4) / 1e9,
+        )
+
+    def test_calibrate_cost_model(self):
+        set_local_chaining(True)
+
+        cost_model = calibrate_cost_model(sample_size=64, n_samples=2)
+        self.assertGreater(cost_model.flop_rate, 0)
+        self.assertGreater(cost_model.state_bandwidth, 0)
+        self.assertGreaterEqual(cost_model.chain_latency, 0)
+
+    @parameterized.expand(
+        [
+            ("float16", "float32", 0, False, False),
+            ("float16", "float32", 1, False, True),
+            ("float16", "float32", 0, True, False),
+            ("float64", None, 0, False, False),
+            ("float64", None, 1, False, True),
+        ]
+    )
+    def test_dtypes(
+        self, dtype, accumulate_dtype, strassen_levels, in_place, tiled
+    ):
+        set_local_chaining(True)
+
+        write_matrix_params_to_state(
+            128,
+            2,
+            strassen_levels,
+            in_place,
+            tiled,
+            dtype=dtype,
+            accumulate_dtype=accumulate_dtype,
+        )
+        conf = load_matrix_conf_from_state()
+        self.assertEqual(dtype, conf.dtype)
+        self.assertEqual(accumulate_dtype or dtype, conf.accumulate_dtype)
+
+        mat_a = random_matrix(conf.matrix_size, dtype)
+        mat_b = random_matrix(conf.matrix_size, dtype)
+        subdivide_matrix_into_state(conf, mat_a, SUBMATRICES_KEY_A)
+        subdivide_matrix_into_state(conf, mat_b, SUBMATRICES_KEY_B)
+
+        # Inputs are stored with the given dtype
+        np.testing.assert_array_equal(
+            mat_a, reconstruct_matrix_from_submatrices(conf, SUBMATRICES_KEY_A)
+        )
+
+        divide_and_conquer()
+
+        self.assertEqual(
+            conf.bytes_per_matrix, get_state_size(RESULT_MATRIX_KEY)
+        )
+        actual_bytes = get_state(RESULT_MATRIX_KEY, conf.bytes_per_matrix)
+        actual = np.frombuffer(actual_bytes, dtype=dtype).reshape(
+            conf.matrix_size, conf.matrix_size
+        )
+
+        expected = np.dot(mat_a.astype(np.float64), mat_b.astype(np.float64))
+        np.testing.assert_allclose(
+            actual, expected, rtol=1e-2 if dtype == "float16" else 1e-8
+        )
+
+    def test_in_place_accumulates_with_accumulate_dtype(self):
+        set_local_chaining(True)
+
+        write_matrix_params_to_state(
+            128, 3, in_place=True, dtype="float16", accumulate_dtype="float32"
+        )
+        conf = load_matrix_conf_from_state()
+
+        mat_a = random_matrix(conf.matrix_size, "float16")
+        mat_b = random_matrix(conf.matrix_size, "float16")
+        subdivide_matrix_into_state(conf, mat_a, SUBMATRICES_KEY_A)
+        subdivide_matrix_into_state(conf, mat_b, SUBMATRICES_KEY_B)
+
+        divide_and_conquer()
+
+        # Partial sums are kept in float32
+        self.assertEqual(
+            conf.bytes_per_matrix * 2, get_state_size(RESULT_ACCUMULATE_KEY)
+        )
+
+        # So the result is only rounded to float16 once, apart from where
+        # the order of the additions makes a difference
+        actual_bytes = get_state(RESULT_MATRIX_KEY, conf.bytes_per_matrix)
+        actual = np.frombuffer(actual_bytes, dtype=np.float16).reshape(
+            conf.matrix_size, conf.matrix_size
+        )
+        expected = np.dot(
+            mat_a.astype(np.float32), mat_b.astype(np.float32)
+        ).astype(np.float16)
+        self.assertLess(
+            np.count_nonzero(actual != expected), actual.size // 100
+        )
+
+    def test_unsupported_dtype(self):
+        with self.assertRaises(ValueError):
+            MatrixConf(256, 1, dtype="int8")
+
+        conf = MatrixConf(
+            256, 1, dtype=np.float16, accumulate_dtype=np.dtype(np.float32)
+        )
+        self.assertEqual("float16", conf.dtype)
+        self.assertEqual("float32", conf.accumulate_dtype)
+        self.assertEqual(256 * 256 * 2, conf.bytes_per_matrix)
+
+    def test_in_place_not_supported_with_strassen(self):
+        with self.assertRaises(ValueError):
+            MatrixConf(256, 2, strassen_levels=1, in_place=True)
+
+    def test_tiled_layout(self):
+        write_matrix_params_to_state(256, 2, tiled=True)
+        conf = load_matrix_conf_from_state()
+        self.assertTrue(conf.tiled)
+
+        mat_a = random_matrix(conf.matrix_size)
+        subdivide_matrix_into_state(conf, mat_a, SUBMATRICES_KEY_A)
+
+        # Check there's only one key for the whole matrix
+        self.assertEqual(
+            conf.bytes_per_matrix, get_state_size(SUBMATRICES_KEY_A)
+        )
+
+        actual = reconstruct_matrix_from_submatrices(conf, SUBMATRICES_KEY_A)
+        np.testing.assert_array_equal(mat_a, actual)
+
+        sm_size = conf.get_submatrix_size(conf.n_splits)
+        actual_sm = read_input_submatrix(conf, SUBMATRICES_KEY_A, 2, 1)
+        np.testing.assert_array_equal(
+            mat_a[2 * sm_size : 3 * sm_size, sm_size : 2 * sm_size], actual_sm
+        )
+
+        actual_sms = read_input_submatrices(conf, SUBMATRICES_KEY_A, 3, 1, 3)
+        for i in range(0, 3):
+            col_start = (i + 1) * sm_size
+            np.testing.assert_array_equal(
+                mat_a[3 * sm_size :, col_start : col_start + sm_size],
+                actual_sms[i],
+            )
+
+    @parameterized.expand(
+        [
+            (2, 0, False),
+            (2, 0, True),
+            (3, 2, False),
+        ]
+    )
+    def test_tiled_multiplication(self, n_splits, strassen_levels, in_place):
+        set_local_chaining(True)
+
+        write_matrix_params_to_state(
+            256, n_splits, strassen_levels, in_place, tiled=True
+        )
+        conf = load_matrix_conf_from_state()
+
+        mat_a = random_matrix(conf.matrix_size)
+        mat_b = random_matrix(conf.matrix_size)
+        subdivide_matrix_into_state(conf, mat_a, SUBMATRICES_KEY_A)
+        subdivide_matrix_into_state(conf, mat_b, SUBMATRICES_KEY_B)
+
+        divide_and_conquer()
+
+        actual_bytes = get_state(RESULT_MATRIX_KEY, conf.bytes_per_matrix)
+        actual = np.frombuffer(actual_bytes, dtype=np.float32).reshape(
+            conf.matrix_size, conf.matrix_size
+        )
+
+        np.testing.assert_allclose(actual, np.dot(mat_a, mat_b), rtol=1e-4)
+
+    @parameterized.expand(
+        [
+            (False,),
+            (True,),
+        ]
+    )
+    def test_reconstruct_into_output(self, tiled):
+        write_matrix_params_to_state(256, 2, tiled=tiled)
+        conf = load_matrix_conf_from_state()
+
+        mat_a = random_matrix(conf.matrix_size)
+        subdivide_matrix_into_state(conf, mat_a, SUBMATRICES_KEY_A)
+
+        # Record batched reads
+        batch_sizes = []
+        get_state_many = self.backend.get_state_many
+        self.backend.get_state_many = lambda key_lens: batch_sizes.append(
+            len(key_lens)
+        ) or get_state_many(key_lens)
+
+        out = np.zeros((conf.matrix_size, conf.matrix_size), dtype=np.float32)
+        actual = reconstruct_matrix_from_submatrices(
+            conf, SUBMATRICES_KEY_A, out=out
+        )
+
+        self.assertIs(out, actual)
+        np.testing.assert_array_equal(mat_a, out)
+
+        # Submatrices are read a row at a time rather than all at once
+        self.assertEqual([] if tiled else [4, 4, 4, 4], batch_sizes)
+
+    def test_sparse_storage(self):
+        write_matrix_params_to_state(256, 2, sparse=True)
+        conf = load_matrix_conf_from_state()
+        self.assertTrue(conf.sparse)
+
+        occupancy = np.eye(4, dtype=bool)
+        occupancy[3, 0] = True
+        mat_a = _block_sparse_matrix(conf, occupancy)
+        subdivide_matrix_into_state(conf, mat_a, SUBMATRICES_KEY_A)
+
+        np.testing.assert_array_equal(
+            occupancy, read_occupancy(conf, SUBMATRICES_KEY_A)
+        )
+
+        # Check only the occupied submatrices were written
+        self.assertTrue(
+            get_state_size(conf.get_submatrix_key(SUBMATRICES_KEY_A, 2, 3, 0))
+        )
+        self.assertFalse(
+            get_state_size(conf.get_submatrix_key(SUBMATRICES_KEY_A, 2, 0, 3))
+        )
+
+        np.testing.assert_array_equal(
+            mat_a, reconstruct_matrix_from_submatrices(conf, SUBMATRICES_KEY_A)
+        )
+
+    def test_sparse_pruning(self):
+        set_local_chaining(True)
+
+        write_matrix_params_to_state(256, 1, sparse=True)
+        conf = load_matrix_conf_from_state()
+
+        # With A block diagonal, half the multiplications have an empty operand
+        mat_a = _block_sparse_matrix(conf, np.eye(2, dtype=bool))
+        mat_b = random_matrix(conf.matrix_size)
+        subdivide_matrix_into_state(conf, mat_a, SUBMATRICES_KEY_A)
+        subdivide_matrix_into_state(conf, mat_b, SUBMATRICES_KEY_B)
+
+        divide_and_conquer()
+
+        self.assertEqual(
+            4,
+            len(
+                [
+                    key
+                    for key in self.backend.state
+                    if key.startswith("intermediate")
+                ]
+            ),
+        )
+
+        actual_bytes = get_state(RESULT_MATRIX_KEY, conf.bytes_per_matrix)
+        actual = np.frombuffer(actual_bytes, dtype=np.float32).reshape(
+            conf.matrix_size, conf.matrix_size
+        )
+        np.testing.assert_allclose(actual, np.dot(mat_a, mat_b), rtol=1e-5)
+
+    @parameterized.expand(
+        [
+            (2, 0, False, False),
+            (2, 0, True, False),
+            (2, 0, False, True),
+            (2, 0, True, True),
+            (3, 1, False, False),
+            (3, 2, False, True),
+        ]
+    )
+    def test_sparse_multiplication(
+        self, n_splits, strassen_levels, in_place, tiled
+    ):
+        set_local_chaining(True)
+
+        write_matrix_params_to_state(
+            256, n_splits, strassen_levels, in_place, tiled, sparse=True
+        )
+        conf = load_matrix_conf_from_state()
+
+        sm_per_row = conf.get_submatrices_per_row(n_splits)
+        mat_a = _block_sparse_matrix(
+            conf, np.tril(np.ones((sm_per_row, sm_per_row), dtype=bool))
+        )
+        mat_b = _block_sparse_matrix(
+            conf, np.eye(sm_per_row, dtype=bool)[::-1]
+        )
+        subdivide_matrix_into_state(conf, mat_a, SUBMATRICES_KEY_A)
+        subdivide_matrix_into_state(conf, mat_b, SUBMATRICES_KEY_B)
+
+        divide_and_conquer()
+
+        actual_bytes = get_state(RESULT_MATRIX_KEY, conf.bytes_per_matrix)
+        actual = np.frombuffer(actual_bytes, dtype=np.float32).reshape(
+            conf.matrix_size, conf.matrix_size
+        )
+        np.testing.assert_allclose(
+            actual, np.dot(mat_a, mat_b), rtol=1e-4, atol=1e-4
+        )
+
+    def test_sparse_empty_operand(self):
+        set_local_chaining(True)
+
+        write_matrix_params_to_state(256, 2, in_place=True, sparse=True)
+        conf = load_matrix_conf_from_state()
+
+        # Leave something in the result to check it gets zeroed
+        set_state(
+            RESULT_MATRIX_KEY,
+            np.ones((conf.matrix_size, conf.matrix_size), dtype=np.float32),
+        )
+
+        subdivide_matrix_into_state(
+            conf, np.zeros((256, 256), dtype=np.float32), SUBMATRICES_KEY_A
+        )
+        subdivide_matrix_into_state(
+            conf, random_matrix(conf.matrix_size), SUBMATRICES_KEY_B
+        )
+
+        divide_and_conquer()
+
+        actual_bytes = get_state(RESULT_MATRIX_KEY, conf.bytes_per_matrix)
+        self.assertEqual(bytes(conf.bytes_per_matrix), actual_bytes)
@@ -0,0 +1,140 @@
+import unittest
+from os import makedirs
+from os.path import exists, join
+from shutil import rmtree
+
+import numpy as np
+from parameterized import parameterized
+
+from pyfaasm import core
+from pyfaasm.backend import LocalBackend
+from pyfaasm.config import MatrixConf
+from pyfaasm.core import set_backend
+from pyfaasm.matrix import random_matrix, load_tiled_file_into_state, reconstruct_matrix_from_submatrices
+from pyfaasm.matrix_data import write_matrix_to_tiled_file, open_tiled_matrix_file, \
+    reconstruct_matrix_from_tiled_file, subdivide_matrix_into_files, reconstruct_matrix_from_files, \
+    TILED_FILE_HEADER, TILED_FILE_INDEX_DTYPE
+
+
+class TestMatrixData(unittest.TestCase):
+    def setUp(self):
+        self.file_dir = "/tmp/mat_data_test"
+        if exists(self.file_dir):
+            rmtree(self.file_dir)
+        makedirs(self.file_dir)
+
+        self.original_backend = core.backend
+        set_backend(LocalBackend())
+
+    def tearDown(self):
+        set_backend(self.original_backend)
+
+    @parameterized.expand([
+        (0,), (1,), (3,),
+    ])
+    def test_tiled_file_round_trip(self, n_splits):
+        conf = MatrixConf(256, n_splits)
+        mat = random_matrix(conf.matrix_size)
+
+        file_path = join(self.file_dir, "mat_a")
+        write_matrix_to_tiled_file(conf, mat, file_path)
+
+        tiled_file = open_tiled_matrix_file(file_path)
+        self.assertEqual(conf.matrix_size, tiled_file.matrix_size)
+        self.assertEqual(conf.n_splits, tiled_file.n_splits)
+
+        # Check individual submatrices
+        sm_size = conf.get_submatrix_size(n_splits)
+        sm_per_row = conf.get_submatrices_per_row(n_splits)
+        actual_sm = tiled_file.get_submatrix(sm_per_row - 1, 0)
+        np.testing.assert_array_equal(mat[-sm_size:, :sm_size], actual_sm)
+
+        # Check the whole matrix
+        np.testing.assert_array_equal(mat, reconstruct_matrix_from_tiled_file(file_path))
+
+    @parameterized.expand([
+        ("float16",), ("float64",),
+    ])
+    def test_tiled_file_dtype(self, dtype):
+        conf = MatrixConf(128, 2, dtype=dtype)
+        mat = random_matrix(conf.matrix_size)
+
+        file_path = join(self.file_dir, "mat_a")
+        write_matrix_to_tiled_file(conf, mat, file_path)
+
+        tiled_file = open_tiled_matrix_file(file_path)
+        self.assertEqual(np.dtype(dtype), tiled_file.dtype)
+        np.testing.assert_array_equal(mat.astype(dtype), tiled_file.read_matrix())
+
+        # Loading into state with a different dtype converts it
+        load_conf = MatrixConf(128, 2, dtype="float32")
+        load_tiled_file_into_state(load_conf, file_path, "mat_a")
+        actual = reconstruct_matrix_from_submatrices(load_conf, "mat_a")
+        self.assertEqual(np.float32, actual.dtype)
+        np.testing.assert_array_equal(mat.astype(dtype).astype(np.float32), actual)
+
+    def test_invalid_tiled_file(self):
+        file_path = join(self.file_dir, "invalid")
+        with open(file_path, "wb") as fh:
+            fh.write(bytes(64))
+
+        with self.assertRaises(ValueError):
+            open_tiled_matrix_file(file_path)
+
+    def test_invalid_tiled_file_index(self):
+        conf = MatrixConf(64, 1)
+        file_path = join(self.file_dir, "invalid_index")
+        write_matrix_to_tiled_file(conf, random_matrix(conf.matrix_size), file_path)
+
+        # Swap the offsets of the first two submatrices
+        with open(file_path, "r+b") as fh:
+            fh.seek(TILED_FILE_HEADER.size)
+            index = np.fromfile(fh, dtype=TILED_FILE_INDEX_DTYPE, count=2)
+            fh.seek(TILED_FILE_HEADER.size)
+            index[::-1].tofile(fh)
+
+        with self.assertRaises(ValueError):
+            open_tiled_matrix_file(file_path)
+
+    @parameterized.expand([
+        (False,), (True,),
+    ])
+    def test_load_tiled_file_into_state(self, tiled):
+        conf = MatrixConf(256, 2, tiled=tiled)
+        mat = random_matrix(conf.matrix_size)
+
+        file_path = join(self.file_dir, "mat_a")
+        write_matrix_to_tiled_file(conf, mat, file_path)
+
+        load_tiled_file_into_state(conf, file_path, "mat_a")
+        np.testing.assert_array_equal(mat, reconstruct_matrix_from_submatrices(conf, "mat_a"))
+
+        with self.assertRaises(ValueError):
+            load_tiled_file_into_state(MatrixConf(256, 1), file_path, "mat_a")
+
+    @parameterized.expand([
+        (False,), (True,),
+    ])
+    def test_sparse_tiled_file_into_state(self, tiled):
+        conf = MatrixConf(256, 2, tiled=tiled, sparse=True)
+        mat = random_matrix(conf.matrix_size)
+        mat[:128, 128:] = 0
+
+        file_path = join(self.file_dir, "mat_a")
+        write_matrix_to_tiled_file(conf, mat, file_path)
+
+        load_tiled_file_into_state(conf, file_path, "mat_a")
+        np.testing.assert_array_equal(mat, reconstruct_matrix_from_submatrices(conf, "mat_a"))
+
+    def test_sparse_files(self):
+        conf = MatrixConf(256, 2, sparse=True)
+        mat = random_matrix(conf.matrix_size)
+        mat[64:, :64] = 0
+
+        subdivide_matrix_into_files(conf, mat, self.file_dir, "mat_a")
+
+        # Only the occupied submatrices are written
+        self.assertTrue(exists(join(self.file_dir, conf.get_submatrix_key("mat_a", 2, 0, 0))))
+        self.assertFalse(exists(join(self.file_dir, conf.get_submatrix_key("mat_a", 2, 1, 0))))
+
+        np.testing.assert_array_equal(mat, reconstruct_matrix_from_files(conf, self.file_dir, "mat_a"))
@@ -0,0 +1,169 @@
+import unittest
+
+import numpy as np
+from parameterized import parameterized
+
+from pyfaasm import core
+from pyfaasm.backend import LocalBackend
+from pyfaasm.config import RESULT_MATRIX_KEY
+from pyfaasm.core import set_backend, set_local_chaining, get_state, set_state, chain_this_with_input, await_call, \
+    chain_many, await_all, enable_call_memoisation, set_call_memoisation, remove_call_memoisation, \
+    disable_call_memoisation, get_call_memoisation_stats
+from pyfaasm.matrix import write_matrix_params_to_state, load_matrix_conf_from_state, subdivide_matrix_into_state, \
+    divide_and_conquer, random_matrix, set_multiplication_memoisation, SUBMATRICES_KEY_A, SUBMATRICES_KEY_B
+
+STATE_KEY = "memo_state"
+RESULT_KEY = "memo_result"
+
+calls = []
+
+
+def _memo_func(input_bytes):
+    # Writes the input followed by the state to the result
+    calls.append(bytes(input_bytes))
+    set_state(RESULT_KEY, bytes(input_bytes) + get_state(STATE_KEY, 4))
+    return 0
+
+
+def _failing_func(input_bytes):
+    calls.append(bytes(input_bytes))
+    return 1
+
+
+class TestMemo(unittest.TestCase):
+    def setUp(self):
+        self.original_backend = core.backend
+        self.original_local_chaining = core.PYTHON_LOCAL_CHAINING
+        set_backend(LocalBackend())
+
+        del calls[:]
+        set_state(STATE_KEY, b"aaaa")
+
+    def tearDown(self):
+        disable_call_memoisation()
+        set_backend(self.original_backend)
+        set_local_chaining(self.original_local_chaining)
+
+    @parameterized.expand([
+        (True,), (False,),
+    ])
+    def test_memoised_chaining(self, local_chaining):
+        set_local_chaining(local_chaining)
+        set_call_memoisation(_memo_func, state_keys=[STATE_KEY], result_keys=[RESULT_KEY])
+
+        self.assertEqual(0, await_call(chain_this_with_input(_memo_func, b"12")))
+        call_id = chain_this_with_input(_memo_func, b"12")
+        self.assertLess(call_id, 0)
+        self.assertEqual(0, await_call(call_id))
+        self.assertEqual([b"12"], calls)
+
+        # Different input
+        await_call(chain_this_with_input(_memo_func, b"34"))
+        self.assertEqual([b"12", b"34"], calls)
+
+        # Changed state
+        set_state(STATE_KEY, b"bbbb")
+        await_call(chain_this_with_input(_memo_func, b"34"))
+        self.assertEqual([b"12", b"34", b"34"], calls)
+
+        # Result overwritten since the call
+        set_state(RESULT_KEY, b"xx")
+        await_call(chain_this_with_input(_memo_func, b"34"))
+        self.assertEqual(b"34bbbb", get_state(RESULT_KEY, 6))
+        self.assertEqual(4, len(calls))
+
+        stats = get_call_memoisation_stats()
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(1, stats["stale"])
+        self.assertEqual(0, stats["pending"])
+
+    @parameterized.expand([
+        (True,), (False,),
+    ])
+    def test_chain_many(self, local_chaining):
+        set_local_chaining(local_chaining)
+        set_call_memoisation(_memo_func, state_keys=[STATE_KEY])
+
+        self.assertEqual([0, 0], await_all(chain_many(_memo_func, [b"1", b"2"])))
+
+        call_ids = chain_many(_memo_func, [b"1", b"2", b"3"])
+        self.assertLess(call_ids[0], 0)
+        self.assertLess(call_ids[1], 0)
+        self.assertEqual([0, 0, 0], await_all(call_ids))
+        self.assertEqual([b"1", b"2", b"3"], calls)
+
+    def test_eviction(self):
+        set_local_chaining(True)
+        enable_call_memoisation(max_entries=2)
+        set_call_memoisation(_memo_func)
+
+        for input_bytes in [b"1", b"2", b"3", b"1"]:
+            await_call(chain_this_with_input(_memo_func, input_bytes))
+
+        self.assertEqual([b"1", b"2", b"3", b"1"], calls)
+
+        stats = get_call_memoisation_stats()
+        self.assertEqual(2, stats["entries"])
+        self.assertEqual(2, stats["evictions"])
+
+    def test_not_memoised(self):
+        set_local_chaining(False)
+
+        # Failed calls are always chained again
+        set_call_memoisation(_failing_func)
+        for _ in range(2):
+            self.assertEqual(1, await_call(chain_this_with_input(_failing_func, b"1")))
+
+        # As are calls the policy opts out of
+        set_call_memoisation(_memo_func, state_keys=lambda input_bytes: None)
+        for _ in range(2):
+            await_call(chain_this_with_input(_memo_func, b"2"))
+
+        # As are functions without a policy
+        remove_call_memoisation(_memo_func)
+        for _ in range(2):
+            await_call(chain_this_with_input(_memo_func, b"3"))
+
+        self.assertEqual([b"1", b"1", b"2", b"2", b"3", b"3"], calls)
+        self.assertEqual(0, get_call_memoisation_stats()["hits"])
+
+    @parameterized.expand([
+        (2, 0, False), (2, 0, True), (2, 1, False),
+    ])
+    def test_memoised_multiplication(self, n_splits, strassen_levels, tiled):
+        set_local_chaining(True)
+        set_multiplication_memoisation()
+
+        write_matrix_params_to_state(128, n_splits, strassen_levels, tiled=tiled)
+        conf = load_matrix_conf_from_state()
+
+        mat_a = random_matrix(conf.matrix_size)
+        mat_b = random_matrix(conf.matrix_size)
+
+        def _multiply():
+            subdivide_matrix_into_state(conf, mat_a, SUBMATRICES_KEY_A)
+            subdivide_matrix_into_state(conf, mat_b, SUBMATRICES_KEY_B)
+            divide_and_conquer()
+
+            actual_bytes = get_state(RESULT_MATRIX_KEY, conf.bytes_per_matrix)
+            actual = np.frombuffer(actual_bytes, dtype=np.float32).reshape(conf.matrix_size, conf.matrix_size)
+            np.testing.assert_allclose(actual, np.dot(mat_a, mat_b), rtol=1e-4)
+
+        _multiply()
+        self.assertEqual(0, get_call_memoisation_stats()["hits"])
+
+        # Repeating the same multiplication doesn't chain anything new
+        n_misses = get_call_memoisation_stats()["misses"]
+        _multiply()
+        stats = get_call_memoisation_stats()
+        self.assertEqual(n_misses, stats["misses"])
+        self.assertGreater(stats["hits"], 0)
+
+        # Changing part of an operand only redoes the affected multiplications,
+        # unless the whole operand is under one key
+        mat_a[:32, :32] = 0
+        _multiply()
+        if tiled:
+            self.assertEqual(stats["hits"], get_call_memoisation_stats()["hits"])
+        else:
+            self.assertGreater(get_call_memoisation_stats()["hits"], stats["hits"])
@@ -0,0 +1,90 @@
+import unittest
+
+from pyfaasm import core
+from pyfaasm.backend import LocalBackend
+from pyfaasm.core import set_backend
+from pyfaasm.objects import Dictionary, encode_partition, decode_partition
+
+
+class TestDictionary(unittest.TestCase):
+    def setUp(self):
+        self.original_backend = core.backend
+        self.backend = LocalBackend()
+        set_backend(self.backend)
+
+    def tearDown(self):
+        set_backend(self.original_backend)
+
+    def test_partition_encoding(self):
+        entries = {b'a': b'1', b'bb': b'', b'': b'333'}
+        self.assertEqual(entries, decode_partition(encode_partition(entries)))
+        self.assertEqual(dict(), decode_partition(encode_partition(dict())))
+
+        # Check padding to a fixed size
+        encoded = encode_partition(entries, 64)
+        self.assertEqual(64, len(encoded))
+        self.assertEqual(entries, decode_partition(encoded))
+
+        with self.assertRaises(ValueError):
+            encode_partition(entries, 16)
+
+    def test_dictionary_shared_through_state(self):
+        dict_a = Dictionary("shared_dict", n_partitions=4)
+        dict_a["foo"] = b'bar'
+        dict_a.update({"k{}".format(i): bytes([i]) for i in range(50)})
+        dict_a.push()
+
+        # Check another instance sees the entries
+        dict_b = Dictionary("shared_dict", n_partitions=4)
+        self.assertEqual(b'bar', dict_b["foo"])
+        self.assertEqual(b'bar', dict_b.get(b'foo'))
+        self.assertEqual(51, len(dict_b))
+        self.assertIn("k7", dict_b)
+        self.assertNotIn("k99", dict_b)
+        self.assertIsNone(dict_b.get("k99"))
+
+        expected = [bytes([i]) for i in range(10)] + [None]
+        actual = dict_b.get_many(["k{}".format(i) for i in range(10)] + ["k99"])
+        self.assertEqual(expected, actual)
+
+        with self.assertRaises(KeyError):
+            dict_b["missing"]
+
+        # Check updates only written on push
+        del dict_b["foo"]
+        dict_b["k1"] = b'updated'
+        dict_a.pull()
+        self.assertEqual(b'bar', dict_a["foo"])
+
+        dict_b.push()
+        dict_a.pull()
+        self.assertNotIn("foo", dict_a)
+        self.assertEqual(b'updated', dict_a["k1"])
+        self.assertEqual(50, len(dict_a.keys()))
+
+    def test_entries_are_partitioned(self):
+        d = Dictionary("partitioned_dict", n_partitions=8)
+        d.update({"k{}".format(i): b'x' for i in range(100)})
+        d.push()
+
+        partition_keys = [key for key in self.backend.state if key.startswith("partitioned_dict_part_")]
+        self.assertEqual(8, len(partition_keys))
+
+        # Check partitions keep their size, and there's no other state
+        self.assertEqual(set(partition_keys), set(self.backend.state))
+        for key in partition_keys:
+            self.assertEqual(d.partition_size, len(self.backend.state[key]))
+
+    def test_full_partition_raises(self):
+        d = Dictionary("small_dict", n_partitions=2, partition_size=64)
+        d["a"] = b'1'
+        d.push()
+
+        # Check nothing is written when a partition is full
+        d["b"] = bytes(100)
+        with self.assertRaises(ValueError):
+            d.push()
+
+        d.pull()
+        self.assertEqual(b'1', d["a"])
+        self.assertNotIn("b", d)
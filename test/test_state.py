@@ -1,6 +1,8 @@
 import unittest
 
-from pyfaasm.core import set_state, push_state, pull_state, get_state, set_state_offset, get_state_offset, get_state_size
+from pyfaasm.core import set_state, push_state, pull_state, get_state, set_state_offset, get_state_offset, get_state_size, \
+    get_state_view, get_state_offset_view, get_state_many, set_state_many, get_state_offset_many, \
+    set_state_offset_many, push_state_many, pull_state_many, pull_state_offset, pull_state_offset_many
 
 
 class TestState(unittest.TestCase):
@@ -40,3 +42,66 @@ class TestState(unittest.TestCase):
         # Check getting a segment
         actual_segment = get_state_offset(key, value_len, offset, segment_len)
         self.assertEqual(segment, actual_segment)
+
+    def test_state_views(self):
+        key = "pyStateViewTest"
+        full_value = b'0123456789'
+        value_len = len(full_value)
+        set_state(key, full_value)
+
+        # Check reading the full value and a segment through views
+        view = get_state_view(key, value_len)
+        self.assertIsInstance(view, memoryview)
+        self.assertEqual(full_value, bytes(view))
+
+        segment_view = get_state_offset_view(key, value_len, 2, 3)
+        self.assertEqual(b'234', bytes(segment_view))
+
+        # Check views see subsequent updates
+        set_state_offset(key, value_len, 2, b'999')
+        self.assertEqual(b'0199956789', bytes(view))
+
+    def test_state_write_buffers(self):
+        key = "pyStateBufferTest"
+        value_len = 6
+
+        # Check writing a bytearray
+        set_state(key, bytearray(b'abcdef'))
+        self.assertEqual(b'abcdef', get_state(key, value_len))
+
+        # Check writing a non-contiguous memoryview
+        set_state(key, memoryview(b'0a1b2c3d4e5f')[::2])
+        self.assertEqual(b'012345', get_state(key, value_len))
+
+        # Check writing a segment from a memoryview
+        set_state_offset(key, value_len, 1, memoryview(b'xyz'))
+        self.assertEqual(b'0xyz45', get_state(key, value_len))
+
+    def test_batched_state(self):
+        items = [
+            ("pyBatchA", b'aaaa'),
+            ("pyBatchB", b'bbbbbb'),
+            ("pyBatchC", b'cc'),
+        ]
+        key_lens = [(key, len(value)) for key, value in items]
+
+        set_state_many(items)
+        push_state_many([key for key, _ in items])
+        pull_state_many(key_lens)
+
+        actual = get_state_many(key_lens)
+        self.assertEqual([value for _, value in items], actual)
+
+        # Check batched segments of a single key
+        key = "pyBatchB"
+        set_state_offset_many(key, 6, [(0, b'1'), (3, b'22')])
+        self.assertEqual(b'1bb22b', get_state(key, 6))
+
+        actual_segments = get_state_offset_many(key, 6, [(0, 2), (3, 3)])
+        self.assertEqual([b'1b', b'22b'], actual_segments)
+
+        # Check pulling segments
+        push_state(key)
+        pull_state_offset(key, 6, 1, 2)
+        pull_state_offset_many(key, 6, [(0, 2), (3, 3)])
+        self.assertEqual(b'1bb22b', get_state(key, 6))
@@ -0,0 +1,81 @@
+import unittest
+
+import numpy as np
+
+from pyfaasm import core
+from pyfaasm.backend import LocalBackend
+from pyfaasm.core import set_backend, get_state, set_state_compression, remove_state_compression
+from pyfaasm.state_array import StateArray
+
+
+class TestStateArray(unittest.TestCase):
+    def setUp(self):
+        self.original_backend = core.backend
+        set_backend(LocalBackend())
+
+        self.expected = np.arange(48, dtype=np.float32).reshape(6, 8)
+        self.state_array = StateArray("stateArrayTest", (6, 8))
+        self.state_array.write(self.expected)
+
+    def tearDown(self):
+        set_backend(self.original_backend)
+
+    def test_whole_array(self):
+        self.assertEqual(6 * 8 * 4, self.state_array.nbytes)
+        self.assertEqual(self.expected.tobytes(), get_state("stateArrayTest", self.state_array.nbytes))
+
+        np.testing.assert_array_equal(self.expected, self.state_array.read())
+        np.testing.assert_array_equal(self.expected, self.state_array.array)
+        np.testing.assert_array_equal(self.expected, np.asarray(self.state_array))
+
+    def test_reading_ranges(self):
+        np.testing.assert_array_equal(self.expected[2], self.state_array[2])
+        np.testing.assert_array_equal(self.expected[-1], self.state_array[-1])
+        np.testing.assert_array_equal(self.expected[1:4], self.state_array[1:4])
+        np.testing.assert_array_equal(self.expected[1:4, 2:5], self.state_array[1:4, 2:5])
+        np.testing.assert_array_equal(self.expected[3, 2:5], self.state_array[3, 2:5])
+        np.testing.assert_array_equal(self.expected[1:3, 4], self.state_array[1:3, 4])
+
+        # Unsupported indexing goes through the whole array
+        np.testing.assert_array_equal(self.expected[::2], self.state_array[::2])
+
+        with self.assertRaises(IndexError):
+            self.state_array[6]
+
+    def test_writing_ranges(self):
+        self.state_array[1] = 100
+        self.expected[1] = 100
+
+        self.state_array[2:4, 3:6] = np.ones((2, 3))
+        self.expected[2:4, 3:6] = np.ones((2, 3))
+
+        self.state_array[5, 1:3] = [7, 8]
+        self.expected[5, 1:3] = [7, 8]
+
+        self.state_array[::3, 0] = -1
+        self.expected[::3, 0] = -1
+
+        np.testing.assert_array_equal(self.expected, self.state_array.read())
+
+    def test_reads_are_copies(self):
+        for idx in [2, slice(1, 4), (slice(1, 4), slice(2, 5)), slice(None, None, 2)]:
+            values = self.state_array[idx]
+            values[...] = -1
+
+        np.testing.assert_array_equal(self.expected, self.state_array.read())
+
+    def test_compressed(self):
+        set_state_compression("stateArrayTest")
+        try:
+            self.state_array.write(self.expected)
+
+            np.testing.assert_array_equal(self.expected[2], self.state_array[2])
+            np.testing.assert_array_equal(self.expected[1:4, 2:5], self.state_array[1:4, 2:5])
+            np.testing.assert_array_equal(self.expected[::2], self.state_array[::2])
+        finally:
+            remove_state_compression()
+
+    def test_views_update_in_place(self):
+        view = self.state_array.array
+        self.state_array[0, 0] = 42
+        self.assertEqual(42, view[0, 0])
@@ -0,0 +1,128 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from pyfaasm import core
+from pyfaasm.backend import LocalBackend
+from pyfaasm.core import set_backend, enable_instrumentation, disable_instrumentation, get_instrumentation_stats, \
+    export_instrumentation, set_local_chaining, chain_this_with_input, await_call, get_state, get_state_many, \
+    set_state, set_state_offset, push_state, pull_state
+from pyfaasm.stats import CallStats, InstrumentedBackend
+
+
+def _chained_func(input_data):
+    return 0
+
+
+def _slow_func(input_data):
+    time.sleep(0.1)
+    return 0
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.original_backend = core.backend
+        self.original_local_chaining = core.PYTHON_LOCAL_CHAINING
+
+        set_backend(LocalBackend())
+        enable_instrumentation()
+
+    def tearDown(self):
+        disable_instrumentation()
+        set_backend(self.original_backend)
+        set_local_chaining(self.original_local_chaining)
+
+    def test_disabled_unwraps_backend(self):
+        self.assertIsInstance(core.backend, InstrumentedBackend)
+
+        disable_instrumentation()
+        self.assertIsInstance(core.backend, LocalBackend)
+        self.assertIsNone(get_instrumentation_stats())
+
+    def test_counts_bytes_and_keys(self):
+        set_state("statsA", b'0123456789')
+        set_state_offset("statsA", 10, 2, b'abc')
+        push_state("statsA")
+        pull_state("statsA", 10)
+        self.assertEqual(b'01abc56789', get_state("statsA", 10))
+
+        set_state("statsB", b'01234')
+        get_state_many([("statsA", 10), ("statsB", 5)])
+
+        stats = get_instrumentation_stats()
+        ops = stats["ops"]
+        self.assertEqual(2, ops["set_state"]["count"])
+        self.assertEqual(15, ops["set_state"]["bytes"])
+        self.assertEqual(3, ops["set_state_offset"]["bytes"])
+        self.assertEqual(1, ops["push_state"]["count"])
+        self.assertEqual(1, ops["get_state_many"]["count"])
+        self.assertEqual(15, ops["get_state_many"]["bytes"])
+
+        # Histogram covers every call
+        self.assertEqual(2, sum(ops["set_state"]["histogram"].values()))
+
+        self.assertEqual(6, stats["keys"]["statsA"]["count"])
+        self.assertEqual(2, stats["keys"]["statsB"]["count"])
+
+        # Batched calls count the exact bytes for each key
+        self.assertEqual(5 + 5, stats["keys"]["statsB"]["bytes"])
+
+    def test_local_chaining_recorded(self):
+        set_local_chaining(True)
+
+        call_id = chain_this_with_input(_chained_func, b'1234')
+        await_call(call_id)
+
+        ops = get_instrumentation_stats()["ops"]
+        self.assertEqual(1, ops["chain_call"]["count"])
+        self.assertEqual(4, ops["chain_call"]["bytes"])
+        self.assertEqual(1, ops["await_call"]["count"])
+
+    def test_local_chaining_excludes_run_time(self):
+        set_local_chaining(True)
+
+        # The chained function runs directly, its time isn't the chain's
+        await_call(chain_this_with_input(_slow_func, b''))
+
+        stats = get_instrumentation_stats()
+        self.assertLess(stats["ops"]["chain_call"]["time"], 0.1)
+        self.assertLess(stats["total_time"], 0.1)
+
+    def test_backend_chaining_excludes_run_time(self):
+        set_local_chaining(False)
+
+        # The local backend runs chained calls in-process, inside the chain
+        await_call(chain_this_with_input(_slow_func, b''))
+        core.chain_many(_slow_func, [b'', b''])
+
+        stats = get_instrumentation_stats()
+        self.assertEqual(1, stats["ops"]["chain_call"]["count"])
+        self.assertEqual(1, stats["ops"]["chain_call_many"]["count"])
+        self.assertLess(stats["total_time"], 0.1)
+
+    def test_export(self):
+        set_state("statsC", b'012')
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, "stats.json")
+            stats_json = export_instrumentation(file_path=file_path)
+
+            with open(file_path) as fh:
+                self.assertEqual(stats_json, fh.read())
+
+        exported = json.loads(stats_json)
+        self.assertEqual(1, exported["ops"]["set_state"]["count"])
+        self.assertEqual(3, exported["keys"]["statsC"]["bytes"])
+
+
+class TestCallStats(unittest.TestCase):
+    def test_histogram_buckets(self):
+        stats = CallStats()
+        stats.record("op", [], 0, 0.0000005)
+        stats.record("op", [], 0, 0.000003)
+        stats.record("op", [], 0, 0.000003)
+
+        histogram = stats.snapshot()["ops"]["op"]["histogram"]
+        self.assertEqual({"<1us": 1, "<4us": 2}, histogram)
@@ -0,0 +1,93 @@
+import io
+import unittest
+
+import numpy as np
+
+from pyfaasm import core
+from pyfaasm.backend import LocalBackend
+from pyfaasm.core import set_backend, set_local_input_output, get_output, get_input_size, read_input_into, \
+    get_input_stream, get_output_writer
+
+
+class TestStreams(unittest.TestCase):
+    def setUp(self):
+        self.original_backend = core.backend
+        self.original_local_output = core.PYTHON_LOCAL_OUTPUT
+
+        self.input_data = bytes(range(0, 200))
+        self.backend = LocalBackend(input_data=self.input_data)
+        set_backend(self.backend)
+
+    def tearDown(self):
+        set_backend(self.original_backend)
+        set_local_input_output(self.original_local_output)
+
+    def test_read_input_into(self):
+        self.assertEqual(200, get_input_size())
+
+        # Read straight into a numpy array
+        arr = np.empty(50, dtype=np.int32)
+        self.assertEqual(200, read_input_into(arr))
+        self.assertEqual(self.input_data, arr.tobytes())
+
+        with self.assertRaises(ValueError):
+            read_input_into(bytearray(10))
+
+    def test_input_stream(self):
+        stream = get_input_stream()
+
+        buffer = bytearray(64)
+        chunks = list()
+        while True:
+            n_bytes = stream.readinto(buffer)
+            if n_bytes == 0:
+                break
+
+            chunks.append(bytes(buffer[:n_bytes]))
+
+        self.assertEqual([64, 64, 64, 8], [len(c) for c in chunks])
+        self.assertEqual(self.input_data, b"".join(chunks))
+
+        stream.seek(-10, io.SEEK_END)
+        self.assertEqual(self.input_data[-10:], stream.read())
+
+        stream.seek(5)
+        view = stream.readview(3)
+        self.assertIsInstance(view, memoryview)
+        self.assertEqual(self.input_data[5:8], bytes(view))
+        self.assertEqual(8, stream.tell())
+
+    def test_input_stream_buffered(self):
+        # Works with the standard library wrappers
+        reader = io.BufferedReader(get_input_stream(), buffer_size=16)
+        self.assertEqual(self.input_data[:20], reader.read(20))
+        self.assertEqual(self.input_data[20:], reader.read())
+
+    def test_output_writer(self):
+        with get_output_writer() as writer:
+            writer.write(b"abc")
+            writer.write(memoryview(b"defg"))
+            writer.write(np.arange(2, dtype=np.uint8))
+
+            # Nothing set until closed
+            self.assertIsNone(self.backend.output_data)
+
+        self.assertEqual(b"abcdefg\x00\x01", self.backend.output_data)
+
+    def test_output_writer_with_size(self):
+        set_local_input_output(True)
+
+        # Writing more than the given size grows the buffer
+        with get_output_writer(4) as writer:
+            writer.write(b"01")
+            writer.write(b"2345")
+
+        self.assertEqual(b"012345", get_output())
+
+        with get_output_writer(10) as writer:
+            writer.write(b"012")
+
+        self.assertEqual(b"012", get_output())
+
+        with self.assertRaises(ValueError):
+            writer.write(b"x")